@@ -0,0 +1,207 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import multiprocessing
+
+import numpy as np
+
+from parameters import *
+import runcatalog
+import scheduler
+import generate_sims
+# the same parsing rules and per-log result cache as the full analysis
+import analyze
+
+#
+# Adaptive sweep of the Orchestra unicast slotframe size (ORCHESTRA_CONF_UNICAST_PERIOD).
+#
+# Instead of running every size of a fixed ladder, each configuration (algorithm, send interval)
+# starts with SLOTFRAME_SIZES_COARSE. In each round, the sizes are generated, run by scheduler.py
+# and analyzed, and the PDR versus radio duty cycle front of each experiment and neighbor count
+# is computed. A new size is proposed halfway between two neighboring sizes only where the front
+# is poorly resolved: at least one of them is Pareto-optimal and their results differ by more
+# than the resolution. The sweep ends when nothing is proposed.
+#
+# The state is stored in a JSON file, so an interrupted sweep continues where it stopped;
+# the runs that are already complete are not run again (see run_cooja.py).
+#
+# Usage: ./adaptive_sweep.py [<num jobs>]  (from this directory, as generate_sims.py)
+#
+
+STATE_FILENAME = "adaptive-sweep.json"
+
+QUEUE_DESCRIPTION = "adaptive"
+
+# the front is resolved where neighboring sizes differ by at most this much, in percentage points
+PDR_RESOLUTION = 1.0
+RDC_RESOLUTION = 0.1
+
+MAX_ROUNDS = 6
+
+NUM_WORKERS = multiprocessing.cpu_count()
+
+###########################################
+
+def load_state():
+    try:
+        with open(STATE_FILENAME, "r") as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        state = {}
+    for a in ALGORITHMS:
+        for si in SEND_INTERVALS:
+            state.setdefault(config_name(a, si), {"sizes" : list(SLOTFRAME_SIZES_COARSE), "fronts" : {}})
+    return state
+
+###########################################
+
+def store_state(state):
+    tmpfilename = "{}.{}.tmp".format(STATE_FILENAME, os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmpfilename, STATE_FILENAME)
+
+###########################################
+
+def config_name(a, si):
+    return "{}/si_{}".format(a, si)
+
+###########################################
+
+def run_sizes(state, num_jobs):
+    # generate and run the simulations of all sizes; the complete ones are skipped by the scheduler
+    directories = []
+    for a in ALGORITHMS:
+        for si in SEND_INTERVALS:
+            for sf in state[config_name(a, si)]["sizes"]:
+                directories += generate_sims.generate_config(a, si, sf)
+    generate_sims.generate_runner(QUEUE_DESCRIPTION, directories, True)
+    scheduler.run_queue("run-" + QUEUE_DESCRIPTION + ".queue", num_jobs)
+    return len(directories)
+
+###########################################
+
+def point_metrics(results):
+    # (PDR, RDC) of the runs of one point, aggregated as in analyze.load_all
+    if not results:
+        return None
+    if analyze.ONLY_MEDIAN:
+        pdr = sorted(np.mean([x[0] for x in r]) for r in results)
+        rdc = sorted(np.mean([x[2] for x in r]) for r in results)
+        return (float(pdr[len(pdr) // 2]), float(rdc[len(rdc) // 2]))
+    return (float(np.mean([x[0] for r in results for x in r])),
+            float(np.mean([x[2] for r in results for x in r])))
+
+###########################################
+
+def measure(state):
+    # config name -> "<experiment> <nn>" -> list of (size, PDR, RDC)
+    catalog = runcatalog.RunCatalog(generate_sims.OUT_DIRECTORY)
+    jobs = []
+    points = []
+    for a in ALGORITHMS:
+        for si in SEND_INTERVALS:
+            for sf in state[config_name(a, si)]["sizes"]:
+                for exp in EXPERIMENTS:
+                    for nn in NUM_NEIGHBORS:
+                        first_job = len(jobs)
+                        jobs += [(catalog.log_filename(run), exp, si)
+                                 for run in catalog.find(a, si, sf, exp, nn) if run.has_log]
+                        points.append((config_name(a, si), "{} {}".format(exp, nn), sf, first_job, len(jobs)))
+
+    results = analyze.process_files(jobs, NUM_WORKERS)
+
+    fronts = {}
+    for name, front_name, sf, first_job, last_job in points:
+        m = point_metrics(results[first_job:last_job])
+        if m is not None:
+            fronts.setdefault(name, {}).setdefault(front_name, []).append((sf, m[0], m[1]))
+    return fronts
+
+###########################################
+
+def pareto_optimal(points):
+    # the sizes not dominated by any other: higher or equal PDR at lower or equal duty cycle
+    optimal = set()
+    for sf, pdr, rdc in points:
+        if not any(p >= pdr and r <= rdc and (p > pdr or r < rdc) for _, p, r in points):
+            optimal.add(sf)
+    return optimal
+
+###########################################
+
+def midpoint(lo, hi):
+    # odd, as the sizes of the ladders in parameters.py; None if there is no size in between
+    m = (lo + hi) // 2
+    if m % 2 == 0:
+        m = m + 1 if m + 1 < hi else m - 1
+    return m if lo < m < hi else None
+
+###########################################
+
+def propose(points):
+    points = sorted(points)
+    optimal = pareto_optimal(points)
+    proposals = set()
+    for (sf1, pdr1, rdc1), (sf2, pdr2, rdc2) in zip(points, points[1:]):
+        if sf1 not in optimal and sf2 not in optimal:
+            # a dominated part of the curve; its shape does not matter
+            continue
+        if abs(pdr1 - pdr2) <= PDR_RESOLUTION and abs(rdc1 - rdc2) <= RDC_RESOLUTION:
+            continue
+        m = midpoint(sf1, sf2)
+        if m is not None:
+            proposals.add(m)
+    return proposals
+
+###########################################
+
+def print_fronts(name, fronts):
+    for front_name, points in sorted(fronts.items()):
+        optimal = pareto_optimal(points)
+        print("  {} {}: {}".format(name, front_name, ", ".join(
+            "{}{}: PDR {:.1f}% RDC {:.2f}%".format(sf, "*" if sf in optimal else "", pdr, rdc)
+            for sf, pdr, rdc in sorted(points))))
+
+###########################################
+
+def main():
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else generate_sims.NUM_CORES
+    state = load_state()
+
+    for round_number in range(MAX_ROUNDS):
+        print("round {}".format(round_number + 1))
+        num_directories = run_sizes(state, max(1, num_jobs))
+        num_sizes = sum(len(state[config_name(a, si)]["sizes"]) for a in ALGORITHMS for si in SEND_INTERVALS)
+        fronts = measure(state)
+
+        num_proposed = 0
+        for name, config in sorted(state.items()):
+            config["fronts"] = fronts.get(name, {})
+            print_fronts(name, config["fronts"])
+            proposals = set()
+            for points in config["fronts"].values():
+                proposals |= propose(points)
+            proposals -= set(config["sizes"])
+            if proposals:
+                print("  {}: adding slotframe sizes {}".format(name, sorted(proposals)))
+                config["sizes"] = sorted(set(config["sizes"]) | proposals)
+                num_proposed += len(proposals)
+        store_state(state)
+
+        if num_proposed == 0:
+            break
+    else:
+        print("stopped after {} rounds, the fronts may not be resolved yet".format(MAX_ROUNDS))
+
+    # the fixed ladders run all of their sizes for every configuration
+    num_configs = len(ALGORITHMS) * len(SEND_INTERVALS)
+    print("{} simulation directories for {} slotframe sizes in {} configurations; {} with SLOTFRAME_SIZES".format(
+        num_directories, num_sizes, num_configs, num_directories * num_configs * len(SLOTFRAME_SIZES) // num_sizes))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+
+#
+# The analysis window and the root nodes, shared by analyze.py, analyze-testbed.py and livestats.py,
+# so that the offline and the online analysis of a log use the same rules.
+#
+# The packets of the seqnums in [first, last] of seqnum_window are sent in the window,
+# and are counted if they arrive before its end plus LATENCY_MARGIN_SECONDS.
+#
+
+START_TIME_MINUTES = 30
+
+# the end of the window of the simulations, and of the testbed experiments, which are shorter
+END_TIME_MINUTES_SIM = 60
+END_TIME_MINUTES_TESTBED = 58
+
+# the packets sent before the end of the window may still be in flight for this long
+LATENCY_MARGIN_SECONDS = 60
+
+# The root node is ignored in the calculations (XXX: maybe should not ignore its PRR?)
+ROOT_ID_SIM = 1
+ROOT_ID_TESTBED = 177
+
+###########################################
+
+def seqnum_window(send_interval, end_time_minutes, start_time=START_TIME_MINUTES):
+    # (first seqnum, last seqnum) of the packets sent between start_time and end_time_minutes
+    duration_seconds = (end_time_minutes - START_TIME_MINUTES) * 60
+    num_packets = duration_seconds // send_interval
+    if start_time <= START_TIME_MINUTES:
+        first_packet = 1
+    else:
+        skipped_seqnums = (start_time - START_TIME_MINUTES) * 60 // send_interval
+        first_packet = 1 + skipped_seqnums
+    return (first_packet, num_packets)
@@ -3,8 +3,8 @@
 import os
 import sys
 import time
-import subprocess
 import json
+import multiprocessing
 
 import matplotlib
 matplotlib.use('Agg')
@@ -13,6 +13,14 @@ import matplotlib.legend_handler as lh
 import numpy as np
 
 from parameters import *
+import analysiswindow
+import logparse
+import logreader
+import logfile
+import testbedfetch
+import campaignmanifest
+import seqnums
+import plotjobs
 
 #
 # This calculates and plots these metrics:
@@ -42,23 +50,35 @@ TESTBED_DIRS = [
     ("../iot-lab-all3/", "iot-lab-firmwares-all3"),
 ]
 
+# parse the missing logs as they are streamed from the testbed host, instead of fetching them first
+STREAM_REMOTE_LOGS = True
+# keep a gzip-compressed local copy of each streamed log, so that the next analysis is local
+CACHE_REMOTE_LOGS = True
+
 DATA_FILE = "cached_data.json"
 DATA_FILE2 = "cached_data2.json"
 
-START_TIME_MINUTES = 30
-END_TIME_MINUTES = 58
+# the analysis window, see analysiswindow.py
+START_TIME_MINUTES = analysiswindow.START_TIME_MINUTES
+END_TIME_MINUTES = analysiswindow.END_TIME_MINUTES_TESTBED
+LATENCY_MARGIN_SECONDS = analysiswindow.LATENCY_MARGIN_SECONDS
 
-# The root node is ignored in the calculations (XXX: maybe should not ignore its PRR?)
-ROOT_ID_SIM = 1
-ROOT_ID_TESTBED = 177
+ROOT_ID_SIM = analysiswindow.ROOT_ID_SIM
+ROOT_ID_TESTBED = analysiswindow.ROOT_ID_TESTBED
 
 # confidence interval
 CI = 0.9
 
 ONLY_MEDIAN = False
 
+# the number of processes rendering the plots
+NUM_WORKERS = multiprocessing.cpu_count()
+
 node_id_to_mote_id = {}
 
+# local dir -> the jobs in the manifest of campaign.py
+campaign_manifests = {}
+
 ###########################################
 
 MARKERS = ["o", "s", "X", "X", "X", "X"]
@@ -67,7 +87,7 @@ BASIC_MARKERS = ["o", "s", "X", "X", "X", "X"]
 ###########################################
 
 def graph_scatter(xdata, ydata, xlabel, ylabel, pointlabels, filename):
-    pl.figure(figsize=(5, 4.5))
+    plotjobs.new_figure((5, 4.5))
 
     algos = ALGORITHMS
 
@@ -114,13 +134,12 @@ def graph_scatter(xdata, ydata, xlabel, ylabel, pointlabels, filename):
     else:
         pl.savefig(OUT_DIR + "/" + filename, format='pdf',
                    bbox_inches='tight')
-    pl.close()
 
 ###########################################
 
 def graph_scatter_sub(xdata, ydata, xlabel, ylabel, pointlabels, filename):
-    fig, axs = pl.subplots(2, 2)
-    fig.set_size_inches((5, 4.5))
+    fig = plotjobs.new_figure((5, 4.5))
+    axs = fig.subplots(2, 2)
 
     algos = ALGORITHMS
 
@@ -159,12 +178,11 @@ def graph_scatter_sub(xdata, ydata, xlabel, ylabel, pointlabels, filename):
     else:
         pl.savefig(OUT_DIR + "/" + filename, format='pdf',
                    bbox_inches='tight')
-    pl.close()
 
 ###########################################
 
 def graph_line(xdata, ydata, xlabel, ylabel, filename):
-    pl.figure(figsize=(3, 2))
+    plotjobs.new_figure((3, 2))
 
     algos = ALGORITHMS
 
@@ -192,26 +210,19 @@ def graph_line(xdata, ydata, xlabel, ylabel, filename):
     pl.savefig(OUT_DIR + "/" + filename, format='pdf',
 #              bbox_extra_artists=(legend,),
                bbox_inches='tight')
-    pl.close()
 
 ###########################################
 
 def get_seqnums(send_interval, start_time = START_TIME_MINUTES):
-    duration_seconds = (END_TIME_MINUTES - START_TIME_MINUTES) * 60
-    num_packets = duration_seconds // send_interval
-    if start_time <= START_TIME_MINUTES:
-        first_packet = 1
-    else:
-        skipped_seqnums = (start_time - START_TIME_MINUTES) * 60 // send_interval
-        first_packet = 1 + skipped_seqnums
-    return (first_packet, num_packets)
+    return analysiswindow.seqnum_window(send_interval, END_TIME_MINUTES, start_time)
 
 ###########################################
 
 class MoteStats:
-    def __init__(self, id):
+    def __init__(self, id, first_seqnum, last_seqnum):
         self.id = id
-        self.seqnums = set()
+        # the received seqnums in the range [first_seqnum, last_seqnum]
+        self.seqnums = seqnums.SeqnumBitmap(first_seqnum, last_seqnum)
         self.associated_at_minutes = None
         self.packets_tx = 0
         self.packets_ack = 0
@@ -265,58 +276,37 @@ class MoteStats:
 
 ###########################################
 
-def process_file(filename, experiment, send_interval, is_testbed):
+# source: the name of a log file, or a binary stream of a log (e.g. testbedfetch.RemoteLog,
+# or a member of a local archive from tarfile.extractfile); tee: see logreader.WindowReader
+def process_file(source, experiment, send_interval, is_testbed, tee=None):
     motes = {}
     has_assoc = set()
-    print(filename)
+    print(getattr(source, "name", source))
 
     in_initialization = True
 
     first_seqnum, last_seqnum = get_seqnums(send_interval)
-    start_ts_unix = None
 
     ROOT_ID = ROOT_ID_TESTBED if is_testbed else ROOT_ID_SIM
 
-    with open(filename, "r") as f:
-        for line in f:
-            #print(line)
-            if is_testbed:
-                fields1 = line.strip().split(";")
-                if len(fields1) < 3:
-                    continue
-                fields2 = fields1[2].split()
-                fields = fields1[:2] + fields2
-            else:
-                fields = line.strip().split()
-
-            try:
-                # in milliseconds
-                if is_testbed:
-                    ts_unix = float(fields[0])
-                    if start_ts_unix is None:
-                        start_ts_unix = ts_unix
-                    ts_unix -= start_ts_unix
-                    ts = int(float(ts_unix) * 1000)
-                    node = int(fields[1][3:])
-                else:
-                    ts = int(fields[0]) // 1000
-                    node = int(fields[1]) 
-            except:
-                # failed to extract timestamp
+    with logreader.WindowReader(source, is_testbed, tee) as reader:
+        # skip the initialization, except for the association and node ID lines
+        lines = reader.lines(START_TIME_MINUTES * 60 * 1000,
+                             (END_TIME_MINUTES * 60 + LATENCY_MARGIN_SECONDS) * 1000)
+        for kind, ts, node, args in logparse.tokenize(lines, is_testbed, reader.start_ts_unix):
+            if kind == logparse.EV_NODE:
+                motes[node] = MoteStats(node, first_seqnum, last_seqnum)
                 continue
 
-            if node not in motes:
-                motes[node] = MoteStats(node)
-
-            if is_testbed and "Node ID:" in line:
+            if kind == logparse.EV_NODE_ID:
                 # 1570531244.735377;m3-197;[INFO: Main      ] Node ID: 43378
-                node_id = int(fields[7])
-                node_id_to_mote_id[node_id] = node
+                if is_testbed:
+                    node_id_to_mote_id[args[0]] = node
+                continue
 
-            if "association done (1" in line:
-                #print(line)
+            if kind == logparse.EV_ASSOC:
                 has_assoc.add(node)
-                motes[node].seqnums = set()
+                motes[node].seqnums.clear()
                 motes[node].associated_at_minutes = (ts // 1000 + 59) // 60
                 continue
 
@@ -328,25 +318,21 @@ def process_file(filename, experiment, send_interval, is_testbed):
                     continue
 
             # both for root and normal nodes
-            if "add packet failed" in line:
+            if kind == logparse.EV_QUEUE_DROP:
                 # account for queue drops
                 motes[node].queue_losses += 1
                 continue
 
             if node == ROOT_ID or "local" in experiment:
                 # 314937392 1 [INFO: Node      ] seqnum=6 from=fd00::205:5:5:5
-                if "seqnum=" in line:
-                    sn = int(fields[5].split("=")[1])
+                if kind == logparse.EV_SEQNUM:
+                    sn, direction, fromnode = args
                     if not (first_seqnum <= sn <= last_seqnum):
                         if sn > last_seqnum:
                             break
                         continue
-                    if "=" not in fields[6]:
-                        continue
-                    fromtext, fromaddr = fields[6].split("=")
                     # this is needed to distinguish between "from" and "to" in the query example
-                    if fromtext == "from":
-                        fromnode = int(fromaddr.split(":")[-1], 16)
+                    if direction == "from":
                         if is_testbed:
                             fromnode = node_id_to_mote_id.get(fromnode, 0)
                         if fromnode in has_assoc:
@@ -362,20 +348,17 @@ def process_file(filename, experiment, send_interval, is_testbed):
                 continue
 
             # 600142000 28 [INFO: Link Stats] num packets: tx=0 ack=0 rx=0 to=0014.0014.0014.0014
-            if "num packets" in line:
-                tx = int(fields[7].split("=")[1])
-                ack = int(fields[8].split("=")[1])
-                rx = int(fields[9].split("=")[1])
+            if kind == logparse.EV_LINK_STATS:
+                tx, ack, rx = args
                 motes[node].packets_tx += tx
                 motes[node].packets_ack += ack
                 continue
 
             # 600073000:8 [INFO: Energest  ] Radio total :    1669748/  60000000 (27 permil)
-            if "Radio total" in line:
+            if kind == logparse.EV_ENERGEST:
                 # only account for the period when data packets are sent
                 if ts > START_TIME_MINUTES * 60 * 1000:
-                    on = int(fields[8][:-1])
-                    total = int(fields[9])
+                    on, total = args
                     motes[node].radio_on += on
                     motes[node].radio_total += total
                     continue
@@ -397,35 +380,72 @@ def process_file(filename, experiment, send_interval, is_testbed):
 
 ###########################################
 
-def exec_remote_cmd(cmd):
-    subprocess.call("ssh " + TESTBED_HOST + " '" + cmd + "'", shell=True)
+def process_remote(transport, local, remote, filename, remote_filename, exp, si):
+    # parses the remote log as it arrives; None if it cannot be read
+    tee = logfile.CompressedTee(os.path.join(local, filename)) if CACHE_REMOTE_LOGS else None
+    stream = testbedfetch.RemoteLog(transport, remote, remote_filename)
+    result = None
+    ok = False
+    try:
+        result = process_file(stream, exp, si, True, tee)
+    except (OSError, EOFError) as e:
+        print("failed to read remote file {}: {}".format(stream.name, e))
+    finally:
+        try:
+            # an empty stream is a failure too, e.g. a missing log
+            ok = stream.close() and stream.num_bytes > 0
+        finally:
+            if tee is not None:
+                # only a complete log is cached
+                if ok and result is not None:
+                    tee.commit()
+                else:
+                    tee.discard()
+    return result if ok else None
 
 ###########################################
 
-def exec_local_cmd(cmd):
-    subprocess.call(cmd, shell=True)
+def campaign_job(transport, local, remote, filename):
+    # the job of the log in the campaign manifest, or None if it is not listed
+    if local not in campaign_manifests:
+        jobs = campaignmanifest.load_manifest(local)
+        if not jobs and transport is not None:
+            # quiet: most directories have no manifest
+            stream = testbedfetch.RemoteLog(transport, remote, campaignmanifest.MANIFEST_FILENAME, quiet=True)
+            try:
+                jobs = campaignmanifest.parse_manifest(stream)
+            except (OSError, EOFError, ValueError, KeyError):
+                # no manifest: the logs are not from campaign.py
+                jobs = {}
+            stream.close()
+        campaign_manifests[local] = jobs
+    return campaign_manifests[local].get(filename)
 
 ###########################################
 
-def load_single_testbed(local, remote, filename, exp, si):
-    local_file = os.path.join(local, filename)
-    remote_file = os.path.join(remote, filename)
-    local_file_tgz = local_file + ".tgz"
-    remote_file_tgz = remote_file + ".tgz"
-
-    if not os.access(local_file, os.R_OK):
-        print("Trying to get the remote file...")
-        exec_remote_cmd("tar -czf " + remote_file_tgz + " " + remote_file)
-        subprocess.call("scp " + TESTBED_HOST + ":" + remote_file_tgz + " " + local_file_tgz, shell=True)
-        exec_local_cmd("tar -xzf " + local_file_tgz)
-        exec_local_cmd("mv " + remote_file + " " + local_file)
-        exec_remote_cmd("rm " + remote_file_tgz)
-        exec_local_cmd("rm " + local_file_tgz)
-        if not os.access(local_file, os.R_OK):
-            print("failed to read file " + local_file)
-            return (0.0, 0.0, 0.0, 0.0)
-
-    r, root_queue_losses = process_file(local_file, exp, si, True)
+def load_single_testbed(transport, local, remote, filename, exp, si):
+    job = campaign_job(transport, local, remote, filename)
+    if job is not None and job["state"] != campaignmanifest.JOB_DONE:
+        # e.g. an aborted run, or a partial log of a running one
+        print("skipping {}: {} in the campaign manifest".format(filename, job["state"]))
+        return (0.0, 0.0, 0.0, 0.0)
+
+    # the local copy may have been compressed
+    local_file = logfile.find_log(os.path.join(local, filename))
+    if os.access(local_file, os.R_OK):
+        result = process_file(local_file, exp, si, True)
+    elif transport is not None:
+        os.makedirs(local, exist_ok=True)
+        # campaign.py may have compressed it
+        remote_filename = job["stored_log"] if job is not None else filename
+        result = process_remote(transport, local, remote, filename, remote_filename, exp, si)
+    else:
+        result = None
+    if result is None:
+        print("failed to read file " + local_file)
+        return (0.0, 0.0, 0.0, 0.0)
+
+    r, root_queue_losses = result
 
     t_pdr_results = []
     t_prr_results = []
@@ -461,9 +481,7 @@ def load_single_testbed(local, remote, filename, exp, si):
 
 ###########################################
 
-def load_testbed(data_directory, data, a, si, sf, exp, nn):
-    data[a][str(si)][str(sf)][exp][str(nn)] = {}
-
+def testbed_filename(a, si, sf, exp, nn):
     filename = ""
     if nn == 10:
         filename = "dense-"
@@ -474,10 +492,18 @@ def load_testbed(data_directory, data, a, si, sf, exp, nn):
     filename += "sf_{}_".format(sf)
     filename += exp
     filename += ".log"
+    return filename
+
+###########################################
+
+def load_testbed(data_directory, data, a, si, sf, exp, nn, transport):
+    data[a][str(si)][str(sf)][exp][str(nn)] = {}
+
+    filename = testbed_filename(a, si, sf, exp, nn)
 
     metrics = []
     for local, remote in TESTBED_DIRS:
-        metrics.append(load_single_testbed(local, remote, filename, exp, si))
+        metrics.append(load_single_testbed(transport, local, remote, filename, exp, si))
 
     # use the median result
     midpoint = len(metrics) // 2
@@ -495,7 +521,43 @@ def load_testbed(data_directory, data, a, si, sf, exp, nn):
 
 ###########################################
 
+def all_testbed_logs():
+    # (local dir, remote dir, filename) of all logs
+    logs = []
+    for a in ALGORITHMS:
+        for si in SEND_INTERVALS:
+            for sf in SLOTFRAME_SIZES:
+                for exp in EXPERIMENTS:
+                    for nn in NUM_NEIGHBORS:
+                        filename = testbed_filename(a, si, sf, exp, nn)
+                        logs += [(local, remote, filename) for local, remote in TESTBED_DIRS]
+    return logs
+
+###########################################
+
+def fetch_all():
+    # all missing logs at once, over one connection to the testbed host
+    testbedfetch.fetch_missing(testbedfetch.SshTransport(TESTBED_HOST), all_testbed_logs())
+
+###########################################
+
+def open_transport():
+    # the connection for streaming the missing logs; None if no log is missing or the host cannot be reached
+    if not any(not os.access(logfile.find_log(os.path.join(local, filename)), os.R_OK)
+               for local, remote, filename in all_testbed_logs()):
+        return None
+    transport = testbedfetch.SshTransport(TESTBED_HOST)
+    return transport if testbedfetch.connect(transport) else None
+
+###########################################
+
 def load_all(data_directory):
+    if STREAM_REMOTE_LOGS:
+        transport = open_transport()
+    else:
+        fetch_all()
+        transport = None
+
     data = {}
     for a in ALGORITHMS:
         data[a] = {}
@@ -506,8 +568,10 @@ def load_all(data_directory):
                 for exp in EXPERIMENTS:
                     data[a][str(si)][str(sf)][exp] = {}
                     for nn in NUM_NEIGHBORS:
-                        load_testbed(data_directory, data, a, si, sf, exp, nn)
+                        load_testbed(data_directory, data, a, si, sf, exp, nn, transport)
 
+    if transport is not None:
+        transport.close()
     return data
 
 ###########################################
@@ -519,6 +583,7 @@ def aggregate(data, a, si, sf, exp, nn, metric):
 
 def plot_all_pdr(data, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             pdr_results = [[] for _ in ALGORITHMS]
@@ -534,13 +599,17 @@ def plot_all_pdr(data, exp):
                     pointlabels[i].append(sfs)
 
             filename = "sim_{}_pdr_per_duty_cycle_allsf_nn{}_si{}.pdf".format(exp, nn, si)
-            graph_scatter_sub(rdc_results,  pdr_results, "Duty cycle, %", "End-to-end PDR, %", pointlabels,
-                              filename)
+            jobs.append(plotjobs.PlotJob(graph_scatter_sub,
+                                         (rdc_results, pdr_results, "Duty cycle, %", "End-to-end PDR, %",
+                                          pointlabels, filename),
+                                         {}, filename))
+    return jobs
 
 ###########################################
 
 def plot_all_par(data, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             par_results = [[] for _ in ALGORITHMS]
@@ -551,12 +620,17 @@ def plot_all_par(data, exp):
 
             filename = "sim_{}_par_per_slotframe_allsf_nn{}_si{}.pdf".format(exp, nn, si)
             print(par_results)
-            graph_line(SLOTFRAME_SIZES, par_results, "Slotframe size, slots", "Packet ACK Rate, %", filename)
+            jobs.append(plotjobs.PlotJob(graph_line,
+                                         (SLOTFRAME_SIZES, par_results, "Slotframe size, slots",
+                                          "Packet ACK Rate, %", filename),
+                                         {}, filename))
+    return jobs
 
 ###########################################
 
 def plot_all_queue_losses(data, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             results = [[] for _ in ALGORITHMS]
@@ -566,13 +640,18 @@ def plot_all_queue_losses(data, exp):
                     results[i].append(aggregate(data, a, si, sf, exp, nn, "queue_losses"))
 
             filename = "sim_{}_queue_losses_per_slotframe_allsf_nn{}_si{}.pdf".format(exp, nn, si)
-            graph_line(SLOTFRAME_SIZES, results, "Slotframe size, slots", "Num queue losses", filename)
+            jobs.append(plotjobs.PlotJob(graph_line,
+                                         (SLOTFRAME_SIZES, results, "Slotframe size, slots",
+                                          "Num queue losses", filename),
+                                         {}, filename))
+    return jobs
 
 
 ###########################################
 
 def plot_comparative_runs(data1, data2, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             for i, a in enumerate(ALGORITHMS):
@@ -593,14 +672,18 @@ def plot_comparative_runs(data1, data2, exp):
                     pointlabels[1].append(sfs)
 
                 filename = "sim_comparative_{}_{}_pdr_per_duty_cycle_allsf_nn{}_si{}.pdf".format(exp, a, nn, si)
-                graph_scatter(rdc_results,  pdr_results, "Duty cycle, %", "End-to-end PDR, %", pointlabels,
-                              filename)
+                jobs.append(plotjobs.PlotJob(graph_scatter,
+                                             (rdc_results, pdr_results, "Duty cycle, %", "End-to-end PDR, %",
+                                              pointlabels, filename),
+                                             {}, filename))
+    return jobs
 
 ###########################################
 
 def plot_best_per_send_frequency(data, exp):
 
     # plot comparison of the best
+    jobs = []
     for sfi in range(3):
         for nn in NUM_NEIGHBORS:
             pdr_results = [[] for _ in BEST_ALGORITHMS]
@@ -627,8 +710,11 @@ def plot_best_per_send_frequency(data, exp):
                     pointlabels[i].append("rdc={:.1f}%".format(rdc_results[i][-1])) # the PDR
 
             filename = "sim_{}_pdr_per_sfr_sf{}_nn{}.pdf".format(exp, sf, nn)
-            graph_scatter(si_results, pdr_results, "Send frequency, packets / minute", "End-to-end PDR, %", pointlabels,
-                          filename)
+            jobs.append(plotjobs.PlotJob(graph_scatter,
+                                         (si_results, pdr_results, "Send frequency, packets / minute",
+                                          "End-to-end PDR, %", pointlabels, filename),
+                                         {}, filename))
+    return jobs
 
 ###########################################
 
@@ -662,10 +748,14 @@ def main():
 
     data = ensure_loaded(DATA_FILE, DATA_DIRECTORY)
 
+    jobs = []
     for exp in EXPERIMENTS:
-        plot_all_pdr(data, exp)
-        plot_all_par(data, exp)
-        plot_all_queue_losses(data, exp)
+        jobs += plot_all_pdr(data, exp)
+        jobs += plot_all_par(data, exp)
+        jobs += plot_all_queue_losses(data, exp)
+
+    # only the plots with changed data are rendered again
+    plotjobs.render_all(jobs, OUT_DIR, NUM_WORKERS)
 
 ###########################################
 
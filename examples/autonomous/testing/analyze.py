@@ -3,18 +3,28 @@
 import os
 import sys
 import time
-import subprocess
 import json
+import multiprocessing
 
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as pl
 import matplotlib.legend_handler as lh
-from scipy import stats
 from scipy.stats.stats import pearsonr
 import numpy as np
 
 from parameters import *
+import analysiswindow
+import logparse
+import logreader
+import logfile
+import seqnums
+import runcatalog
+import timeseries
+import bootstrap
+import resultcache
+import eventstore
+import plotjobs
 
 #
 # This calculates and plots these metrics:
@@ -45,18 +55,42 @@ TESTBED_FILES = [
 DATA_FILE = "cached_data.json"
 DATA_FILE2 = "cached_data2.json"
 
-START_TIME_MINUTES = 30
-END_TIME_MINUTES = 60
+# the analysis window, see analysiswindow.py
+START_TIME_MINUTES = analysiswindow.START_TIME_MINUTES
+END_TIME_MINUTES = analysiswindow.END_TIME_MINUTES_SIM
+LATENCY_MARGIN_SECONDS = analysiswindow.LATENCY_MARGIN_SECONDS
 
-# The root node is ignored in the calculations (XXX: maybe should not ignore its PRR?)
-ROOT_ID_SIM = 1
-ROOT_ID_TESTBED = 177
+ROOT_ID_SIM = analysiswindow.ROOT_ID_SIM
+ROOT_ID_TESTBED = analysiswindow.ROOT_ID_TESTBED
 
 # confidence interval
 CI = 0.9
 
+# the confidence intervals are bootstrapped: "percentile" or "bca"
+BOOTSTRAP_METHOD = "bca"
+BOOTSTRAP_RESAMPLES = 2000
+
 ONLY_MEDIAN = True
 
+# of the runs of a cell: the upper median of the per-run means, or the mean of all nodes
+STATISTIC = "upper_median" if ONLY_MEDIAN else "mean"
+
+# the number of worker processes used to parse the log files
+NUM_WORKERS = multiprocessing.cpu_count()
+
+# identify the cached per-log results by a content hash instead of the modification time
+CACHE_USE_HASH = False
+
+# compute the metrics from the columnar event store of each log instead of the text;
+# converts every log that is not cached yet in full, and keeps its .events.npz next to it
+USE_EVENT_STORE = False
+
+# the suffix of the cached per-minute bins of each log
+TIMESERIES_SUFFIX = ".timeseries.json"
+
+# the testbed PDR is also printed from these start times, computed from the per-minute bins
+START_TIME_CANDIDATES = [10, 20, 30, 40]
+
 ###########################################
 
 MARKERS = ["o", "s", "X", "X", "X", "X"]
@@ -65,26 +99,25 @@ BASIC_MARKERS = ["o", "s", "X", "X", "X", "X"]
 ###########################################
 
 def graph_ci(data, ylabel, filename):
-    pl.figure(figsize=(6, 3.5))
+    plotjobs.new_figure((6, 3.5))
 
     width = 0.15
 
+    # the confidence intervals of all bars at once
+    groups = [d for algo_data in data for d in algo_data]
+    means, lower, upper = bootstrap.confidence_intervals(groups, "mean", BOOTSTRAP_METHOD, CI,
+                                                         BOOTSTRAP_RESAMPLES)
+
 #   print(filename)
+    first = 0
     for i, a in enumerate(ALGORITHMS):
         algo_data = data[i]
 #       print(ALGONAMES[i])
 
-        to_plot = []
-        yerr = []
-        for d in algo_data:
-#           if "pdr" in filename:
-#               print("d=", d)
-            mean, sigma = np.mean(d), np.std(d)
-            stderr = 1.0 * sigma / (len(d) ** 0.5)
-            ci = stats.norm.interval(CI, loc=mean, scale=stderr) - mean
-
-            to_plot.append(mean)
-            yerr.append(ci[0])
+        last = first + len(algo_data)
+        to_plot = means[first:last]
+        yerr = [means[first:last] - lower[first:last], upper[first:last] - means[first:last]]
+        first = last
 
         x = np.arange(len(to_plot)) + (1.0 - width * 2) + width * i
         if 0:
@@ -119,8 +152,9 @@ def graph_ci(data, ylabel, filename):
 
 ###########################################
 
-def graph_line(xdata, ydata, xlabel, ylabel, pointlabels, filename):
-    pl.figure(figsize=(6, 3.5))
+# xerr and yerr, if given: per algorithm, [lower, upper] offsets from the points
+def graph_line(xdata, ydata, xlabel, ylabel, pointlabels, filename, xerr=None, yerr=None):
+    plotjobs.new_figure((6, 3.5))
 
     width = 0.15
 
@@ -141,6 +175,11 @@ def graph_line(xdata, ydata, xlabel, ylabel, pointlabels, filename):
         to_plot_y = algo_ydata #[np.mean(d) for d in algo_ydata]
 
         pl.scatter(to_plot_x, to_plot_y, label=ALGONAMES[a], color=COLORS[a])
+        if xerr is not None or yerr is not None:
+            pl.errorbar(to_plot_x, to_plot_y,
+                        xerr=xerr[i] if xerr is not None else None,
+                        yerr=yerr[i] if yerr is not None else None,
+                        fmt="none", ecolor=COLORS[a], elinewidth=0.5)
 
         if pointlabels is not None:
             for j, sf in enumerate(pointlabels[i]):
@@ -170,32 +209,26 @@ def graph_line(xdata, ydata, xlabel, ylabel, pointlabels, filename):
     else:
         pl.savefig(OUT_DIR + "/" + filename, format='pdf',
                    bbox_inches='tight')
-    pl.close()
 
 ###########################################
 
 def get_seqnums(send_interval, start_time = START_TIME_MINUTES):
-    duration_seconds = (END_TIME_MINUTES - START_TIME_MINUTES) * 60
-    num_packets = duration_seconds // send_interval
-    if start_time <= START_TIME_MINUTES:
-        first_packet = 1
-    else:
-        skipped_seqnums = (start_time - START_TIME_MINUTES) * 60 // send_interval
-        first_packet = 1 + skipped_seqnums
-    return (first_packet, num_packets)
+    return analysiswindow.seqnum_window(send_interval, END_TIME_MINUTES, start_time)
 
 ###########################################
 
 class MoteStats:
-    def __init__(self, id):
+    def __init__(self, id, first_seqnum, last_seqnum):
         self.id = id
-        self.seqnums = set()
+        # the received seqnums in the range [first_seqnum, last_seqnum]
+        self.seqnums = seqnums.SeqnumBitmap(first_seqnum, last_seqnum)
         self.associated_at_minutes = None
         self.packets_tx = 0
         self.packets_ack = 0
         self.radio_on = 0
         self.radio_total = 0
         self.is_valid = False
+        self.queue_losses = 0
 
     def calc(self, send_interval, first_seqnum, last_seqnum):
         if self.associated_at_minutes is None:
@@ -235,7 +268,30 @@ class MoteStats:
 
 ###########################################
 
-def process_file(filename, experiment, send_interval, is_testbed=False):
+def bin_event(series, kind, ts, node, args, is_receiver, is_testbed, node_id_to_mote_id):
+    if kind == logparse.EV_ASSOC:
+        series.add_assoc(node, ts)
+    elif kind == logparse.EV_SEQNUM:
+        sn, direction, fromnode = args
+        if is_receiver and direction == "from":
+            if is_testbed:
+                # as for the scalar metrics, which map the unknown node IDs to 0, i.e. to no mote
+                fromnode = node_id_to_mote_id.get(fromnode, 0)
+            if fromnode != 0:
+                series.add_seqnum(fromnode, ts, sn)
+    elif kind == logparse.EV_LINK_STATS:
+        series.add(node, ts, "tx", args[0])
+        series.add(node, ts, "ack", args[1])
+    elif kind == logparse.EV_ENERGEST:
+        series.add(node, ts, "radio_on", args[0])
+        series.add(node, ts, "radio_total", args[1])
+    elif kind == logparse.EV_QUEUE_DROP:
+        series.add(node, ts, "queue_losses")
+
+###########################################
+
+# if series is given, also fill it with per-minute bins of the whole log
+def process_file(filename, experiment, send_interval, is_testbed=False, series=None):
     motes = {}
     has_assoc = set()
     node_id_to_mote_id = {}
@@ -244,47 +300,37 @@ def process_file(filename, experiment, send_interval, is_testbed=False):
     in_initialization = True
 
     first_seqnum, last_seqnum = get_seqnums(send_interval)
-    start_ts_unix = None
 
     ROOT_ID = ROOT_ID_TESTBED if is_testbed else ROOT_ID_SIM
 
-    with open(filename, "r") as f:
-        for line in f:
-            if is_testbed:
-                fields1 = line.strip().split(";")
-                fields2 = fields1[2].split()
-                fields = fields1[:2] + fields2
-            else:
-                fields = line.strip().split()
-
-            try:
-                # in milliseconds
-                if is_testbed:
-                    ts_unix = float(fields[0])
-                    if start_ts_unix is None:
-                        start_ts_unix = ts_unix
-                    ts_unix -= start_ts_unix
-                    ts = int(float(ts_unix) * 1000)
-                    node = int(fields[1][3:])
-                else:
-                    ts = int(fields[0]) // 1000
-                    node = int(fields[1]) 
-            except:
-                # failed to extract timestamp
-                continue
+    end_ts = (END_TIME_MINUTES * 60 + LATENCY_MARGIN_SECONDS) * 1000
 
-            if node not in motes:
-                motes[node] = MoteStats(node)
+    with logreader.WindowReader(filename, is_testbed) as reader:
+        if series is None:
+            # skip the initialization, except for the association and node ID lines
+            lines = reader.lines(START_TIME_MINUTES * 60 * 1000, end_ts)
+        else:
+            lines = reader.lines(-1)
+        for kind, ts, node, args in logparse.tokenize(lines, is_testbed, reader.start_ts_unix):
+            if kind == logparse.EV_NODE:
+                motes[node] = MoteStats(node, first_seqnum, last_seqnum)
+                continue
 
-            if is_testbed and "Node ID:" in line:
+            if kind == logparse.EV_NODE_ID:
                 # 1570531244.735377;m3-197;[INFO: Main      ] Node ID: 43378
-                node_id = int(fields[7])
-                node_id_to_mote_id[node_id] = node
+                if is_testbed:
+                    node_id_to_mote_id[args[0]] = node
+                continue
 
-            if "association done (1" in line:
-                #print(line)
+            if series is not None:
+                bin_event(series, kind, ts, node, args,
+                          node == ROOT_ID or "local" in experiment, is_testbed, node_id_to_mote_id)
+                if ts > end_ts:
+                    continue
+
+            if kind == logparse.EV_ASSOC:
                 has_assoc.add(node)
-                motes[node].seqnums = set()
+                motes[node].seqnums.clear()
                 motes[node].associated_at_minutes = (ts // 1000 + 59) // 60
                 continue
 
@@ -295,19 +341,20 @@ def process_file(filename, experiment, send_interval, is_testbed=False):
                 else:
                     continue
 
+            # both for root and normal nodes
+            if kind == logparse.EV_QUEUE_DROP:
+                # account for queue drops
+                motes[node].queue_losses += 1
+                continue
+
             if node == ROOT_ID or "local" in experiment:
                 # 314937392 1 [INFO: Node      ] seqnum=6 from=fd00::205:5:5:5
-                if "seqnum=" in line:
-                    #print(line)
-                    sn = int(fields[5].split("=")[1])
+                if kind == logparse.EV_SEQNUM:
+                    sn, direction, fromnode = args
                     if not (first_seqnum <= sn <= last_seqnum):
                         continue
-                    if "=" not in fields[6]:
-                        continue
-                    fromtext, fromaddr = fields[6].split("=")
                     # this is needed to distinguish between "from" and "to" in the query example
-                    if fromtext == "from":
-                        fromnode = int(fromaddr.split(":")[-1], 16)
+                    if direction == "from":
                         if is_testbed:
                             fromnode = node_id_to_mote_id.get(fromnode, 0)
                         if fromnode in has_assoc:
@@ -323,28 +370,21 @@ def process_file(filename, experiment, send_interval, is_testbed=False):
                 continue
 
             # 600142000 28 [INFO: Link Stats] num packets: tx=0 ack=0 rx=0 to=0014.0014.0014.0014
-            if "num packets" in line:
-                tx = int(fields[7].split("=")[1])
-                ack = int(fields[8].split("=")[1])
-                rx = int(fields[9].split("=")[1])
+            if kind == logparse.EV_LINK_STATS:
+                tx, ack, rx = args
                 motes[node].packets_tx += tx
                 motes[node].packets_ack += ack
                 continue
-          
+
             # 600073000:8 [INFO: Energest  ] Radio total :    1669748/  60000000 (27 permil)
-            if "Radio total" in line:
+            if kind == logparse.EV_ENERGEST:
                 # only account for the period when data packets are sent
                 if ts > START_TIME_MINUTES * 60 * 1000:
-                    on = int(fields[8][:-1])
-                    total = int(fields[9])
+                    on, total = args
                     motes[node].radio_on += on
                     motes[node].radio_total += total
                     continue
 
-            if "add packet failed" in line:
-                # TODO: account for queue drops!
-                continue
-
     r = []
     for k in motes:
         m = motes[k]
@@ -353,13 +393,120 @@ def process_file(filename, experiment, send_interval, is_testbed=False):
         m.calc(send_interval, first_seqnum, last_seqnum)
         if m.is_valid:
             #print(" ", m.id, m.pdr, m.prr)
-            r.append((m.pdr, m.prr, m.rdc))
+            r.append((m.pdr, m.prr, m.rdc, m.queue_losses))
 #        else:
 #            print("mote {} does not have valid PDR: packets={}".format(m.id, m.seqnums))
     return r
 
 ###########################################
 
+def process_events(filename, experiment, send_interval, is_testbed=False):
+    # same as process_file, but vectorized over the columnar event store of the file
+    print(filename)
+
+    columns = eventstore.load_columns(filename,
+                                      ["ts", "node", "kind", "seqnum", "direction", "from_node",
+                                       "tx", "ack", "radio_on", "radio_total"],
+                                      is_testbed)
+    ts = columns["ts"]
+    node = columns["node"]
+    kind = columns["kind"]
+    num_events = len(kind)
+    index = np.arange(num_events)
+
+    first_seqnum, last_seqnum = get_seqnums(send_interval)
+
+    ROOT_ID = ROOT_ID_TESTBED if is_testbed else ROOT_ID_SIM
+
+    # the motes, in the order of their first line
+    mote_ids = node[kind == logparse.EV_NODE].tolist()
+    max_id = max(mote_ids) + 1 if mote_ids else 1
+
+    # the index of the first and the last association event of each node
+    first_assoc = np.full(max_id, num_events)
+    last_assoc = np.full(max_id, -1)
+    is_assoc = kind == logparse.EV_ASSOC
+    np.minimum.at(first_assoc, node[is_assoc], index[is_assoc])
+    np.maximum.at(last_assoc, node[is_assoc], index[is_assoc])
+
+    # ignore the first N minutes of the test, while the network is being built
+    is_data = ~is_assoc & (kind != logparse.EV_NODE) & (kind != logparse.EV_NODE_ID)
+    after_start = np.flatnonzero(is_data & (ts > START_TIME_MINUTES * 60 * 1000))
+    window_start = after_start[0] if len(after_start) else num_events
+    in_window = is_data & (index >= window_start) \
+        & (ts <= (END_TIME_MINUTES * 60 + LATENCY_MARGIN_SECONDS) * 1000)
+
+    # both for root and normal nodes
+    is_drop = in_window & (kind == logparse.EV_QUEUE_DROP)
+    queue_losses = np.bincount(node[is_drop], minlength=max_id)
+
+    if "local" in experiment:
+        is_receiver = np.ones(num_events, dtype=bool)
+        is_accounted = in_window
+    else:
+        # ignore the root, except for PDR
+        is_receiver = node == ROOT_ID
+        is_accounted = in_window & ~is_receiver
+
+    # the seqnums received from each node after its last association
+    seqnum = columns["seqnum"]
+    is_rx = in_window & is_receiver & (kind == logparse.EV_SEQNUM) \
+        & (columns["direction"] == eventstore.DIR_FROM) \
+        & (first_seqnum <= seqnum) & (seqnum <= last_seqnum)
+    rx_index = index[is_rx]
+    rx_seqnum = seqnum[is_rx]
+    rx_from = columns["from_node"][is_rx]
+    if is_testbed:
+        sel = kind == logparse.EV_NODE_ID
+        node_id_to_mote_id = dict(zip(columns["from_node"][sel].tolist(), node[sel].tolist()))
+        rx_from = np.array([node_id_to_mote_id.get(u, 0) for u in rx_from.tolist()], dtype=np.int64)
+    is_known = (rx_from >= 0) & (rx_from < max_id)
+    rx_index = rx_index[is_known]
+    rx_seqnum = rx_seqnum[is_known]
+    rx_from = rx_from[is_known]
+    is_valid_rx = (last_assoc[rx_from] >= 0) & (rx_index > last_assoc[rx_from])
+    received = seqnums.receipt_matrix(max_id, first_seqnum, last_seqnum,
+                                      rx_from[is_valid_rx], rx_seqnum[is_valid_rx])
+    num_received = seqnums.count_received(received)
+
+    # only the nodes that have associated
+    is_accounted = is_accounted & (index > first_assoc[np.minimum(node, max_id - 1)])
+
+    # 600142000 28 [INFO: Link Stats] num packets: tx=0 ack=0 rx=0 to=0014.0014.0014.0014
+    is_stats = is_accounted & (kind == logparse.EV_LINK_STATS)
+    packets_tx = np.bincount(node[is_stats], weights=columns["tx"][is_stats], minlength=max_id)
+    packets_ack = np.bincount(node[is_stats], weights=columns["ack"][is_stats], minlength=max_id)
+
+    # 600073000:8 [INFO: Energest  ] Radio total :    1669748/  60000000 (27 permil)
+    # only account for the period when data packets are sent
+    is_energest = is_accounted & (kind == logparse.EV_ENERGEST) \
+        & (ts > START_TIME_MINUTES * 60 * 1000)
+    radio_on = np.zeros(max_id, dtype=np.int64)
+    radio_total = np.zeros(max_id, dtype=np.int64)
+    np.add.at(radio_on, node[is_energest], columns["radio_on"][is_energest])
+    np.add.at(radio_total, node[is_energest], columns["radio_total"][is_energest])
+
+    r = []
+    for k in mote_ids:
+        if k == ROOT_ID:
+            continue
+        m = MoteStats(k, first_seqnum, last_seqnum)
+        m.seqnums = seqnums.SeqnumBitmap.from_row(first_seqnum, last_seqnum, received[k],
+                                                  int(num_received[k]))
+        if last_assoc[k] >= 0:
+            m.associated_at_minutes = (int(ts[last_assoc[k]]) // 1000 + 59) // 60
+        m.packets_tx = int(packets_tx[k])
+        m.packets_ack = int(packets_ack[k])
+        m.radio_on = int(radio_on[k])
+        m.radio_total = int(radio_total[k])
+        m.queue_losses = int(queue_losses[k])
+        m.calc(send_interval, first_seqnum, last_seqnum)
+        if m.is_valid:
+            r.append((m.pdr, m.prr, m.rdc, m.queue_losses))
+    return r
+
+###########################################
+
 def compare_basic_metrics(filenames, experiment, description, ss):
     print(description)
 
@@ -369,6 +516,8 @@ def compare_basic_metrics(filenames, experiment, description, ss):
 
     outfilename = experiment + ".pdf"
 
+    catalog = runcatalog.RunCatalog(DATA_DIRECTORY)
+
     for a in ALGORITHMS:
         print("Algorithm {}_{}".format(ALGONAMES[a], ss))
         for j, fs in enumerate(filenames):
@@ -376,16 +525,14 @@ def compare_basic_metrics(filenames, experiment, description, ss):
             t_prr_results = []
             t_rdc_results = []
 
-            path = os.path.join(DATA_DIRECTORY, "{}_{}".format(a, ss), "exp-" + experiment, fs)
+            path = os.path.join("{}_{}".format(a, ss), "exp-" + experiment, fs)
 
-            for dirname in subprocess.check_output("ls -d " + path, shell=True).split():
-                resultsfile = os.path.join(dirname.decode("ascii"), "COOJA.testlog")
-
-                if not os.access(resultsfile, os.R_OK):
+            for run in catalog.glob(path):
+                if not run.has_log:
                     continue
 
-                r = process_file(resultsfile, experiment)
-                for pdr, prr, rdc in r:
+                r = process_file(catalog.log_filename(run), experiment)
+                for pdr, prr, rdc, _ in r:
                     t_pdr_results.append(pdr)
                     t_prr_results.append(prr)
                     t_rdc_results.append(rdc)
@@ -408,6 +555,8 @@ def compare_per_duty_cycle(filenames, experiment, description):
 
     outfilename = experiment + ".pdf"
 
+    catalog = runcatalog.RunCatalog(DATA_DIRECTORY)
+
     for j, fs in enumerate(filenames):
 #        t_pdr_results = []
 #        t_prr_results = []
@@ -425,16 +574,14 @@ def compare_per_duty_cycle(filenames, experiment, description):
                 t_pdr_results = []
                 t_rdc_results = []
 
-                path = os.path.join(DATA_DIRECTORY, "{}_{}".format(a, ss), "exp-" + experiment, fs)
+                path = os.path.join("{}_{}".format(a, ss), "exp-" + experiment, fs)
 
-                for dirname in subprocess.check_output("ls -d " + path, shell=True).split():
-                    resultsfile = os.path.join(dirname.decode("ascii"), "COOJA.testlog")
-
-                    if not os.access(resultsfile, os.R_OK):
+                for run in catalog.glob(path):
+                    if not run.has_log:
                         continue
 
-                    r = process_file(resultsfile, experiment)
-                    for pdr, _, rdc in r:
+                    r = process_file(catalog.log_filename(run), experiment)
+                    for pdr, _, rdc, _ in r:
                         t_pdr_results.append(pdr)
                         t_rdc_results.append(rdc)
 
@@ -457,8 +604,78 @@ def test_groups(filenames, experiment, description):
 
 ###########################################
 
-def load_all(data_directory):
+def cache_key(filename, experiment, send_interval, is_testbed=False):
+    # the cached results of a file must be invalidated if any of these change
+    params = {
+        "start_time_minutes" : START_TIME_MINUTES,
+        "end_time_minutes" : END_TIME_MINUTES,
+        "latency_margin_seconds" : LATENCY_MARGIN_SECONDS,
+        "root_id" : ROOT_ID_TESTBED if is_testbed else ROOT_ID_SIM,
+        "send_interval" : send_interval,
+        "experiment" : experiment,
+        "is_testbed" : is_testbed,
+    }
+    return resultcache.make_key(filename, params, CACHE_USE_HASH)
+
+###########################################
+
+def process_files(jobs, num_workers):
+    results = [None] * len(jobs)
+
+    # only parse the files that are new or changed since they were cached
+    keys = []
+    to_parse = []
+    for i, job in enumerate(jobs):
+        keys.append(cache_key(*job))
+        r = resultcache.load(job[0], keys[i])
+        if r is None:
+            to_parse.append(i)
+        else:
+            results[i] = [tuple(x) for x in r]
+    print("{} log files cached, {} to parse".format(len(jobs) - len(to_parse), len(to_parse)))
+
+    parse_jobs = [jobs[i] for i in to_parse]
+    parse = process_events if USE_EVENT_STORE else process_file
+    # every log file is independent, so they can be parsed in parallel
+    if num_workers <= 1 or len(parse_jobs) <= 1:
+        parsed = [parse(*job) for job in parse_jobs]
+    else:
+        with multiprocessing.Pool(min(num_workers, len(parse_jobs))) as pool:
+            # the results are returned in the order of the jobs
+            parsed = pool.starmap(parse, parse_jobs, chunksize=1)
+
+    for i, r in zip(to_parse, parsed):
+        resultcache.store(jobs[i][0], keys[i], r)
+        results[i] = r
+    return results
+
+###########################################
+
+def load_timeseries(filename, experiment, send_interval, is_testbed=False):
+    # (the scalar results, the per-minute bins of the whole log), from the cache or from a single pass
+    key = cache_key(filename, experiment, send_interval, is_testbed)
+    r = resultcache.load(filename, key)
+    d = resultcache.load(filename, key, TIMESERIES_SUFFIX)
+    if r is not None and d is not None:
+        try:
+            return [tuple(x) for x in r], timeseries.TimeSeries.from_json(d)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            # written by an older version of the bins; parse again
+            pass
+
+    series = timeseries.TimeSeries()
+    r = process_file(filename, experiment, send_interval, is_testbed, series)
+    resultcache.store(filename, key, r)
+    resultcache.store(filename, key, series.to_json(), TIMESERIES_SUFFIX)
+    return r, series
+
+###########################################
+
+def load_all(data_directory, num_workers=NUM_WORKERS):
     data = {}
+    jobs = []
+    cells = []
+    catalog = runcatalog.RunCatalog(data_directory)
     for a in ALGORITHMS:
         data[a] = {}
         for si in SEND_INTERVALS:
@@ -470,58 +687,62 @@ def load_all(data_directory):
                     for nn in NUM_NEIGHBORS:
                         data[a][str(si)][str(sf)][exp][str(nn)] = {}
 
-                        t_pdr_results = []
-                        t_prr_results = []
-                        t_rdc_results = []
+                        first_job = len(jobs)
+                        for run in catalog.find(a, si, sf, exp, nn):
+                            if not run.has_log:
+                                continue
 
-                        a_pdr_results = []
-                        a_prr_results = []
-                        a_rdc_results = []
+                            jobs.append((catalog.log_filename(run), exp, si))
 
-                        path = os.path.join(data_directory,
-                                            a,
-                                            "si_{}".format(si),
-                                            "sf_{}".format(sf),
-                                            exp,
-                                            "sim-{}-neigh-realsim-*".format(nn))
+                        cells.append((data[a][str(si)][str(sf)][exp][str(nn)], first_job, len(jobs)))
 
-                        for dirname in subprocess.check_output("ls -d " + path, shell=True).split():
-                            resultsfile = os.path.join(dirname.decode("ascii"), "COOJA.testlog")
+    results = process_files(jobs, num_workers)
 
-                            if not os.access(resultsfile, os.R_OK):
-                                continue
+    # the samples of each cell, for the confidence intervals
+    samples = {"pdr" : [], "prr" : [], "rdc" : []}
 
-                            r = process_file(resultsfile, exp, si)
-                            pdr = [x[0] for x in r]
-                            prr = [x[1] for x in r]
-                            rdc = [x[2] for x in r]
-                            t_pdr_results += pdr
-                            t_prr_results += prr
-                            t_rdc_results += rdc
-                            a_pdr_results.append(np.mean(pdr))
-                            a_prr_results.append(np.mean(prr))
-                            a_rdc_results.append(np.mean(rdc))
-
-
-                        if ONLY_MEDIAN:
-                            if len(a_pdr_results):
-                                midpoint = len(a_pdr_results) // 2
-                                print("pdr=", sorted(a_pdr_results))
-                                pdr_metric = sorted(a_pdr_results)[midpoint]
-                                prr_metric = sorted(a_prr_results)[midpoint]
-                                rdc_metric = sorted(a_rdc_results)[midpoint]
-                            else:
-                                pdr_metric = 0
-                                prr_metric = 0
-                                rdc_metric = 0
-                        else:
-                            pdr_metric = np.mean(t_pdr_results)
-                            prr_metric = np.mean(t_prr_results)
-                            rdc_metric = np.mean(t_rdc_results)
-
-                        data[a][str(si)][str(sf)][exp][str(nn)]["pdr"] = pdr_metric
-                        data[a][str(si)][str(sf)][exp][str(nn)]["prr"] = prr_metric
-                        data[a][str(si)][str(sf)][exp][str(nn)]["rdc"] = rdc_metric
+    for cell, first_job, last_job in cells:
+        t_pdr_results = []
+        t_prr_results = []
+        t_rdc_results = []
+
+        a_pdr_results = []
+        a_prr_results = []
+        a_rdc_results = []
+
+        for r in results[first_job:last_job]:
+            pdr = [x[0] for x in r]
+            prr = [x[1] for x in r]
+            rdc = [x[2] for x in r]
+            t_pdr_results += pdr
+            t_prr_results += prr
+            t_rdc_results += rdc
+            a_pdr_results.append(np.mean(pdr))
+            a_prr_results.append(np.mean(prr))
+            a_rdc_results.append(np.mean(rdc))
+
+        if ONLY_MEDIAN:
+            print("pdr=", sorted(a_pdr_results))
+            samples["pdr"].append(a_pdr_results)
+            samples["prr"].append(a_prr_results)
+            samples["rdc"].append(a_rdc_results)
+        else:
+            samples["pdr"].append(t_pdr_results)
+            samples["prr"].append(t_prr_results)
+            samples["rdc"].append(t_rdc_results)
+
+    # bootstrap the confidence intervals of the whole grid at once;
+    # the metric is the point estimate of the same statistic as its interval
+    for metric in samples:
+        estimates, lower, upper = bootstrap.confidence_intervals(samples[metric], STATISTIC, BOOTSTRAP_METHOD,
+                                                                 CI, BOOTSTRAP_RESAMPLES)
+        for (cell, _, _), value, lo, hi in zip(cells, estimates, lower, upper):
+            if ONLY_MEDIAN and np.isnan(value):
+                # no data
+                value = 0.0
+            cell[metric] = float(value)
+            # no data: the interval the same as the metric itself
+            cell[metric + "_ci"] = [0.0, 0.0] if np.isnan(lo) else [float(lo), float(hi)]
     return data
 
 ###########################################
@@ -533,10 +754,13 @@ def aggregate(data, a, si, sf, exp, nn, metric):
 
 def plot_all(data, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             pdr_results = [[] for _ in ALGORITHMS]
             rdc_results = [[] for _ in ALGORITHMS]
+            pdr_errors = [[[], []] for _ in ALGORITHMS]
+            rdc_errors = [[[], []] for _ in ALGORITHMS]
             pointlabels = [[] for _ in ALGORITHMS]    
             for sf in SLOTFRAME_SIZES:
                 sfs = "sf={}".format(sf)
@@ -545,16 +769,26 @@ def plot_all(data, exp):
                     print("Algorithm {}".format(ALGONAMES[a]))
                     rdc_results[i].append(aggregate(data, a, si, sf, exp, nn, "rdc"))
                     pdr_results[i].append(aggregate(data, a, si, sf, exp, nn, "pdr"))
+                    for errors, metric in ((rdc_errors, "rdc"), (pdr_errors, "pdr")):
+                        lower, upper = aggregate(data, a, si, sf, exp, nn, metric + "_ci")
+                        value = aggregate(data, a, si, sf, exp, nn, metric)
+                        errors[i][0].append(value - lower)
+                        errors[i][1].append(upper - value)
                     pointlabels[i].append(sfs)
 
             filename = "sim_{}_pdr_per_duty_cycle_allsf_nn{}_si{}.pdf".format(exp, nn, si)
-            graph_line(rdc_results,  pdr_results, "Duty cycle, %", "End-to-end PDR, %", pointlabels,
-                       filename)
+            jobs.append(plotjobs.PlotJob(graph_line,
+                                         (rdc_results, pdr_results, "Duty cycle, %", "End-to-end PDR, %",
+                                          pointlabels, filename),
+                                         {"xerr" : rdc_errors, "yerr" : pdr_errors},
+                                         filename))
+    return jobs
 
 ###########################################
 
 def plot_comparative_runs(data1, data2, exp):
     # plot all per duty cycle
+    jobs = []
     for nn in NUM_NEIGHBORS:
         for si in SEND_INTERVALS:
             for i, a in enumerate(ALGORITHMS):
@@ -575,14 +809,18 @@ def plot_comparative_runs(data1, data2, exp):
                     pointlabels[1].append(sfs)
 
                 filename = "sim_comparative_{}_{}_pdr_per_duty_cycle_allsf_nn{}_si{}.pdf".format(exp, a, nn, si)
-                graph_line(rdc_results,  pdr_results, "Duty cycle, %", "End-to-end PDR, %", pointlabels,
-                           filename)
+                jobs.append(plotjobs.PlotJob(graph_line,
+                                             (rdc_results, pdr_results, "Duty cycle, %", "End-to-end PDR, %",
+                                              pointlabels, filename),
+                                             {}, filename))
+    return jobs
 
 ###########################################
             
 def plot_best_per_send_frequency(data, exp):
 
     # plot comparison of the best
+    jobs = []
     for sfi in range(3):
         for nn in NUM_NEIGHBORS:
             pdr_results = [[] for _ in BEST_ALGORITHMS]
@@ -609,21 +847,20 @@ def plot_best_per_send_frequency(data, exp):
                     pointlabels[i].append("rdc={:.1f}%".format(rdc_results[i][-1])) # the PDR
 
             filename = "sim_{}_pdr_per_sfr_sf{}_nn{}.pdf".format(exp, sf, nn)
-            graph_line(si_results, pdr_results, "Send frequency, packets / minute", "End-to-end PDR, %", pointlabels,
-                       filename)
+            jobs.append(plotjobs.PlotJob(graph_line,
+                                         (si_results, pdr_results, "Send frequency, packets / minute",
+                                          "End-to-end PDR, %", pointlabels, filename),
+                                         {}, filename))
+    return jobs
 
 ###########################################
 
 def ensure_loaded(data_file, data_directory):
-    if os.access(data_file, os.R_OK):
-        print("Cached file found, using it directly")
-        with open(data_file, "r") as f:
-            data = json.load(f)
-    else:
-        print("Cached file not found, parsing log files...")
-        data = load_all(data_directory)
-        with open(data_file, "w") as f:
-            json.dump(data, f)
+    # the results of each log file are cached separately,
+    # so only the new or changed log files are parsed here
+    data = load_all(data_directory)
+    with open(data_file, "w") as f:
+        json.dump(data, f)
     return data
 
 ###########################################
@@ -632,13 +869,14 @@ def load_testbed():
     si = 6
     exp = "exp-collection"
     for tf in TESTBED_FILES:
-        r = process_file(tf, exp, si, True)
+        # the log may have been compressed
+        r, series = load_timeseries(logfile.find_log(tf), exp, si, True)
 
         t_pdr_results = []
         t_prr_results = []
         t_rdc_results = []
 
-        for pdr, prr, rdc in r:
+        for pdr, prr, rdc, _ in r:
             t_pdr_results.append(pdr)
             t_prr_results.append(prr)
             t_rdc_results.append(rdc)
@@ -646,6 +884,12 @@ def load_testbed():
         pdr = np.mean(t_pdr_results)
         print(tf, "PDR=", pdr)
         print("  ", sorted(t_pdr_results))
+        # the same from other start times, to choose START_TIME_MINUTES without parsing the log again
+        nodes = [node for node in sorted(series.bins) if node != ROOT_ID_TESTBED]
+        for start in START_TIME_CANDIDATES:
+            if nodes:
+                pdr = np.mean([series.window(node, start, END_TIME_MINUTES, si)[0] for node in nodes])
+                print("   from minute {}: PDR={:.2f}".format(start, pdr))
 
 ###########################################
 
@@ -660,10 +904,14 @@ def main():
 
     load_testbed()
 
+    jobs = []
     for exp in EXPERIMENTS:
-        plot_all(data1, exp)
-#        plot_best_per_send_frequency(data1, exp)
-#        plot_comparative_runs(data1, data2, exp)
+        jobs += plot_all(data1, exp)
+#        jobs += plot_best_per_send_frequency(data1, exp)
+#        jobs += plot_comparative_runs(data1, data2, exp)
+
+    # only the plots with changed data are rendered again
+    plotjobs.render_all(jobs, OUT_DIR, NUM_WORKERS)
 
 ###########################################
 
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+
+import sys
+import time
+import warnings
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+#
+# Batched bootstrap confidence intervals.
+#
+# All groups (e.g. all cells of the algorithm x slotframe x neighbor count grid)
+# are resampled at once: the samples are stored in a 2-D array with one row per group,
+# padded with NaN, as the groups can have different sizes.
+#
+# Supported statistics: "mean", "median", "upper_median" (the upper one of the two middle values
+# of an even number of samples); supported methods: "percentile", "bca".
+#
+
+DEFAULT_RESAMPLES = 2000
+
+# limit the size of the temporary arrays: groups x resamples x samples
+MAX_CHUNK_ELEMENTS = 16 * 1024 * 1024
+
+###########################################
+
+def nan_upper_median(values, axis):
+    # sorted(x)[len(x) // 2] of the non-NaN values, as the analyzers take the median; NaN if there are none
+    counts = np.sum(~np.isnan(values), axis=axis, keepdims=True)
+    # NaN sorts last
+    index = np.minimum(counts // 2, values.shape[axis] - 1)
+    r = np.take_along_axis(np.sort(values, axis=axis), index, axis=axis)
+    return np.squeeze(np.where(counts > 0, r, np.nan), axis=axis)
+
+STATISTICS = {
+    "mean" : np.nanmean,
+    "median" : np.nanmedian,
+    "upper_median" : nan_upper_median,
+}
+
+###########################################
+
+def to_padded(groups):
+    # list of sequences -> 2-D array padded with NaN, and the sizes of the groups
+    sizes = np.array([len(g) for g in groups], dtype=np.int64)
+    values = np.full((len(groups), max(1, sizes.max() if len(sizes) else 1)), np.nan)
+    for i, g in enumerate(groups):
+        values[i, :len(g)] = g
+    return values, sizes
+
+###########################################
+
+def resample_stats(values, sizes, statistic, num_resamples, rng):
+    # the statistic of each resample: shape (groups, resamples)
+    func = STATISTICS[statistic]
+    num_groups, max_size = values.shape
+    chunk = max(1, MAX_CHUNK_ELEMENTS // (num_resamples * max_size))
+    r = np.full((num_groups, num_resamples), np.nan)
+    for start in range(0, num_groups, chunk):
+        v = values[start:start + chunk]
+        n = sizes[start:start + chunk]
+        # uniform indices in [0, n) of each group
+        u = rng.random((len(v), num_resamples, max_size))
+        idx = (u * np.maximum(n, 1)[:, None, None]).astype(np.int64)
+        samples = np.take_along_axis(v[:, None, :], idx, axis=2)
+        # only the first n positions of each resample belong to it
+        samples = np.where(np.arange(max_size)[None, None, :] >= n[:, None, None], np.nan, samples)
+        with warnings.catch_warnings():
+            # the statistics of empty groups are NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            r[start:start + chunk] = func(samples, axis=2) if v.size else np.nan
+    return r
+
+###########################################
+
+def jackknife_acceleration(values, sizes, statistic):
+    # the acceleration of the BCa method, from the leave-one-out statistics
+    func = STATISTICS[statistic]
+    num_groups, max_size = values.shape
+    a = np.zeros(num_groups)
+    chunk = max(1, MAX_CHUNK_ELEMENTS // (max_size * max_size))
+    for start in range(0, num_groups, chunk):
+        v = values[start:start + chunk]
+        loo = np.repeat(v[:, None, :], max_size, axis=1)
+        loo[:, np.arange(max_size), np.arange(max_size)] = np.nan
+        with warnings.catch_warnings():
+            # the statistics of empty groups are NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            theta = func(loo, axis=2)
+            # only the first n leave-one-out statistics are valid
+            theta[np.arange(max_size)[None, :] >= sizes[start:start + chunk, None]] = np.nan
+            d = np.nanmean(theta, axis=1)[:, None] - theta
+            num = np.nansum(d ** 3, axis=1)
+            den = 6.0 * np.nansum(d ** 2, axis=1) ** 1.5
+            a[start:start + chunk] = np.where(den > 0, num / np.where(den > 0, den, 1.0), 0.0)
+    return a
+
+###########################################
+
+def confidence_intervals(groups, statistic="mean", method="bca", ci=0.9,
+                         num_resamples=DEFAULT_RESAMPLES, seed=None):
+    # returns (estimates, lower bounds, upper bounds), one per group; NaN for empty groups
+    rng = np.random.default_rng(seed)
+    values, sizes = to_padded(groups)
+    func = STATISTICS[statistic]
+    with warnings.catch_warnings():
+        # the statistics of empty groups are NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        estimates = func(values, axis=1)
+
+    boot = np.sort(resample_stats(values, sizes, statistic, num_resamples, rng), axis=1)
+
+    alpha = (1.0 - ci) / 2.0
+    if method == "percentile":
+        q = np.tile([alpha, 1.0 - alpha], (len(groups), 1))
+    elif method == "bca":
+        # bias correction; the ties count half, as the medians of few samples are often tied
+        # (e.g. at a PDR of 100%), and clipped, so that degenerate groups stay finite
+        prop = np.mean(boot < estimates[:, None], axis=1) + 0.5 * np.mean(boot == estimates[:, None], axis=1)
+        prop = np.clip(prop, 0.5 / num_resamples, 1.0 - 0.5 / num_resamples)
+        z0 = ndtri(prop)
+        a = jackknife_acceleration(values, sizes, statistic)
+        z = ndtri(np.array([alpha, 1.0 - alpha]))[None, :]
+        q = ndtr(z0[:, None] + (z0[:, None] + z) / (1.0 - a[:, None] * (z0[:, None] + z)))
+    else:
+        raise ValueError("unknown bootstrap method: " + method)
+
+    idx = np.clip(np.round(q * (num_resamples - 1)).astype(np.int64), 0, num_resamples - 1)
+    bounds = np.take_along_axis(boot, idx, axis=1)
+
+    # no variation, e.g. a single sample
+    constant = boot[:, 0] == boot[:, -1]
+    bounds[constant] = estimates[constant, None]
+    empty = sizes == 0
+    estimates[empty] = np.nan
+    bounds[empty] = np.nan
+    return estimates, bounds[:, 0], bounds[:, 1]
+
+###########################################
+
+def main():
+    # benchmark on a grid of the size of the full sweep
+    num_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 5 * 6 * 2 * 2
+    group_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rng = np.random.default_rng(0)
+    groups = [rng.normal(90, 5, group_size) for _ in range(num_groups)]
+    for statistic in STATISTICS:
+        for method in ("percentile", "bca"):
+            start = time.time()
+            confidence_intervals(groups, statistic, method)
+            print("{} groups x {} samples, {} {}: {:.2f} seconds".format(
+                num_groups, group_size, statistic, method, time.time() - start))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
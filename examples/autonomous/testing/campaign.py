@@ -0,0 +1,347 @@
+#!/usr/bin/python3
+
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+
+import logfile
+import livestats
+import fwbuild
+import iotlabmock
+from campaignmanifest import *
+
+#
+# Campaign runner of the IoT-LAB experiments, in place of experiment-all.sh.
+#
+# Each firmware in the firmware directory is run once on each node set of NODE_SETS. A job goes through
+# the states pending -> submitted -> flashing -> logging -> done, or ends as failed or aborted.
+# Up to MAX_ACTIVE jobs are in progress at the same time, so the next experiment is submitted
+# while the current one is still logging, and it is flashed and logged as soon as the testbed starts it
+# (when the node sets overlap, that is when the current one ends). A failed submission, an experiment
+# that ends before it starts and a failed flashing are retried with a new experiment after
+# RETRY_SECONDS, up to MAX_ATTEMPTS times per job.
+#
+# The output of serial_aggregator is written under a temporary name and followed with livestats.py,
+# so that a hopeless run is stopped early (aborted). When the experiment ends, the log gets the name
+# that analyze-testbed.py expects (see testbed_filename there), and is compressed.
+#
+# The state of all jobs is written to MANIFEST_FILENAME in the log directory after each change
+# (see campaignmanifest.py). analyze-testbed.py reads it to skip the logs of the jobs that did not finish,
+# and an interrupted campaign continues from it: the jobs that are done or aborted are not run again.
+#
+# With --mock, iotlabmock.py stands in for the testbed tools.
+#
+# Usage: ./campaign.py [--mock] [<firmware directory> [<log directory>]]
+#
+
+EXPERIMENT_NAME = "a2941"
+SITE = "grenoble"
+ARCHI = "m3"
+DURATION_MINUTES = 61
+
+# (name, number of neighbors, nodes); the name is the prefix of the log
+NODE_SETS = [
+    ("sparse", 4, "4+11+20+41+51+60+69+73+82+91+105+123+141+159+177+184+193+202+221+239+259+277+294+301+310+319+328+337+346+355+363"),
+    ("dense", 10, "119+123+127+131+135+139+143+147+151+156+159+163+167+177+179+181+183+185+188+190+193+195+197+199+201+203+205+207+211+215+219"),
+]
+
+# the jobs between the submission and the end of the logging
+MAX_ACTIVE = 2
+MAX_ATTEMPTS = 3
+RETRY_SECONDS = 60
+POLL_SECONDS = 10
+# the logging is stopped at the latest this long after the end of the reservation
+END_MARGIN_MINUTES = 2
+# of the testbed tools
+COMMAND_TIMEOUT_SECONDS = 300
+
+# None to keep the logs uncompressed
+COMPRESS_LOGS = "gzip"
+# stop the runs that look hopeless, see livestats.py
+LIVE_ABORT = True
+
+# the experiment states after which an experiment does not start anymore
+ENDED_STATES = ("Terminated", "Stopped", "Error")
+
+# <algorithm>_si_<si>_sf_<sf>_<experiment>.iotlab, see fwbuild.firmware_filename
+FIRMWARE_RE = re.compile(r"(.+)_si_(\d+)_sf_(\d+)_(.+)\.iotlab$")
+
+###########################################
+
+class Tools:
+    # the command lines of the testbed tools
+    def __init__(self, mock=False):
+        if mock:
+            prefix = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "iotlabmock.py")]
+            self.experiment = prefix + ["experiment"]
+            self.node = prefix + ["node"]
+            self.serial_aggregator = prefix + ["serial_aggregator"]
+            self.minute_seconds = iotlabmock.minute_seconds()
+            self.poll_seconds = min(POLL_SECONDS, self.minute_seconds)
+            self.retry_seconds = min(RETRY_SECONDS, self.minute_seconds)
+        else:
+            self.experiment = ["iotlab-experiment"]
+            self.node = ["iotlab-node"]
+            self.serial_aggregator = ["serial_aggregator"]
+            self.minute_seconds = 60.0
+            self.poll_seconds = POLL_SECONDS
+            self.retry_seconds = RETRY_SECONDS
+
+###########################################
+
+def run_command(args):
+    # returns (the JSON output or None, error message or None)
+    try:
+        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                              timeout=COMMAND_TIMEOUT_SECONDS)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return None, str(e)
+    if proc.returncode != 0:
+        return None, proc.stderr.decode("utf-8", "replace").strip() or "exit status {}".format(proc.returncode)
+    try:
+        return json.loads(proc.stdout.decode("utf-8", "replace")), None
+    except ValueError:
+        return None, "unexpected output: " + proc.stdout.decode("utf-8", "replace")[:200]
+
+###########################################
+
+def new_jobs(firmware_directory):
+    # in the order of experiment-all.sh: all node sets of a firmware, then the next firmware
+    jobs = []
+    for firmware in sorted(os.listdir(firmware_directory)):
+        m = FIRMWARE_RE.match(firmware)
+        if m is None:
+            continue
+        for name, nn, nodes in NODE_SETS:
+            jobs.append({
+                "log" : "{}-{}".format(name, firmware[:-len("iotlab")] + "log"),
+                "firmware" : firmware,
+                "algorithm" : m.group(1),
+                "send_interval" : int(m.group(2)),
+                "slotframe_size" : int(m.group(3)),
+                "experiment" : m.group(4),
+                "node_set" : name,
+                "num_neighbors" : nn,
+                "nodes" : nodes,
+                "state" : JOB_PENDING,
+                "attempts" : 0,
+                "experiment_id" : None,
+                "submitted_at" : None,
+                "started_at" : None,
+                "finished_at" : None,
+                "stored_log" : None,
+                "log_bytes" : None,
+                "abort_reason" : None,
+                "error" : None,
+            })
+    return jobs
+
+###########################################
+
+class Campaign:
+    def __init__(self, tools, firmware_directory, log_directory):
+        self.tools = tools
+        self.firmware_directory = firmware_directory
+        self.log_directory = log_directory
+        # log name -> the logging process, the log file, its LogTail and LiveStats
+        self.logging = {}
+        # log name -> the earliest time of the next attempt
+        self.not_before = {}
+
+        previous = load_manifest(log_directory)
+        self.jobs = []
+        for job in new_jobs(firmware_directory):
+            old = previous.get(job["log"])
+            if old is not None and old["state"] in (JOB_DONE, JOB_ABORTED) and old["stored_log"] \
+               and os.access(os.path.join(log_directory, old["stored_log"]), os.R_OK):
+                job = old
+            elif old is not None and old["state"] in ACTIVE_STATES and old["experiment_id"] is not None:
+                # interrupted: the reservation is not needed anymore
+                self.stop_experiment(old)
+            self.jobs.append(job)
+
+    def store(self):
+        store_manifest(self.log_directory, {"name" : EXPERIMENT_NAME, "site" : SITE,
+                                            "duration_minutes" : DURATION_MINUTES}, self.jobs)
+
+    def tmp_log_filename(self, job):
+        return "{}.{}.tmp".format(os.path.join(self.log_directory, job["log"]), os.getpid())
+
+    def experiment_state(self, job):
+        result, error = run_command(self.tools.experiment + ["get", "-i", str(job["experiment_id"]), "-s"])
+        if result is None:
+            # e.g. a network error; asked again at the next poll
+            print("  {}: experiment state: {}".format(job["log"], error))
+            return None
+        return result.get("state")
+
+    def stop_experiment(self, job):
+        # failures are not fatal: the reservation ends by itself
+        run_command(self.tools.experiment + ["stop", "-i", str(job["experiment_id"])])
+
+    def fail_attempt(self, job, error):
+        print("  {}: attempt {} failed: {}".format(job["log"], job["attempts"], error))
+        job["error"] = error
+        if job["experiment_id"] is not None:
+            self.stop_experiment(job)
+            job["experiment_id"] = None
+        if job["attempts"] >= MAX_ATTEMPTS:
+            job["state"] = JOB_FAILED
+        else:
+            job["state"] = JOB_PENDING
+            self.not_before[job["log"]] = time.time() + self.tools.retry_seconds
+
+    def submit(self, job):
+        job["attempts"] += 1
+        result, error = run_command(self.tools.experiment + [
+            "submit", "-n", EXPERIMENT_NAME, "-d", str(DURATION_MINUTES),
+            "-l", "{},{},{}".format(SITE, ARCHI, job["nodes"])])
+        if result is None or "id" not in result:
+            self.fail_attempt(job, "submission: " + (error or "no experiment ID"))
+            return
+        job["experiment_id"] = result["id"]
+        job["submitted_at"] = time.time()
+        job["state"] = JOB_SUBMITTED
+        print("  {}: submitted as experiment {}".format(job["log"], job["experiment_id"]))
+
+    def flash(self, job):
+        job["state"] = JOB_FLASHING
+        self.store()
+        result, error = run_command(self.tools.node + [
+            "--update", os.path.join(self.firmware_directory, job["firmware"]), "-i", str(job["experiment_id"])])
+        if result is None:
+            self.fail_attempt(job, "flashing: " + error)
+            return False
+        # "0": the nodes that were flashed, "1": the ones that failed
+        if result.get("1"):
+            self.fail_attempt(job, "flashing failed on {} nodes".format(len(result["1"])))
+            return False
+        return True
+
+    def start_logging(self, job):
+        tmpfilename = self.tmp_log_filename(job)
+        out = open(tmpfilename, "wb")
+        proc = subprocess.Popen(self.tools.serial_aggregator + ["-i", str(job["experiment_id"])],
+                                stdout=out, stdin=subprocess.DEVNULL)
+        self.logging[job["log"]] = (proc, out, livestats.LogTail(tmpfilename),
+                                    livestats.LiveStats(job["experiment"], job["send_interval"], True))
+        job["started_at"] = time.time()
+        job["state"] = JOB_LOGGING
+        print("  {}: logging".format(job["log"]))
+
+    def stop_logging(self, job):
+        proc, out, tail, stats = self.logging.pop(job["log"])
+        if proc.poll() is None:
+            proc.terminate()
+        proc.wait()
+        out.close()
+        tail.close()
+
+    def finish(self, job, state, reason=None):
+        self.stop_logging(job)
+        self.stop_experiment(job)
+        tmpfilename = self.tmp_log_filename(job)
+        if os.path.getsize(tmpfilename) == 0:
+            os.remove(tmpfilename)
+            self.fail_attempt(job, "empty log")
+            return
+        log_filename = os.path.join(self.log_directory, job["log"])
+        # atomic, so that the analysis never sees a partial log
+        os.replace(tmpfilename, log_filename)
+        if COMPRESS_LOGS is not None:
+            log_filename = logfile.compress(log_filename, COMPRESS_LOGS)
+        job["stored_log"] = os.path.basename(log_filename)
+        job["log_bytes"] = os.path.getsize(log_filename)
+        job["finished_at"] = time.time()
+        job["abort_reason"] = reason
+        job["error"] = None
+        job["state"] = state
+        print("  {}: {}{}".format(job["log"], state, ": " + reason if reason else ""))
+
+    def step(self, job):
+        if job["state"] == JOB_SUBMITTED:
+            state = self.experiment_state(job)
+            if state == "Running":
+                if self.flash(job):
+                    self.start_logging(job)
+            elif state in ENDED_STATES:
+                self.fail_attempt(job, "the experiment ended before it started: " + state)
+
+        elif job["state"] == JOB_LOGGING:
+            proc, out, tail, stats = self.logging[job["log"]]
+            stats.feed(tail.read_lines())
+            reason = stats.abort_reason() if LIVE_ABORT else None
+            if reason is not None:
+                self.finish(job, JOB_ABORTED, reason)
+                return
+            max_seconds = (DURATION_MINUTES + END_MARGIN_MINUTES) * self.tools.minute_seconds
+            if proc.poll() is not None or time.time() > job["started_at"] + max_seconds \
+               or self.experiment_state(job) in ENDED_STATES:
+                self.finish(job, JOB_DONE)
+
+    def stop_all(self):
+        # on an interruption: the active jobs are run again by the next invocation
+        for job in self.jobs:
+            if job["state"] == JOB_LOGGING:
+                self.stop_logging(job)
+                os.remove(self.tmp_log_filename(job))
+            if job["state"] in ACTIVE_STATES:
+                self.stop_experiment(job)
+                job["experiment_id"] = None
+                job["state"] = JOB_PENDING
+        self.store()
+
+    def run(self):
+        while True:
+            now = time.time()
+            active = [job for job in self.jobs if job["state"] in ACTIVE_STATES]
+            for job in self.jobs:
+                if len(active) >= MAX_ACTIVE:
+                    break
+                if job["state"] == JOB_PENDING and now >= self.not_before.get(job["log"], 0):
+                    self.submit(job)
+                    if job["state"] in ACTIVE_STATES:
+                        active.append(job)
+            for job in active:
+                self.step(job)
+            self.store()
+            if all(job["state"] in FINAL_STATES for job in self.jobs):
+                break
+            time.sleep(self.tools.poll_seconds)
+
+###########################################
+
+def main():
+    mock = "--mock" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--mock"]
+    if len(args) > 2:
+        print("usage: {} [--mock] [<firmware directory> [<log directory>]]".format(sys.argv[0]))
+        sys.exit(2)
+    firmware_directory = args[0] if len(args) > 0 else fwbuild.FIRMWARE_DIRECTORY
+    log_directory = args[1] if len(args) > 1 else firmware_directory
+
+    campaign = Campaign(Tools(mock), firmware_directory, log_directory)
+    num_remaining = sum(1 for job in campaign.jobs if job["state"] not in FINAL_STATES)
+    print("{} jobs, {} to run".format(len(campaign.jobs), num_remaining))
+    start = time.time()
+    try:
+        campaign.run()
+    except KeyboardInterrupt:
+        print("interrupted, stopping the active experiments")
+        campaign.stop_all()
+        sys.exit(1)
+
+    counts = {}
+    for job in campaign.jobs:
+        counts[job["state"]] = counts.get(job["state"], 0) + 1
+    print("{} in {:.1f} minutes".format(
+        ", ".join("{} {}".format(n, state) for state, n in sorted(counts.items())), (time.time() - start) / 60.0))
+    sys.exit(0 if counts.get(JOB_FAILED, 0) == 0 else 1)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
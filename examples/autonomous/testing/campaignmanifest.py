@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+import os
+import json
+
+#
+# The manifest of a campaign of IoT-LAB experiments: the state of each job of campaign.py.
+#
+# campaign.py writes it to MANIFEST_FILENAME in the log directory after each change, and
+# analyze-testbed.py reads it to skip the logs of the jobs that did not finish. This module
+# has no other dependencies, so that the analysis does not need the campaign runner.
+#
+
+MANIFEST_FILENAME = "campaign.json"
+
+JOB_PENDING = "pending"
+JOB_SUBMITTED = "submitted"
+JOB_FLASHING = "flashing"
+JOB_LOGGING = "logging"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_ABORTED = "aborted"
+
+ACTIVE_STATES = (JOB_SUBMITTED, JOB_FLASHING, JOB_LOGGING)
+FINAL_STATES = (JOB_DONE, JOB_FAILED, JOB_ABORTED)
+
+###########################################
+
+def parse_manifest(f):
+    # log name -> job record
+    return {job["log"] : job for job in json.load(f)["jobs"]}
+
+###########################################
+
+def load_manifest(directory):
+    # empty if there is no manifest
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME), "r") as f:
+            return parse_manifest(f)
+    except (IOError, ValueError, KeyError):
+        return {}
+
+###########################################
+
+def store_manifest(directory, campaign, jobs):
+    # campaign: the properties of the whole campaign, e.g. the name of the experiments
+    filename = os.path.join(directory, MANIFEST_FILENAME)
+    tmpfilename = "{}.{}.tmp".format(filename, os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(dict(campaign, jobs=jobs), f, indent=2)
+    # atomic, so that a reader never sees a partial manifest
+    os.replace(tmpfilename, filename)
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import logparse
+import logfile
+
+#
+# Columnar binary store of the events in a log file.
+#
+# Each log file is converted once, on first access, to an .npz file next to it
+# with one array per column. The arrays in an .npz file are loaded lazily,
+# so the metrics read only the columns that they need.
+#
+# The columns:
+# - ts          timestamp in milliseconds
+# - node        the node that printed the line
+# - kind        one of logparse.EV_*
+# - seqnum      EV_SEQNUM: the sequence number
+# - direction   EV_SEQNUM: DIR_FROM, DIR_OTHER or DIR_NONE
+# - from_node   EV_SEQNUM: the sender; EV_NODE_ID: the node ID
+# - tx, ack, rx EV_LINK_STATS: the packet counters
+# - radio_on, radio_total EV_ENERGEST: the radio on time and the total time
+#
+
+STORE_SUFFIX = ".events.npz"
+
+# increase this when the format changes to force reconversion
+STORE_VERSION = 1
+
+DIR_NONE = 0
+DIR_FROM = 1
+DIR_OTHER = 2
+
+COLUMNS = [
+    ("ts", np.int64),
+    ("node", np.int32),
+    ("kind", np.int8),
+    ("seqnum", np.int64),
+    ("direction", np.int8),
+    ("from_node", np.int64),
+    ("tx", np.int32),
+    ("ack", np.int32),
+    ("rx", np.int32),
+    ("radio_on", np.int64),
+    ("radio_total", np.int64),
+]
+
+###########################################
+
+def store_filename(filename):
+    return filename + STORE_SUFFIX
+
+###########################################
+
+def convert(filename, is_testbed=False):
+    columns = {name : [] for name, _ in COLUMNS}
+    ts = columns["ts"]
+    node = columns["node"]
+    kind = columns["kind"]
+    seqnum = columns["seqnum"]
+    direction = columns["direction"]
+    from_node = columns["from_node"]
+    tx = columns["tx"]
+    ack = columns["ack"]
+    rx = columns["rx"]
+    radio_on = columns["radio_on"]
+    radio_total = columns["radio_total"]
+
+    with logfile.open_log(filename) as f:
+        for ev in logparse.tokenize(f, is_testbed):
+            ts.append(ev.ts)
+            node.append(ev.node)
+            kind.append(ev.kind)
+            sn = d = fn = t = a = r = on = total = 0
+            if ev.kind == logparse.EV_SEQNUM:
+                sn, dirtext, fromnode = ev.args
+                if dirtext is None:
+                    d = DIR_NONE
+                elif dirtext == "from":
+                    d = DIR_FROM
+                    fn = fromnode
+                else:
+                    d = DIR_OTHER
+            elif ev.kind == logparse.EV_NODE_ID:
+                fn = ev.args[0]
+            elif ev.kind == logparse.EV_LINK_STATS:
+                t, a, r = ev.args
+            elif ev.kind == logparse.EV_ENERGEST:
+                on, total = ev.args
+            seqnum.append(sn)
+            direction.append(d)
+            from_node.append(fn)
+            tx.append(t)
+            ack.append(a)
+            rx.append(r)
+            radio_on.append(on)
+            radio_total.append(total)
+
+    arrays = {name : np.array(columns[name], dtype=dtype) for name, dtype in COLUMNS}
+    arrays["version"] = np.array(STORE_VERSION)
+    arrays["is_testbed"] = np.array(is_testbed)
+
+    outfilename = store_filename(filename)
+    tmpfilename = "{}.{}.tmp.npz".format(outfilename, os.getpid())
+    np.savez(tmpfilename, **arrays)
+    os.replace(tmpfilename, outfilename)
+
+###########################################
+
+def is_up_to_date(filename, is_testbed=False):
+    outfilename = store_filename(filename)
+    try:
+        if os.path.getmtime(outfilename) < os.path.getmtime(filename):
+            return False
+        with np.load(outfilename) as store:
+            return int(store["version"]) == STORE_VERSION \
+                and bool(store["is_testbed"]) == is_testbed
+    except (IOError, ValueError, KeyError):
+        return False
+
+###########################################
+
+def load_columns(filename, columns, is_testbed=False):
+    # convert the log on first access
+    if not is_up_to_date(filename, is_testbed):
+        convert(filename, is_testbed)
+    with np.load(store_filename(filename)) as store:
+        return {name : store[name] for name in columns}
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} [--testbed] <logfile>...".format(sys.argv[0]))
+        return
+
+    is_testbed = "--testbed" in sys.argv[1:]
+    for filename in sys.argv[1:]:
+        if filename == "--testbed":
+            continue
+        if is_up_to_date(filename, is_testbed):
+            print(filename, "up to date")
+            continue
+        start = time.time()
+        convert(filename, is_testbed)
+        print("{}: converted in {:.2f} seconds, {} -> {} bytes".format(
+            filename, time.time() - start,
+            os.path.getsize(filename), os.path.getsize(store_filename(filename))))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
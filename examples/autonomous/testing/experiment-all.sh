@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Superseded by campaign.py, which overlaps the submission and flashing of the next experiment
+# with the logging of the current one, retries failed submissions and writes a manifest for analyze-testbed.py.
+
 cd iot-lab-firmwares
 
 # duration
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+import multiprocessing
+
+import objcache
+
+#
+# Parallel build driver of the IoT-LAB firmwares.
+#
+# The configuration directories (see generate_source_dirs in generate_firmwares.py) are listed in a file,
+# one per line. Several configurations are built concurrently, but all make processes share
+# one GNU make jobserver, so the total number of compiler jobs never exceeds the budget.
+# The compiler is wrapped by objcache.py, so the translation units that are the same
+# in several configurations are compiled once.
+#
+# A configuration is skipped if its firmware is newer than all of its inputs:
+# the files of the configuration directory and all prerequisites in the dependency files
+# of its previous build.
+#
+# Usage: ./fwbuild.py <list file> [<job budget>]
+# TARGET, BOARD and ARCH_PATH are taken from the environment, and OBJCACHE_DIR if set.
+#
+
+FIRMWARE_DIRECTORY = "iot-lab-firmwares"
+
+REPORT_FILENAME = "build-report.json"
+
+# the cross compiler of the platform, wrapped by objcache.py
+COMPILER = "arm-none-eabi-gcc"
+
+# the objects shared by the configurations, next to the firmwares and not in the simulation results;
+# $OBJCACHE_DIR overrides it
+OBJECT_CACHE_DIR = os.environ.get("OBJCACHE_DIR", "iot-lab-object-cache")
+
+# the output of make, in the node directory of each configuration
+BUILD_LOG_FILENAME = "build.log"
+
+###########################################
+
+def load_list(list_filename):
+    with open(list_filename, "r") as f:
+        directories = [line.strip() for line in f]
+    return list(dict.fromkeys(d for d in directories if d and not d.startswith("#")))
+
+###########################################
+
+def firmware_filename(dirname):
+    # the same naming as the old compile script: <algorithm>_<si>_<sf>_<experiment>.iotlab
+    sim_desc = "_".join(os.path.normpath(dirname).split(os.sep)[-4:])
+    return os.path.join(FIRMWARE_DIRECTORY, sim_desc + ".iotlab")
+
+###########################################
+
+def parse_depfile(filename):
+    # the prerequisites of all rules in a make dependency file
+    with open(filename, "r") as f:
+        text = f.read().replace("\\\n", " ")
+    prerequisites = []
+    for line in text.splitlines():
+        if ":" in line:
+            prerequisites += line.split(":", 1)[1].split()
+    return prerequisites
+
+###########################################
+
+def config_inputs(dirname):
+    node_dirname = os.path.join(dirname, "node")
+    build_dirname = os.path.join(node_dirname, "build")
+    inputs = [os.path.join(dirname, f) for f in os.listdir(dirname) if os.path.isfile(os.path.join(dirname, f))]
+    # the sources, not the outputs and the logs of the previous build
+    inputs += [os.path.join(node_dirname, f) for f in os.listdir(node_dirname)
+               if f.endswith((".c", ".h")) or f.startswith("Makefile")]
+    for dirpath, dirnames, filenames in os.walk(build_dirname):
+        for f in filenames:
+            if f.endswith(".d"):
+                # relative to the node directory, where make runs
+                inputs += [os.path.join(node_dirname, p) for p in parse_depfile(os.path.join(dirpath, f))]
+    return inputs
+
+###########################################
+
+def is_up_to_date(dirname):
+    try:
+        mtime = os.stat(firmware_filename(dirname)).st_mtime_ns
+        return all(os.stat(f).st_mtime_ns < mtime for f in set(config_inputs(dirname)))
+    except OSError:
+        # no firmware yet, or an input was removed
+        return False
+
+###########################################
+
+class JobServer:
+    # a GNU make jobserver: a pipe with one token per job slot, in addition
+    # to the one slot that each make process has implicitly
+    def __init__(self, num_tokens):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_inheritable(self.read_fd, True)
+        os.set_inheritable(self.write_fd, True)
+        os.write(self.write_fd, b"+" * num_tokens)
+
+    def makeflags(self):
+        return "-j --jobserver-fds={0},{1} --jobserver-auth={0},{1}".format(self.read_fd, self.write_fd)
+
+    def fds(self):
+        return (self.read_fd, self.write_fd)
+
+###########################################
+
+def start_build(dirname, jobserver, stats_filename):
+    node_dirname = os.path.join(dirname, "node")
+    env = dict(os.environ)
+    env["MAKEFLAGS"] = jobserver.makeflags()
+    # make runs in the configuration directory
+    env["OBJCACHE_DIR"] = os.path.abspath(OBJECT_CACHE_DIR)
+    env["OBJCACHE_STATS"] = stats_filename
+    cc = " ".join([sys.executable, os.path.abspath(objcache.__file__), COMPILER])
+    out = open(os.path.join(node_dirname, BUILD_LOG_FILENAME), "w")
+    try:
+        proc = subprocess.Popen(["make", "-C", node_dirname, "TARGET=" + env.get("TARGET", "iotlab"), "CC=" + cc],
+                                stdout=out, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                env=env, pass_fds=jobserver.fds())
+    finally:
+        out.close()
+    return proc
+
+###########################################
+
+def count_stats(stats_filename):
+    try:
+        with open(stats_filename, "r") as f:
+            lines = f.read().split()
+        os.unlink(stats_filename)
+    except IOError:
+        return 0, 0
+    return lines.count("hit"), lines.count("miss")
+
+###########################################
+
+def build_all(directories, job_budget):
+    os.makedirs(FIRMWARE_DIRECTORY, exist_ok=True)
+    start = time.time()
+
+    report = {}
+    pending = []
+    for dirname in directories:
+        if is_up_to_date(dirname):
+            report[dirname] = {"status" : "up to date", "seconds" : 0.0, "hits" : 0, "misses" : 0}
+        else:
+            pending.append(dirname)
+    print("{} configurations, {} up to date, {} to build with a budget of {} jobs".format(
+        len(directories), len(directories) - len(pending), len(pending), job_budget))
+
+    # each make process has a job slot of its own; the rest are shared through the jobserver
+    max_builds = max(1, min(len(pending), job_budget // 4))
+    jobserver = JobServer(max(0, job_budget - max_builds))
+
+    running = {} # pid -> (directory, process, start time, stats file)
+    pending.reverse() # pop() from the end
+    while pending or running:
+        while pending and len(running) < max_builds:
+            dirname = pending.pop()
+            stats_filename = os.path.join(os.path.abspath(dirname), "node", ".objcache-stats")
+            proc = start_build(dirname, jobserver, stats_filename)
+            running[proc.pid] = (dirname, proc, time.time(), stats_filename)
+            print("  building " + dirname)
+
+        pid, status = os.waitpid(-1, 0)
+        if pid not in running:
+            continue
+        dirname, proc, build_start, stats_filename = running.pop(pid)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        hits, misses = count_stats(stats_filename)
+        r = {"seconds" : time.time() - build_start, "hits" : hits, "misses" : misses}
+        if proc.returncode == 0:
+            shutil.copyfile(os.path.join(dirname, "node", "node.iotlab"), firmware_filename(dirname))
+            r["status"] = "built"
+        else:
+            r["status"] = "failed (exit {})".format(proc.returncode)
+            print("  FAILED {}, see {}".format(dirname, os.path.join(dirname, "node", BUILD_LOG_FILENAME)))
+        report[dirname] = r
+
+    os.close(jobserver.read_fd)
+    os.close(jobserver.write_fd)
+
+    total = time.time() - start
+    print_report(directories, report, total)
+    with open(os.path.join(FIRMWARE_DIRECTORY, REPORT_FILENAME), "w") as f:
+        json.dump({"total_seconds" : total, "job_budget" : job_budget, "configurations" : report}, f, indent=2)
+    return not any(r["status"].startswith("failed") for r in report.values())
+
+###########################################
+
+def print_report(directories, report, total):
+    print("{:<50} {:>12} {:>9} {:>6} {:>6}".format("configuration", "status", "seconds", "hits", "misses"))
+    for dirname in directories:
+        r = report[dirname]
+        print("{:<50} {:>12} {:>9.1f} {:>6} {:>6}".format(
+            os.path.basename(firmware_filename(dirname)), r["status"], r["seconds"], r["hits"], r["misses"]))
+    hits = sum(r["hits"] for r in report.values())
+    misses = sum(r["misses"] for r in report.values())
+    print("total {:.1f} seconds, {} objects from the cache, {} compiled".format(total, hits, misses))
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} <list file> [<job budget>]".format(sys.argv[0]))
+        sys.exit(2)
+    directories = load_list(sys.argv[1])
+    job_budget = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+    if not build_all(directories, max(1, job_budget)):
+        sys.exit(1)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+import os
+import re
+import sys
+import shutil
+import hashlib
+
+#
+# Content-addressed cache of the Cooja firmware builds.
+#
+# All simulation directories with the same rendered Makefile.common and the same node sources
+# (i.e. the same firmware type, send interval, slotframe size and experiment, but another topology)
+# build byte-identical firmware. Their "node/build" directories are symlinks to one build directory
+# in the cache, named by the hash of these inputs, so that the firmware is compiled once,
+# by the first Cooja run of the configuration, and is up to date for all the others.
+#
+# Concurrent Cooja runs of the same configuration take a lock on the build directory
+# before starting make, so the others wait for the first build instead of racing it.
+#
+
+CACHE_DIRNAME = ".firmware-cache"
+
+BUILD_DIRNAME = "build"
+
+LOCK_FILENAME = ".lock"
+
+# increase this when the layout of the cache changes
+CACHE_VERSION = 1
+
+COMMANDS_RE = re.compile(r"<commands>\s*make ")
+
+###########################################
+
+def config_key(makefile, source_filenames):
+    # the rendered Makefile.common and the contents of all files of the node
+    h = hashlib.sha1()
+    h.update("version={}\n".format(CACHE_VERSION).encode("utf-8"))
+    h.update(makefile.encode("utf-8"))
+    for filename in source_filenames:
+        h.update(os.path.basename(filename).encode("utf-8") + b"\0")
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+###########################################
+
+def cache_build_dir(cache_root, key):
+    return os.path.join(cache_root, key, BUILD_DIRNAME)
+
+###########################################
+
+def link_build_dir(cache_root, key, node_dirname):
+    build_dirname = cache_build_dir(cache_root, key)
+    os.makedirs(build_dirname, exist_ok=True)
+
+    link_name = os.path.join(node_dirname, BUILD_DIRNAME)
+    target = os.path.relpath(build_dirname, node_dirname)
+    if os.path.islink(link_name):
+        if os.readlink(link_name) == target:
+            return build_dirname
+        os.unlink(link_name)
+    elif os.path.isdir(link_name):
+        # a private build from before the cache was used
+        shutil.rmtree(link_name)
+    os.symlink(target, link_name)
+    return build_dirname
+
+###########################################
+
+def locked_commands(csc):
+    # Cooja runs the commands in the node directory: serialize the builds in the shared directory
+    return COMMANDS_RE.sub("<commands>flock {} make ".format(os.path.join(BUILD_DIRNAME, LOCK_FILENAME)), csc)
+
+###########################################
+
+def main():
+    # report how many builds the cache saves for a simulations tree
+    data_directory = sys.argv[1] if len(sys.argv) > 1 else "../simulations"
+    links = {}
+    for dirpath, dirnames, filenames in os.walk(data_directory):
+        if os.path.basename(dirpath) == "node" and os.path.islink(os.path.join(dirpath, BUILD_DIRNAME)):
+            target = os.path.realpath(os.path.join(dirpath, BUILD_DIRNAME))
+            links.setdefault(target, []).append(dirpath)
+        # do not descend into the build directories
+        dirnames[:] = [d for d in dirnames if d not in (BUILD_DIRNAME, CACHE_DIRNAME)]
+
+    built = [target for target in links if os.path.isdir(os.path.join(target, "cooja"))]
+    print("{}: {} simulations share {} firmware configurations ({} built so far)".format(
+        data_directory, sum(len(v) for v in links.values()), len(links), len(built)))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -85,20 +85,19 @@ def generate_runner(description, all_directories, do_overwrite):
 ########################################
 
 def generate_builder(description, all_directories, do_overwrite):
+    # the list of the configuration directories, built by fwbuild.py
     open_as = "w" if do_overwrite else "a+"
-    with open("compile-" + description + ".sh", open_as) as f:
-        if do_overwrite:
-            f.write("#!/bin/bash\n")
+    with open("compile-" + description + ".list", open_as) as f:
+        for dirname in all_directories:
+            f.write(dirname + "\n")
+
+    with open("compile-" + description + ".sh", "w") as f:
+        f.write("#!/bin/bash\n")
         f.write("export TARGET=iotlab\n")
         f.write("export BOARD=m3\n")
         f.write("export ARCH_PATH=/home/atis.elsts/work/iot-lab/parts/iot-lab-contiki-ng/arch/\n")
-        f.write("mkdir -p iot-lab-firmwares\n")
-        for i, dirname in enumerate(all_directories):
-            sim_desc = dirname.split("/")[-4:]
-            sim_desc = "_".join(sim_desc)
-            f.write("echo building " + sim_desc + "\n")
-            f.write("make -C " + dirname + "/node TARGET=iotlab -j >/dev/null || exit -1\n")
-            f.write("cp " + dirname + "/node/node.iotlab iot-lab-firmwares/" + sim_desc + ".iotlab\n")
+        # the configurations are built concurrently, with NUM_CORES compiler jobs in total
+        f.write("./fwbuild.py compile-" + description + ".list " + str(NUM_CORES) + " || exit 1\n")
         f.write("echo 'all done!'\n")
 
     os.chmod("compile-" + description + ".sh", 0o755)
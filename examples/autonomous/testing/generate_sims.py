@@ -1,10 +1,14 @@
-#!/usr/bin/python
+#!/usr/bin/python3
 
-import sys, os, copy, errno
+import sys, os, copy, re
 import multiprocessing
-import subprocess
+import shutil
+import glob
+import time
+import fcntl
 
 from parameters import *
+import fwcache
 
 OUT_DIRECTORY = os.path.join(SELF_PATH, "simulations")
 
@@ -18,109 +22,221 @@ ENV = {
     "ORCHESTRA_CONF_ROOT_RULE" : "0"
 }
 
+# the ioctl that clones a file on copy-on-write file systems (btrfs, xfs)
+FICLONE = 0x40049409
+
+# the unchanged files are placed in the simulation directories as reflinks where the file system
+# supports them, otherwise as hard links (so do not edit them in place), otherwise as copies
+can_reflink = sys.platform.startswith("linux")
+
+# the seeds of the extra replications of a topology are <seed of its .csc> + k * SEED_STRIDE, k = 1, 2, ...
+SEED_STRIDE = 1000
+
+RANDOMSEED_RE = re.compile(r"<randomseed>\s*(\d+)\s*</randomseed>")
+
+# Makefile.tmpl, read once
+template = None
+
+# rendered file contents -> the first file written with them, to link the others to
+written_files = {}
+
 ########################################
 
-def create_out_dir(name):
+def link_file(src, dst):
+    global can_reflink
     try:
-        os.mkdir(name)
-    except IOError as e:
-        if e.errno != errno.EEXIST:
-           print("Failed to create " + name)
-           print(e)
+        if os.path.samefile(src, dst):
+            return
+        os.unlink(dst)
+    except OSError:
         pass
-    except Exception as ex:
+
+    if can_reflink:
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            # not supported by this file system; do not try again
+            can_reflink = False
+            os.unlink(dst)
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+########################################
+
+def write_file(dst, text):
+    # files with the same rendered contents are written once and linked
+    first = written_files.get(text)
+    if first is not None:
+        link_file(first, dst)
+        return
+    try:
+        # never write through a link shared with other directories
+        os.unlink(dst)
+    except OSError:
         pass
+    with open(dst, "w") as f:
+        f.write(text)
+    written_files[text] = dst
 
 ########################################
 
-def generate_simulations(dirname, env, wildcards, experiments):
-    makefile = open("Makefile.tmpl", "r").read()
+def render_makefile(env):
+    global template
+    if template is None:
+        with open("Makefile.tmpl", "r") as f:
+            template = f.read()
 
     # replace the template symbols with their values
+    makefile = template
     for key in env:
         makefile = makefile.replace("@" + key + "@", str(env[key]))
+    return makefile
+
+########################################
+
+def generate_simulation(sim_dirname, csc, makefile, exp, key):
+    # all files go into "node"; creates the whole path at once
+    os.makedirs(sim_dirname + "/node", exist_ok=True)
+
+    write_file(sim_dirname + "/sim.csc", csc)
+    write_file(sim_dirname + "/Makefile.common", makefile)
+    link_file("../common-conf.h", sim_dirname + "/common-conf.h")
+    for f in ("project-conf.h", "Makefile", "node.c"):
+        link_file("../" + exp + "/" + f, sim_dirname + "/node/" + f)
+    fwcache.link_build_dir(os.path.join(OUT_DIRECTORY, fwcache.CACHE_DIRNAME), key, sim_dirname + "/node")
+
+########################################
+
+def firmware_key(makefile, exp):
+    # all topologies of an experiment build the same firmware
+    sources = ["../common-conf.h"] + ["../" + exp + "/" + f for f in ("project-conf.h", "Makefile", "node.c")]
+    return fwcache.config_key(makefile, sources)
+
+########################################
+
+def generate_simulations(dirname, env, wildcards, experiments):
+    makefile = render_makefile(env)
 
     print("dirname=", dirname)
 
     filenames = []
     for fs in wildcards:
-        fs = os.path.join(SELF_PATH, fs)
-        try:
-            filenames += subprocess.check_output("ls " + fs, shell=True).split()
-        except Exception as ex:
-            print(ex)
+        # sorted, in the same order as "ls"
+        filenames += sorted(glob.glob(os.path.join(SELF_PATH, fs)))
+
+    cscs = {}
+    for filename in filenames:
+        with open(filename, "r") as f:
+            cscs[filename] = fwcache.locked_commands(f.read())
 
     all_directories = []
     for exp in experiments:
-        exp_dirname = os.path.join(dirname, exp)
-        create_out_dir(exp_dirname)
-
+        key = firmware_key(makefile, exp)
         for filename in filenames:
             sim_name = os.path.basename(os.path.splitext(filename)[0])
-            sim_dirname = os.path.join(exp_dirname, sim_name)
-            create_out_dir(sim_dirname)
-
+            sim_dirname = os.path.join(dirname, exp, sim_name)
             all_directories.append(sim_dirname)
-
-            subprocess.call("cp " + filename + " " + sim_dirname + "/sim.csc", shell=True)
-            subprocess.call("cp ../common-conf.h " + sim_dirname, shell=True)
-            with open(sim_dirname + "/Makefile.common", "w") as f:
-                f.write(makefile)
-
-            # all files go into "node"
-            create_out_dir(sim_dirname + "/node")
-            subprocess.call("cp ../" + exp + "/project-conf.h " + sim_dirname + "/node", shell=True)
-            subprocess.call("cp ../" + exp + "/Makefile " + sim_dirname + "/node", shell=True)
-            subprocess.call("cp ../" + exp + "/node.c " + sim_dirname + "/node", shell=True)
+            generate_simulation(sim_dirname, cscs[filename], makefile, exp, key)
     return all_directories
 
 ########################################
 
 def generate_runner(description, all_directories, do_overwrite):
+    # the queue of the simulation directories, consumed by scheduler.py
     open_as = "w" if do_overwrite else "a+"
-    with open("run-" + description + ".sh", open_as) as f:
-        if do_overwrite:
-            f.write("#!/bin/bash\n")
+    with open("run-" + description + ".queue", open_as) as f:
+        for dirname in all_directories:
+            f.write(dirname + "\n")
 
-        for i, dirname in enumerate(all_directories):
-            f.write("./run_cooja.py " + dirname + " &\n")
-            if i % NUM_CORES == NUM_CORES - 1:
-                f.write("wait\n\n")
-        f.write("wait\n")
+    with open("run-" + description + ".sh", "w") as f:
+        f.write("#!/bin/bash\n")
+        # keep NUM_CORES simulations running at all times
+        f.write("./scheduler.py run-" + description + ".queue " + str(NUM_CORES) + "\n")
 
     os.chmod("run-" + description + ".sh", 0o755)
 
 ########################################
-def main():
+
+def config_env(algorithm, send_interval, slotframe_size):
+    cenv = copy.copy(ENV)
+    cenv["FIRMWARE_TYPE"] = str(FIRMWARE_TYPES[algorithm])
+    cenv["SEND_INTERVAL_SEC"] = str(send_interval)
+    cenv["ORCHESTRA_CONF_UNICAST_PERIOD"] = str(slotframe_size)
+    return cenv
+
+########################################
+
+def config_dirname(algorithm, send_interval, slotframe_size):
+    return os.path.join(OUT_DIRECTORY, algorithm, "si_{}".format(send_interval), "sf_{}".format(slotframe_size))
+
+########################################
+
+def neighbor_wildcards():
     # sparse, medium, and dense networks - depending on the neighbor count
-    wildcards = []
-    for nn in NUM_NEIGHBORS:
-        wildcards.append("sim-{}-neigh-realsim-*.csc".format(nn))
+    return ["sim-{}-neigh-realsim-*.csc".format(nn) for nn in NUM_NEIGHBORS]
+
+########################################
+
+def generate_config(algorithm, send_interval, slotframe_size):
+    # the simulation directories of one point of the grid: all experiments and topologies
+    return generate_simulations(config_dirname(algorithm, send_interval, slotframe_size),
+                                config_env(algorithm, send_interval, slotframe_size),
+                                neighbor_wildcards(), EXPERIMENTS)
+
+########################################
+
+def topology_filenames(nn):
+    # numerically sorted: realsim-1, realsim-2, ..., realsim-10
+    filenames = glob.glob(os.path.join(SELF_PATH, "sim-{}-neigh-realsim-*.csc".format(nn)))
+    return sorted(filenames, key=lambda f: int(re.search(r"-(\d+)\.csc$", f).group(1)))
+
+########################################
+
+def generate_replica(algorithm, send_interval, slotframe_size, exp, nn, replica):
+    # the replica-th run of a grid cell: the topologies in turn, first with the seeds of their .csc files,
+    # then with new seeds; returns the simulation directory
+    filenames = topology_filenames(nn)
+    filename = filenames[replica % len(filenames)]
+    k = replica // len(filenames)
+    with open(filename, "r") as f:
+        csc = fwcache.locked_commands(f.read())
+
+    sim_name = os.path.basename(os.path.splitext(filename)[0])
+    if k:
+        seed = int(RANDOMSEED_RE.search(csc).group(1)) + k * SEED_STRIDE
+        csc = RANDOMSEED_RE.sub("<randomseed>{}</randomseed>".format(seed), csc, count=1)
+        sim_name += "-seed-{}".format(seed)
+
+    makefile = render_makefile(config_env(algorithm, send_interval, slotframe_size))
+    sim_dirname = os.path.join(config_dirname(algorithm, send_interval, slotframe_size), exp, sim_name)
+    generate_simulation(sim_dirname, csc, makefile, exp, firmware_key(makefile, exp))
+    return sim_dirname
+
+########################################
+def main():
+    start = time.time()
 
     all_directories = []
-    dirname1 = OUT_DIRECTORY
-    create_out_dir(dirname1)
     for a in ALGORITHMS:
-        firmware_type = FIRMWARE_TYPES[a]
-        dirname2 = os.path.join(dirname1, a)
-        create_out_dir(dirname2)
         for si in SEND_INTERVALS:
-            dirname3 = os.path.join(dirname2, "si_{}".format(si))
-            create_out_dir(dirname3)
             for ss in SLOTFRAME_SIZES:
-                dirname4 = os.path.join(dirname3, "sf_{}".format(ss))
-                create_out_dir(dirname4)
-                cenv = copy.copy(ENV)
-                cenv["FIRMWARE_TYPE"] = str(firmware_type)
-                cenv["SEND_INTERVAL_SEC"] = str(si)
-                cenv["ORCHESTRA_CONF_UNICAST_PERIOD"] = str(ss)
-                all_directories += generate_simulations(dirname4, cenv, wildcards, EXPERIMENTS)
+                all_directories += generate_config(a, si, ss)
     generate_runner("all", all_directories, True)
-
+    num_directories = len(all_directories)
 
     wildcards = ["3nodes-cooja-ll.csc"]
-    all_directories = generate_simulations(dirname4, cenv, wildcards, EXPERIMENTS)
+    all_directories = generate_simulations(config_dirname(a, si, ss), config_env(a, si, ss), wildcards, EXPERIMENTS)
     generate_runner("lite", all_directories, True)
+    num_directories += len(all_directories)
+
+    duration = time.time() - start
+    print("generated {} simulation directories in {:.2f} seconds: {:.0f} directories/second".format(
+        num_directories, duration, num_directories / duration if duration else 0.0))
 
 
 ########################################
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import time
+
+import logfile
+import replay
+
+#
+# A local stand-in for the IoT-LAB command line tools, for testing campaign.py.
+#
+# ./iotlabmock.py experiment submit|get|stop ...  stands in for iotlab-experiment,
+# ./iotlabmock.py node --update ...                for iotlab-node,
+# ./iotlabmock.py serial_aggregator ...            for serial_aggregator,
+# with the same options and JSON output as far as campaign.py uses them.
+#
+# The experiments are kept in a JSON file in $IOTLAB_MOCK_DIR (by default the current directory).
+# A submitted experiment waits MOCK_START_SECONDS, and then runs as soon as none of its nodes
+# is used by a running experiment. One minute of an experiment takes $IOTLAB_MOCK_MINUTE seconds.
+# The aggregator replays the log $IOTLAB_MOCK_LOG at the matching speed until the experiment ends,
+# or writes a line per node and minute if it is not set.
+#
+# Failures are injected with $IOTLAB_MOCK_FAIL_SUBMITS and $IOTLAB_MOCK_FAIL_FLASHES:
+# that many of the first submissions or flashings fail.
+#
+
+STATE_FILENAME = "iotlab-mock.json"
+
+MOCK_START_SECONDS = 2.0
+
+# the states reported by "iotlab-experiment get -s"
+STATE_WAITING = "Waiting"
+STATE_RUNNING = "Running"
+STATE_TERMINATED = "Terminated"
+STATE_STOPPED = "Stopped"
+
+###########################################
+
+def state_filename():
+    return os.path.join(os.environ.get("IOTLAB_MOCK_DIR", "."), STATE_FILENAME)
+
+###########################################
+
+def minute_seconds():
+    return float(os.environ.get("IOTLAB_MOCK_MINUTE", "1.0"))
+
+###########################################
+
+def load_state():
+    try:
+        with open(state_filename(), "r") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {"next_id" : 1, "num_submits" : 0, "num_flashes" : 0, "experiments" : {}}
+
+###########################################
+
+def store_state(state):
+    tmpfilename = "{}.{}.tmp".format(state_filename(), os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmpfilename, state_filename())
+
+###########################################
+
+def schedule(state):
+    # brings the states of the experiments up to date
+    now = time.time()
+    experiments = [state["experiments"][k] for k in sorted(state["experiments"], key=int)]
+    for e in experiments:
+        if e["state"] == STATE_RUNNING and now >= e["started_at"] + e["duration"] * minute_seconds():
+            e["state"] = STATE_TERMINATED
+    for e in experiments:
+        if e["state"] != STATE_WAITING or now < e["submitted_at"] + MOCK_START_SECONDS:
+            continue
+        busy = set(n for u in experiments if u["state"] == STATE_RUNNING for n in u["nodes"])
+        if busy.isdisjoint(e["nodes"]):
+            e["state"] = STATE_RUNNING
+            e["started_at"] = now
+
+###########################################
+
+def option(args, name, default=None):
+    if name in args:
+        return args[args.index(name) + 1]
+    return default
+
+###########################################
+
+def injected_failure(state, counter, variable):
+    state[counter] += 1
+    return state[counter] <= int(os.environ.get(variable, "0"))
+
+###########################################
+
+def experiment(args):
+    state = load_state()
+    schedule(state)
+    command = args[0]
+    if command == "submit":
+        if injected_failure(state, "num_submits", "IOTLAB_MOCK_FAIL_SUBMITS"):
+            store_state(state)
+            print("HTTP Error 500: mock submission failure", file=sys.stderr)
+            return 1
+        site, archi, nodes = option(args, "-l").split(",", 2)
+        exp_id = state["next_id"]
+        state["next_id"] += 1
+        state["experiments"][str(exp_id)] = {
+            "name" : option(args, "-n"),
+            "duration" : int(option(args, "-d")),
+            "nodes" : ["{}-{}.{}.iot-lab.info".format(archi, n, site) for n in nodes.split("+")],
+            "state" : STATE_WAITING,
+            "submitted_at" : time.time(),
+            "started_at" : None,
+        }
+        store_state(state)
+        print(json.dumps({"id" : exp_id}, indent=4))
+        return 0
+
+    e = state["experiments"].get(option(args, "-i"))
+    if e is None:
+        print("HTTP Error 404: no such experiment", file=sys.stderr)
+        return 1
+    if command == "get":
+        print(json.dumps({"state" : e["state"]}))
+    elif command == "stop":
+        if e["state"] in (STATE_WAITING, STATE_RUNNING):
+            e["state"] = STATE_STOPPED
+        print(json.dumps({"id" : int(option(args, "-i")), "status" : "Delete request registered"}))
+    else:
+        print("unknown command: " + command, file=sys.stderr)
+        return 2
+    store_state(state)
+    return 0
+
+###########################################
+
+def node(args):
+    state = load_state()
+    schedule(state)
+    e = state["experiments"].get(option(args, "-i"))
+    if e is None or e["state"] != STATE_RUNNING:
+        print("HTTP Error 400: the experiment is not running", file=sys.stderr)
+        return 1
+    firmware = option(args, "--update")
+    if not os.access(firmware, os.R_OK):
+        print("no such file: " + firmware, file=sys.stderr)
+        return 1
+    if injected_failure(state, "num_flashes", "IOTLAB_MOCK_FAIL_FLASHES"):
+        result = {"1" : e["nodes"]}
+    else:
+        result = {"0" : e["nodes"]}
+    store_state(state)
+    # a short delay, as the real flashing
+    time.sleep(0.5)
+    print(json.dumps(result, indent=4))
+    return 0
+
+###########################################
+
+def is_running(exp_id):
+    state = load_state()
+    schedule(state)
+    return state["experiments"][exp_id]["state"] == STATE_RUNNING
+
+###########################################
+
+def until_stopped(lines, exp_id, check_every=100):
+    for i, line in enumerate(lines):
+        if i % check_every == 0 and not is_running(exp_id):
+            return
+        yield line
+
+###########################################
+
+def synthetic_lines(nodes):
+    # one line per node and minute; the timestamps are in the time of the experiment, as in a replayed log
+    start = time.time()
+    minute = 0
+    while True:
+        for n in nodes:
+            yield "{:.6f};{};[INFO: App       ] minute {}\n".format(
+                start + minute * 60.0, n.split(".")[0], minute).encode()
+        time.sleep(minute_seconds())
+        minute += 1
+
+###########################################
+
+def serial_aggregator(args):
+    exp_id = option(args, "-i")
+    state = load_state()
+    schedule(state)
+    if state["experiments"].get(exp_id, {}).get("state") != STATE_RUNNING:
+        print("the experiment is not running", file=sys.stderr)
+        return 1
+    sink = replay.open_sink("-")
+    log = os.environ.get("IOTLAB_MOCK_LOG")
+    try:
+        if log:
+            with logfile.open_log(log, "rb") as f:
+                replay.replay(until_stopped(f, exp_id), sink, replay.ReplayStats(60.0 / minute_seconds()))
+        else:
+            nodes = state["experiments"][exp_id]["nodes"]
+            for line in until_stopped(synthetic_lines(nodes), exp_id, len(nodes)):
+                sink.write(line)
+                sink.flush()
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    return 0
+
+###########################################
+
+def main():
+    commands = {"experiment" : experiment, "node" : node, "serial_aggregator" : serial_aggregator}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print("usage: {} experiment|node|serial_aggregator <options>".format(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(commands[sys.argv[1]](sys.argv[2:]))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
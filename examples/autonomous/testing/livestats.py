@@ -0,0 +1,298 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+
+import analysiswindow
+import logparse
+import seqnums
+
+#
+# Incremental analysis of a log that is still being written.
+#
+# LiveStats is the state machine of process_file in analyze.py, fed a few lines at a time.
+# At any point it gives the rolling per-node PDR, PRR and RDC of the analysis window so far,
+# and whether the run looks hopeless, so that it can be aborted early.
+# The window and the root nodes come from analysiswindow.py; tests/test_livestats.py checks that
+# the results for a complete log are those of process_file in analyze.py and analyze-testbed.py.
+#
+# LogTail returns the lines appended to a growing file since the last call.
+#
+
+# the analysis window of analyze.py, and of analyze-testbed.py for testbed logs
+START_TIME_MINUTES = analysiswindow.START_TIME_MINUTES
+END_TIME_MINUTES = analysiswindow.END_TIME_MINUTES_SIM
+TESTBED_END_TIME_MINUTES = analysiswindow.END_TIME_MINUTES_TESTBED
+LATENCY_MARGIN_SECONDS = analysiswindow.LATENCY_MARGIN_SECONDS
+
+ROOT_ID_SIM = analysiswindow.ROOT_ID_SIM
+ROOT_ID_TESTBED = analysiswindow.ROOT_ID_TESTBED
+
+# early abort: by this minute of the simulation...
+ABORT_ASSOC_MINUTES = 10
+# ...at least this fraction of the non-root nodes must be associated; None to never abort
+ABORT_MIN_ASSOC_FRACTION = 0.5
+# this many minutes into the analysis window...
+ABORT_METRICS_MINUTES = 5
+# ...the network PDR must be at least this and the RDC at most this, in percent; None to never abort
+ABORT_MIN_PDR = None
+ABORT_MAX_RDC = None
+
+###########################################
+
+class LogTail:
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = None
+        self.partial = b""
+
+    def read_lines(self):
+        # the complete lines appended since the last call
+        if self.f is None:
+            try:
+                self.f = open(self.filename, "rb")
+            except IOError:
+                # not created yet
+                return []
+        elif os.fstat(self.f.fileno()).st_size < self.f.tell():
+            # truncated: start from the beginning
+            self.f.seek(0)
+            self.partial = b""
+
+        data = self.partial + self.f.read()
+        lines = data.split(b"\n")
+        # the last line may not be complete yet
+        self.partial = lines.pop()
+        return [line.decode("utf-8", "replace") for line in lines]
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+###########################################
+
+class NodeState:
+    def __init__(self, id, first_seqnum, last_seqnum):
+        self.id = id
+        self.seqnums = seqnums.SeqnumBitmap(first_seqnum, last_seqnum)
+        self.associated_at_minutes = None
+        self.packets_tx = 0
+        self.packets_ack = 0
+        self.radio_on = 0
+        self.radio_total = 0
+        self.queue_losses = 0
+
+###########################################
+
+class LiveStats:
+    def __init__(self, experiment, send_interval, is_testbed=False):
+        self.experiment = experiment
+        self.send_interval = send_interval
+        self.is_testbed = is_testbed
+        self.root_id = ROOT_ID_TESTBED if is_testbed else ROOT_ID_SIM
+        self.is_receiver_all = "local" in experiment
+
+        end_time_minutes = TESTBED_END_TIME_MINUTES if is_testbed else END_TIME_MINUTES
+        self.first_seqnum, self.last_seqnum = analysiswindow.seqnum_window(send_interval, end_time_minutes)
+        self.start_ts = START_TIME_MINUTES * 60 * 1000
+        self.end_ts = (end_time_minutes * 60 + LATENCY_MARGIN_SECONDS) * 1000
+        # the abort thresholds, see abort_reason
+        self.min_pdr = ABORT_MIN_PDR
+        self.max_rdc = ABORT_MAX_RDC
+
+        self.motes = {}
+        self.has_assoc = set()
+        self.node_id_to_mote_id = {}
+        self.start_ts_unix = None
+        # the latest timestamp in the log, in milliseconds
+        self.now = 0
+        self.num_lines = 0
+        # the root has received a packet from after the window (testbed logs only)
+        self.finished = False
+
+    def feed(self, lines):
+        if self.is_testbed and self.start_ts_unix is None:
+            for line in lines:
+                # the first line from a node, as in logreader.py
+                fields = line.split(";", 2)
+                if len(fields) < 3:
+                    continue
+                try:
+                    self.start_ts_unix = float(fields[0])
+                    break
+                except ValueError:
+                    continue
+        self.num_lines += len(lines)
+        for ev in logparse.tokenize(lines, self.is_testbed, self.start_ts_unix):
+            self.feed_event(*ev)
+
+    def feed_event(self, kind, ts, node, args):
+        self.now = max(self.now, ts)
+        if self.finished:
+            return
+
+        if kind == logparse.EV_NODE:
+            # tokenize reports the nodes again in each batch of lines
+            if node not in self.motes:
+                self.motes[node] = NodeState(node, self.first_seqnum, self.last_seqnum)
+            return
+
+        if kind == logparse.EV_NODE_ID:
+            if self.is_testbed:
+                self.node_id_to_mote_id[args[0]] = node
+            return
+
+        if ts > self.end_ts:
+            return
+
+        if kind == logparse.EV_ASSOC:
+            self.has_assoc.add(node)
+            self.motes[node].seqnums.clear()
+            self.motes[node].associated_at_minutes = (ts // 1000 + 59) // 60
+            return
+
+        # ignore the first N minutes of the test, while the network is being built
+        if ts <= self.start_ts:
+            return
+
+        if kind == logparse.EV_QUEUE_DROP:
+            self.motes[node].queue_losses += 1
+            return
+
+        if node == self.root_id or self.is_receiver_all:
+            if kind == logparse.EV_SEQNUM:
+                sn, direction, fromnode = args
+                if self.is_testbed and sn > self.last_seqnum:
+                    # as process_file in analyze-testbed.py, which stops reading the log here
+                    self.finished = True
+                    return
+                if direction == "from" and self.first_seqnum <= sn <= self.last_seqnum:
+                    if self.is_testbed:
+                        fromnode = self.node_id_to_mote_id.get(fromnode, 0)
+                    if fromnode in self.has_assoc:
+                        self.motes[fromnode].seqnums.add(sn)
+            if not self.is_receiver_all:
+                # ignore the root, except for PDR
+                return
+
+        if node not in self.has_assoc:
+            return
+
+        if kind == logparse.EV_LINK_STATS:
+            self.motes[node].packets_tx += args[0]
+            self.motes[node].packets_ack += args[1]
+        elif kind == logparse.EV_ENERGEST:
+            self.motes[node].radio_on += args[0]
+            self.motes[node].radio_total += args[1]
+
+    def expected_packets(self):
+        # the packets sent so far that should have arrived by now
+        elapsed = min(self.now, self.end_ts) - self.start_ts - LATENCY_MARGIN_SECONDS * 1000
+        if elapsed <= 0:
+            return 0
+        return min(self.last_seqnum - self.first_seqnum + 1, elapsed // (self.send_interval * 1000))
+
+    def node_metrics(self, node):
+        m = self.motes[node]
+        expected = self.expected_packets()
+        last = self.first_seqnum + expected - 1
+        received = sum(1 for sn in m.seqnums if sn <= last)
+        return {
+            "pdr" : 100.0 * received / expected if expected else None,
+            "prr" : 100.0 * m.packets_ack / m.packets_tx if m.packets_tx else None,
+            "rdc" : 100.0 * m.radio_on / m.radio_total if m.radio_total else None,
+            "queue_losses" : m.queue_losses,
+            "associated_at_minutes" : m.associated_at_minutes,
+        }
+
+    def non_root_nodes(self):
+        return [node for node in sorted(self.motes) if node != self.root_id]
+
+    def abort_reason(self):
+        # a reason to stop the run early, or None
+        return self.assoc_abort_reason() or self.metrics_abort_reason()
+
+    def assoc_abort_reason(self):
+        if ABORT_MIN_ASSOC_FRACTION is None or self.now < ABORT_ASSOC_MINUTES * 60 * 1000:
+            return None
+        nodes = self.non_root_nodes()
+        if not nodes:
+            return "no nodes in the log by minute {}".format(ABORT_ASSOC_MINUTES)
+        num_associated = len(self.has_assoc.intersection(nodes))
+        if num_associated < ABORT_MIN_ASSOC_FRACTION * len(nodes):
+            return "only {} of {} nodes associated by minute {}".format(
+                num_associated, len(nodes), ABORT_ASSOC_MINUTES)
+        return None
+
+    def metrics_abort_reason(self):
+        if self.min_pdr is None and self.max_rdc is None:
+            return None
+        if self.now < self.start_ts + ABORT_METRICS_MINUTES * 60 * 1000:
+            return None
+        network = self.status()["network"]
+        if self.min_pdr is not None and network["pdr"] is not None and network["pdr"] < self.min_pdr:
+            return "PDR {:.1f}% below {:.1f}% at minute {:.0f}".format(
+                network["pdr"], self.min_pdr, self.now / 60000.0)
+        if self.max_rdc is not None and network["rdc"] is not None and network["rdc"] > self.max_rdc:
+            return "RDC {:.2f}% above {:.2f}% at minute {:.0f}".format(
+                network["rdc"], self.max_rdc, self.now / 60000.0)
+        return None
+
+    def status(self):
+        nodes = self.non_root_nodes()
+        per_node = {str(node) : self.node_metrics(node) for node in nodes}
+        network = {}
+        for metric in ("pdr", "prr", "rdc"):
+            values = [m[metric] for m in per_node.values() if m[metric] is not None]
+            network[metric] = sum(values) / len(values) if values else None
+        root = self.motes.get(self.root_id)
+        return {
+            "minutes" : self.now / (60 * 1000.0),
+            "lines" : self.num_lines,
+            "num_nodes" : len(nodes),
+            "num_associated" : len(self.has_assoc.intersection(nodes)),
+            "queue_losses" : sum(m["queue_losses"] for m in per_node.values()),
+            "root_queue_losses" : root.queue_losses if root is not None else 0,
+            "in_window" : self.now > self.start_ts,
+            "network" : network,
+            "nodes" : per_node,
+        }
+
+###########################################
+
+def write_status(filename, status):
+    tmpfilename = "{}.{}.tmp".format(filename, os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(status, f, indent=2)
+    # atomic, so that a reader never sees a partial file
+    os.replace(tmpfilename, filename)
+
+###########################################
+
+def main():
+    # replay a finished log through the live analysis, e.g. to try out the abort policy
+    if len(sys.argv) < 2:
+        print("usage: {} <logfile> [<send interval> [<experiment>]]".format(sys.argv[0]))
+        return
+    filename = sys.argv[1]
+    send_interval = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    experiment = sys.argv[3] if len(sys.argv) > 3 else "exp-collection"
+
+    stats = LiveStats(experiment, send_interval)
+    with open(filename, "r") as f:
+        lines = f.readlines()
+    batch = 10000
+    for i in range(0, len(lines), batch):
+        stats.feed(lines[i:i + batch])
+        reason = stats.abort_reason()
+        if reason is not None:
+            print("would abort at minute {:.1f}: {}".format(stats.now / 60000.0, reason))
+            break
+    print(json.dumps(stats.status()["network"]))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+import sys
+import socket
+
+import livestats
+
+#
+# Online metrics of a running IoT-LAB experiment.
+#
+# This reads the "<timestamp>;m3-<N>;<text>" lines of serial_aggregator from stdin or from a TCP
+# socket while the experiment runs, and keeps the per-node association state, PDR, PRR, RDC
+# and queue losses up to date with livestats.LiveStats, i.e. with the rules of process_file
+# in analyze-testbed.py. A summary is printed every SUMMARY_MINUTES of the experiment.
+#
+# If the association or the metrics are below the thresholds (see livestats.py and the
+# --min-pdr and --max-rdc options), this stops with the exit status EXIT_ABORTED, so that the
+# caller can stop the experiment instead of waiting for the end of the reservation:
+#
+#   serial_aggregator | tee sparse-x.log | ./livestream.py 6 exp-collection || iotlab-experiment stop
+#
+# replay.py stands in for serial_aggregator, e.g. ./replay.py --speed=600 sparse-x.log | ./livestream.py 6 exp-collection
+# or, over TCP, ./livestream.py 6 exp-collection :5555 & ./replay.py --speed=600 --to=tcp:localhost:5555 sparse-x.log
+#
+# Usage: ./livestream.py [--cooja] [--min-pdr=<percent>] [--max-rdc=<percent>] [--status=<file>]
+#            <send interval> <experiment> [-|<host>:<port>|:<port>]
+# "<host>:<port>" connects to a TCP server, ":<port>" waits for a TCP connection on the port.
+#
+
+SUMMARY_MINUTES = 1
+
+EXIT_ABORTED = 3
+
+BLOCK_SIZE = 64 * 1024
+
+###########################################
+
+def open_source(source):
+    # a binary stream of the lines
+    if source == "-":
+        return sys.stdin.buffer
+    host, port = source.rsplit(":", 1)
+    if host:
+        sock = socket.create_connection((host, int(port)))
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("", int(port)))
+        server.listen(1)
+        sock, _ = server.accept()
+        server.close()
+    return sock.makefile("rb")
+
+###########################################
+
+def read_batches(f):
+    # the complete lines that have arrived, without waiting for more
+    partial = b""
+    while True:
+        data = f.read1(BLOCK_SIZE)
+        if not data:
+            break
+        lines = (partial + data).split(b"\n")
+        partial = lines.pop()
+        yield [line.decode("utf-8", "replace") for line in lines]
+    if partial:
+        yield [partial.decode("utf-8", "replace")]
+
+###########################################
+
+def format_metric(value, fmt):
+    return "-" if value is None else fmt.format(value)
+
+###########################################
+
+def print_summary(status):
+    network = status["network"]
+    print("minute {:.1f}: {} lines, {}/{} nodes associated, PDR {} PRR {} RDC {}, {} queue losses ({} at the root)".format(
+        status["minutes"], status["lines"], status["num_associated"], status["num_nodes"],
+        format_metric(network["pdr"], "{:.1f}%"), format_metric(network["prr"], "{:.1f}%"),
+        format_metric(network["rdc"], "{:.2f}%"), status["queue_losses"], status["root_queue_losses"]))
+    sys.stdout.flush()
+
+###########################################
+
+def print_nodes(status):
+    print("{:>6} {:>8} {:>7} {:>7} {:>7} {:>6}".format("node", "assoc at", "PDR", "PRR", "RDC", "queue"))
+    for node, m in sorted(status["nodes"].items(), key=lambda u: int(u[0])):
+        print("{:>6} {:>8} {:>7} {:>7} {:>7} {:>6}".format(
+            node, format_metric(m["associated_at_minutes"], "{}"),
+            format_metric(m["pdr"], "{:.1f}"), format_metric(m["prr"], "{:.1f}"),
+            format_metric(m["rdc"], "{:.2f}"), m["queue_losses"]))
+
+###########################################
+
+def consume(f, stats, status_filename=None):
+    # returns the abort reason, or None if the stream ended
+    next_summary = SUMMARY_MINUTES * 60 * 1000
+    for lines in read_batches(f):
+        stats.feed(lines)
+        if stats.now >= next_summary:
+            status = stats.status()
+            print_summary(status)
+            if status_filename is not None:
+                livestats.write_status(status_filename, status)
+            next_summary = (stats.now // (SUMMARY_MINUTES * 60 * 1000) + 1) * SUMMARY_MINUTES * 60 * 1000
+            reason = stats.abort_reason()
+            if reason is not None:
+                return reason
+    return None
+
+###########################################
+
+def main():
+    args = sys.argv[1:]
+    is_testbed = "--cooja" not in args
+    options = {}
+    for a in args:
+        if a.startswith("--") and "=" in a:
+            name, value = a[2:].split("=", 1)
+            options[name] = value
+    args = [a for a in args if not a.startswith("--")]
+    if len(args) not in (2, 3):
+        print("usage: {} [--cooja] [--min-pdr=<percent>] [--max-rdc=<percent>] [--status=<file>]".format(sys.argv[0])
+              + " <send interval> <experiment> [-|<host>:<port>|:<port>]")
+        sys.exit(2)
+
+    stats = livestats.LiveStats(args[1], int(args[0]), is_testbed)
+    if "min-pdr" in options:
+        stats.min_pdr = float(options["min-pdr"])
+    if "max-rdc" in options:
+        stats.max_rdc = float(options["max-rdc"])
+    status_filename = options.get("status")
+
+    f = open_source(args[2] if len(args) > 2 else "-")
+    try:
+        reason = consume(f, stats, status_filename)
+    except KeyboardInterrupt:
+        reason = None
+    finally:
+        f.close()
+
+    status = stats.status()
+    print_summary(status)
+    print_nodes(status)
+    if status_filename is not None:
+        livestats.write_status(status_filename, status)
+    if reason is not None:
+        print("abort: " + reason)
+        sys.exit(EXIT_ABORTED)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
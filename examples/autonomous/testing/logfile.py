@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+
+import io
+import os
+import sys
+import time
+import gzip
+import shutil
+import tempfile
+
+import logparse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#
+# Transparent access to compressed logs.
+#
+# A finished log may be stored compressed, as <log>.gz or <log>.zst, instead of <log>.
+# open_log() returns a streaming reader of the decompressed contents, and find_log()
+# the name under which a log is actually stored, so the analysis scripts can keep
+# using the plain names. zstd needs the "zstandard" module; gzip is always available.
+#
+# Run as a script, this compares the read and parse throughput of the plain and the compressed logs.
+#
+
+GZIP_SUFFIX = ".gz"
+ZSTD_SUFFIX = ".zst"
+
+COMPRESSED_SUFFIXES = (GZIP_SUFFIX, ZSTD_SUFFIX)
+
+# the suffix of each compression method
+METHODS = {
+    "gzip" : GZIP_SUFFIX,
+    "zstd" : ZSTD_SUFFIX,
+}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+
+BLOCK_SIZE = 1024 * 1024
+
+###########################################
+
+def is_compressed(filename):
+    return filename.endswith(COMPRESSED_SUFFIXES)
+
+###########################################
+
+def strip_suffix(filename):
+    # the name of the plain log
+    for suffix in COMPRESSED_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+###########################################
+
+def _require_zstandard(filename):
+    if zstandard is None:
+        raise IOError("{}: reading or writing .zst files needs the zstandard module (pip install zstandard)".format(
+            filename))
+
+###########################################
+
+def open_log(filename, mode="rt"):
+    # mode is "rt" (text, undecodable bytes replaced) or "rb"
+    if filename.endswith(GZIP_SUFFIX):
+        f = gzip.open(filename, "rb")
+    elif filename.endswith(ZSTD_SUFFIX):
+        _require_zstandard(filename)
+        raw = open(filename, "rb")
+        # closefd: closing the reader closes the file too
+        f = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), BLOCK_SIZE)
+    else:
+        f = open(filename, "rb")
+    if "b" in mode:
+        return f
+    return io.TextIOWrapper(f, encoding="utf-8", errors="replace")
+
+###########################################
+
+def find_log(filename):
+    # the plain log if it exists, otherwise its compressed version; the plain name if none exists
+    for name in [filename] + [filename + suffix for suffix in COMPRESSED_SUFFIXES]:
+        if os.path.exists(name):
+            return name
+    return filename
+
+###########################################
+
+def compress(filename, method="gzip"):
+    # replaces the log by <log>.gz or <log>.zst; returns the new name
+    compressed_filename = filename + METHODS[method]
+    tmpfilename = "{}.{}.tmp".format(compressed_filename, os.getpid())
+    with open(filename, "rb") as inf:
+        if method == "zstd":
+            _require_zstandard(compressed_filename)
+            with open(tmpfilename, "wb") as outf:
+                zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(inf, outf)
+        else:
+            # no name and time in the header, so that the same log always compresses the same
+            with open(tmpfilename, "wb") as raw, \
+                 gzip.GzipFile("", "wb", GZIP_LEVEL, raw, mtime=0) as outf:
+                shutil.copyfileobj(inf, outf, BLOCK_SIZE)
+    # atomic, so that a reader never sees a partial file
+    os.replace(tmpfilename, compressed_filename)
+    os.remove(filename)
+    return compressed_filename
+
+###########################################
+
+class CompressedTee:
+    # a compressed copy of a log that is written as it is read from somewhere else, e.g. from a remote host;
+    # the file gets its name only if commit() is called, so an interrupted transfer leaves nothing behind
+    def __init__(self, filename, method="gzip"):
+        self.filename = filename + METHODS[method]
+        self.tmpfilename = "{}.{}.tmp".format(self.filename, os.getpid())
+        self.raw = open(self.tmpfilename, "wb")
+        if method == "zstd":
+            _require_zstandard(self.filename)
+            self.f = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self.raw)
+        else:
+            self.f = gzip.GzipFile("", "wb", GZIP_LEVEL, self.raw, mtime=0)
+
+    def write(self, data):
+        self.f.write(data)
+
+    def _close(self):
+        self.f.close()
+        # GzipFile does not close a file object that it was given
+        if not self.raw.closed:
+            self.raw.close()
+
+    def commit(self):
+        # returns the name of the compressed log
+        self._close()
+        os.replace(self.tmpfilename, self.filename)
+        return self.filename
+
+    def discard(self):
+        self._close()
+        os.remove(self.tmpfilename)
+
+###########################################
+
+def read_and_parse(filename, is_testbed):
+    # (decompressed bytes, lines, events)
+    counts = [0, 0]
+    def counted(f):
+        for line in f:
+            counts[0] += len(line)
+            counts[1] += 1
+            yield line
+    with open_log(filename) as f:
+        num_events = sum(1 for _ in logparse.tokenize(counted(f), is_testbed))
+    return counts[0], counts[1], num_events
+
+###########################################
+
+def benchmark(filename, is_testbed, scratch_directory):
+    # the same log stored in each way
+    base = os.path.join(scratch_directory, os.path.basename(strip_suffix(filename)))
+    with open_log(filename, "rb") as inf, open(base, "wb") as outf:
+        shutil.copyfileobj(inf, outf, BLOCK_SIZE)
+    variants = [("raw", base)]
+    for method in ("gzip", "zstd"):
+        if method == "zstd" and zstandard is None:
+            print("  zstd: skipped, the zstandard module is not installed")
+            continue
+        shutil.copyfile(base, base + ".copy")
+        variants.append((method, compress(base + ".copy", method)))
+
+    raw_size = os.path.getsize(base)
+    print("{:<6} {:>12} {:>7} {:>9} {:>10} {:>10}".format("format", "bytes", "ratio", "seconds", "MB/s", "lines/s"))
+    for name, variant in variants:
+        size = os.path.getsize(variant)
+        start = time.time()
+        num_bytes, num_lines, num_events = read_and_parse(variant, is_testbed)
+        seconds = max(time.time() - start, 1e-9)
+        print("{:<6} {:>12} {:>7.2f} {:>9.2f} {:>10.1f} {:>10.0f}".format(
+            name, size, raw_size / size if size else 0.0, seconds,
+            num_bytes / seconds / 1e6, num_lines / seconds))
+        os.remove(variant)
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} [--testbed] [--compress gzip|zstd] <logfile>...".format(sys.argv[0]))
+        return
+
+    args = sys.argv[1:]
+    is_testbed = "--testbed" in args
+    args = [u for u in args if u != "--testbed"]
+    if args[0] == "--compress":
+        # compress logs in place, e.g. the ones from before the runner compressed them
+        method = args[1]
+        for filename in args[2:]:
+            if not is_compressed(filename):
+                print(compress(filename, method))
+        return
+
+    # the page cache makes the first read of each variant as fast as the later ones,
+    # so the numbers are the CPU cost; on network storage the compressed reads also move fewer bytes
+    scratch_directory = tempfile.mkdtemp()
+    try:
+        for filename in args:
+            print(filename)
+            benchmark(filename, is_testbed, scratch_directory)
+    finally:
+        shutil.rmtree(scratch_directory)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+import re
+import sys
+import time
+from collections import namedtuple
+
+#
+# Single-pass tokenizer for the logs produced by the experiments.
+#
+# Two input formats are supported:
+# - Cooja (COOJA.testlog), space-separated, the timestamp in microseconds:
+#     314937392 1 [INFO: Node      ] seqnum=6 from=fd00::205:5:5:5
+# - IoT-LAB (serial_aggregator), semicolon-separated, the timestamp in Unix seconds:
+#     1570531244.735377;m3-197;[INFO: Main      ] Node ID: 43378
+#
+# Each line is split once into (timestamp, node, text), and the text
+# is classified by a single compiled regular expression instead of
+# a sequence of substring probes.
+#
+
+# the first line seen from a node
+EV_NODE = 0
+# args: (node_id,)
+EV_NODE_ID = 1
+# args: ()
+EV_ASSOC = 2
+# args: (seqnum, direction, from_node); direction is None if the address is missing,
+# from_node is None unless the direction is "from"
+EV_SEQNUM = 3
+# args: (tx, ack, rx)
+EV_LINK_STATS = 4
+# args: (radio_on, radio_total)
+EV_ENERGEST = 5
+# args: ()
+EV_QUEUE_DROP = 6
+
+EVENT_NAMES = {
+    EV_NODE : "node",
+    EV_NODE_ID : "node-id",
+    EV_ASSOC : "assoc",
+    EV_SEQNUM : "rx-seqnum",
+    EV_LINK_STATS : "link-stats",
+    EV_ENERGEST : "energest",
+    EV_QUEUE_DROP : "queue-drop",
+}
+
+# ts is in milliseconds (relative to the first line for the testbed logs)
+Event = namedtuple("Event", ["kind", "ts", "node", "args"])
+
+EVENT_RE = re.compile(
+    r"association done \((?P<assoc>1)"
+    r"|seqnum=(?P<sn>\d+)(?: (?P<dir>\w+)=(?P<addr>\S*))?"
+    r"|num packets: tx=(?P<tx>\d+) ack=(?P<ack>\d+) rx=(?P<rx>\d+)"
+    r"|Radio total :\s*(?P<on>\d+)/\s*(?P<total>\d+)"
+    r"|(?P<drop>add packet failed)"
+    r"|Node ID: (?P<nodeid>\d+)"
+)
+
+###########################################
+
+def classify(text):
+    m = EVENT_RE.search(text)
+    if m is None:
+        return None
+
+    group = m.lastgroup
+    if group == "assoc":
+        return (EV_ASSOC, ())
+    if group == "sn" or group == "addr":
+        direction = m.group("dir")
+        from_node = None
+        if direction == "from":
+            from_node = int(m.group("addr").split(":")[-1], 16)
+        return (EV_SEQNUM, (int(m.group("sn")), direction, from_node))
+    if group == "rx":
+        return (EV_LINK_STATS, (int(m.group("tx")), int(m.group("ack")), int(m.group("rx"))))
+    if group == "total":
+        return (EV_ENERGEST, (int(m.group("on")), int(m.group("total"))))
+    if group == "drop":
+        return (EV_QUEUE_DROP, ())
+    if group == "nodeid":
+        return (EV_NODE_ID, (int(m.group("nodeid")),))
+    return None
+
+###########################################
+
+def tokenize(lines, is_testbed=False, start_ts_unix=None):
+    # by default the testbed timestamps are relative to the first line
+    seen_nodes = set()
+
+    for line in lines:
+        try:
+            # in milliseconds
+            if is_testbed:
+                fields = line.strip().split(";")
+                if len(fields) < 3:
+                    continue
+                ts_unix = float(fields[0])
+                if start_ts_unix is None:
+                    start_ts_unix = ts_unix
+                ts = int((ts_unix - start_ts_unix) * 1000)
+                node = int(fields[1][3:])
+                text = fields[2]
+            else:
+                fields = line.split(None, 2)
+                ts = int(fields[0]) // 1000
+                node = int(fields[1])
+                text = fields[2] if len(fields) > 2 else ""
+        except:
+            # failed to extract timestamp
+            continue
+
+        if node not in seen_nodes:
+            seen_nodes.add(node)
+            yield Event(EV_NODE, ts, node, ())
+
+        r = classify(text)
+        if r is not None:
+            yield Event(r[0], ts, node, r[1])
+
+###########################################
+
+def count_lines(filename):
+    with open(filename, "r") as f:
+        return sum(1 for _ in f)
+
+###########################################
+
+def benchmark(filename, is_testbed):
+    num_lines = count_lines(filename)
+    counts = {kind : 0 for kind in EVENT_NAMES}
+
+    start = time.time()
+    with open(filename, "r") as f:
+        for ev in tokenize(f, is_testbed):
+            counts[ev.kind] += 1
+    duration = time.time() - start
+
+    print(filename)
+    print("  {} lines in {:.2f} seconds: {:.0f} lines/second".format(
+        num_lines, duration, num_lines / duration if duration else 0.0))
+    for kind in sorted(counts):
+        print("  {:>10}: {}".format(EVENT_NAMES[kind], counts[kind]))
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} [--testbed] <logfile>...".format(sys.argv[0]))
+        return
+
+    is_testbed = "--testbed" in sys.argv[1:]
+    for filename in sys.argv[1:]:
+        if filename == "--testbed":
+            continue
+        benchmark(filename, is_testbed)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
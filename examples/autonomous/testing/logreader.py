@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import mmap
+import collections
+
+import logfile
+
+#
+# Memory-mapped reader of a time window of a log file.
+#
+# The timestamps in the logs are monotonically increasing, so the start and the end
+# of the window are found by binary search instead of parsing all lines before them.
+# The lines before the window that are still needed (association and node ID lines)
+# are found by a prescan for their markers only.
+#
+# A compressed log (see logfile.py) or a log that arrives as a stream (e.g. from a remote host)
+# cannot be mapped: it is read in one pass, and only the lines up to the end of the window are parsed.
+#
+
+PRESCAN_MARKERS = [
+    b"association done (1",
+    b"Node ID:",
+]
+
+###########################################
+
+class WindowReader:
+    # source: the name of a log file, or a binary stream of a log (e.g. the output of a remote "cat");
+    # tee: if given, all bytes of the log are also written to it, even those after the window
+    def __init__(self, source, is_testbed=False, tee=None):
+        self.is_testbed = is_testbed
+        self.tee = tee
+        # the lines read ahead from a stream, to find the first timestamp
+        self.head = collections.deque()
+        if isinstance(source, str):
+            self.filename = source
+            self.is_stream = logfile.is_compressed(source)
+            self.owns_file = True
+            if self.is_stream:
+                self.f = logfile.open_log(source, "rb")
+                # of the file on disk
+                self.size = os.path.getsize(source)
+            else:
+                self.f = open(source, "rb")
+                self.size = os.fstat(self.f.fileno()).st_size
+        else:
+            self.filename = getattr(source, "name", "<stream>")
+            self.is_stream = True
+            # closed by the caller
+            self.owns_file = False
+            self.f = source
+            self.size = None
+        # mmap fails on empty files
+        if self.size and not self.is_stream:
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.mm = b""
+        # of the log, i.e. after the decompression
+        self.bytes_parsed = 0
+        # the testbed timestamps are relative to the first line
+        self.start_ts_unix = None
+        if is_testbed:
+            if self.is_stream:
+                self.start_ts_unix = self._stream_start_ts_unix()
+            else:
+                self.start_ts_unix = self._find_start_ts_unix()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        # after an error, the rest of the log is not copied
+        self.close(exc_type is None)
+
+    # complete: copy the rest of the log to the tee, also if the caller stopped reading early
+    def close(self, complete=True):
+        if self.tee is not None and complete:
+            for line in self._stream():
+                self.tee.write(line)
+        if self.size and not self.is_stream:
+            self.mm.close()
+        if self.owns_file:
+            self.f.close()
+
+    def _start_ts_unix(self, line):
+        fields = line.split(b";", 2)
+        if len(fields) >= 3:
+            try:
+                return float(fields[0])
+            except ValueError:
+                pass
+        return None
+
+    # the lines of a stream that have not been read yet
+    def _stream(self):
+        while self.head:
+            yield self.head.popleft()
+        yield from self.f
+
+    def _stream_start_ts_unix(self):
+        for line in self.f:
+            self.head.append(line)
+            ts = self._start_ts_unix(line)
+            if ts is not None:
+                return ts
+        return None
+
+    def _find_start_ts_unix(self):
+        pos = 0
+        while pos < self.size:
+            end = self._line_end(pos)
+            ts = self._start_ts_unix(self.mm[pos:end])
+            if ts is not None:
+                return ts
+            pos = end + 1
+        return None
+
+    def _line_end(self, pos):
+        end = self.mm.find(b"\n", pos)
+        return self.size if end == -1 else end
+
+    # in milliseconds, or None if the line has no timestamp
+    def _parse_ts(self, line):
+        try:
+            if self.is_testbed:
+                fields = line.split(b";", 2)
+                if len(fields) < 3:
+                    return None
+                return int((float(fields[0]) - self.start_ts_unix) * 1000)
+            return int(line.split(None, 1)[0]) // 1000
+        except (ValueError, IndexError, TypeError):
+            return None
+
+    # the offset of the first line with a timestamp larger than ts
+    def find(self, ts):
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # move back to the start of the line
+            pos = self.mm.rfind(b"\n", lo, mid) + 1 or lo
+            # skip the lines without timestamps
+            while pos < hi:
+                end = self._line_end(pos)
+                line_ts = self._parse_ts(self.mm[pos:end])
+                if line_ts is not None:
+                    break
+                pos = end + 1
+            else:
+                hi = self.mm.rfind(b"\n", lo, mid) + 1 or lo
+                continue
+            if line_ts > ts:
+                hi = pos
+            else:
+                lo = end + 1
+        return min(lo, self.size)
+
+    def _prescan(self, end_offset):
+        offsets = set()
+        for marker in PRESCAN_MARKERS:
+            pos = self.mm.find(marker, 0, end_offset)
+            while pos != -1:
+                offsets.add(self.mm.rfind(b"\n", 0, pos) + 1)
+                pos = self.mm.find(marker, pos + len(marker), end_offset)
+        for pos in sorted(offsets):
+            line = self.mm[pos:self._line_end(pos) + 1]
+            self.bytes_parsed += len(line)
+            yield line.decode("utf-8", "replace")
+
+    # the same lines as the mapped reader, in one pass over the stream
+    def _stream_lines(self, start_ts, end_ts):
+        in_window = False
+        for line in self._stream():
+            if self.tee is not None:
+                self.tee.write(line)
+            ts = self._parse_ts(line)
+            if ts is not None:
+                if end_ts is not None and ts > end_ts:
+                    break
+                if ts > start_ts:
+                    in_window = True
+            self.bytes_parsed += len(line)
+            if in_window or any(marker in line for marker in PRESCAN_MARKERS):
+                yield line.decode("utf-8", "replace")
+
+    # the marker lines before start_ts, then all lines with timestamps in (start_ts, end_ts]
+    def lines(self, start_ts, end_ts=None):
+        if self.is_stream:
+            yield from self._stream_lines(start_ts, end_ts)
+            return
+        if not self.size:
+            return
+        start_offset = self.find(start_ts)
+        end_offset = self.size if end_ts is None else self.find(end_ts)
+
+        yield from self._prescan(start_offset)
+
+        self.bytes_parsed += max(0, end_offset - start_offset)
+        self.mm.seek(start_offset)
+        while self.mm.tell() < end_offset:
+            yield self.mm.readline().decode("utf-8", "replace")
+
+###########################################
+
+def main():
+    if len(sys.argv) < 4:
+        print("usage: {} [--testbed] <start_minutes> <end_minutes> <logfile>...".format(sys.argv[0]))
+        return
+
+    args = [u for u in sys.argv[1:] if u != "--testbed"]
+    is_testbed = len(args) < len(sys.argv) - 1
+    start_ts = int(float(args[0]) * 60 * 1000)
+    end_ts = int(float(args[1]) * 60 * 1000)
+    for filename in args[2:]:
+        with WindowReader(filename, is_testbed) as reader:
+            num_lines = sum(1 for _ in reader.lines(start_ts, end_ts))
+            print("{}: {} lines, {} of {} bytes parsed ({:.1f}%)".format(
+                filename, num_lines, reader.bytes_parsed, reader.size,
+                100.0 * reader.bytes_parsed / reader.size if reader.size else 0.0))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
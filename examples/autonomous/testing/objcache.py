@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import shutil
+import hashlib
+import subprocess
+
+#
+# Compiler wrapper that shares the object files among the firmware configurations.
+#
+# Usage: objcache.py <compiler> <compiler args...>, e.g. as make CC="objcache.py arm-none-eabi-gcc".
+#
+# The key of an object file is the hash of the compiler, the code generation flags
+# (all flags except the preprocessor and dependency ones) and the preprocessed source.
+# Most Contiki translation units preprocess to the same text in all configurations,
+# even though the -D flags differ (e.g. the slotframe size only matters to Orchestra),
+# so they are compiled once and copied from the cache in the other configurations.
+#
+# Everything except the compilation of a single C file to an object file is passed through.
+#
+# Environment:
+#   OBJCACHE_DIR   - the cache directory (default: ~/.cache/objcache)
+#   OBJCACHE_STATS - if set, "hit" or "miss" is appended to this file for each object
+#
+
+CACHE_DIR = os.environ.get("OBJCACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "objcache"))
+
+STATS_FILENAME = os.environ.get("OBJCACHE_STATS")
+
+# flags that only affect the preprocessing and are reflected in its output; with or without a separate value
+PREPROCESSOR_FLAGS = ("-D", "-U", "-I", "-include", "-imacros", "-isystem", "-iquote", "-idirafter")
+PREPROCESSOR_FLAGS_WITH_VALUE = ("-D", "-U", "-I", "-include", "-imacros", "-isystem", "-iquote", "-idirafter",
+                                 "-MF", "-MT", "-MQ")
+
+###########################################
+
+def parse_args(args):
+    # returns (source, output, code generation flags, preprocessor flags), or None if not a cacheable compilation
+    if "-c" not in args:
+        return None
+    source = None
+    output = None
+    codegen = []
+    preprocessor = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-o" and i + 1 < len(args):
+            output = args[i + 1]
+            i += 2
+            continue
+        if arg in PREPROCESSOR_FLAGS_WITH_VALUE and i + 1 < len(args):
+            preprocessor += [arg, args[i + 1]]
+            i += 2
+            continue
+        if arg.startswith(PREPROCESSOR_FLAGS) or arg.startswith("-M"):
+            preprocessor.append(arg)
+        elif arg == "-c":
+            pass
+        elif arg.endswith(".c") and not arg.startswith("-"):
+            if source is not None:
+                # more than one source file
+                return None
+            source = arg
+        else:
+            codegen.append(arg)
+        i += 1
+    if source is None or output is None:
+        return None
+    return source, output, codegen, preprocessor
+
+###########################################
+
+def compiler_id(compiler):
+    path = shutil.which(compiler) or compiler
+    st = os.stat(path)
+    return "{} {} {}".format(os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+###########################################
+
+def dependency_flags(preprocessor, output):
+    # with -E, write the dependency file that the compilation would write
+    if "-MMD" not in preprocessor and "-MD" not in preprocessor:
+        return []
+    flags = []
+    if "-MF" not in preprocessor:
+        flags += ["-MF", os.path.splitext(output)[0] + ".d"]
+    if "-MT" not in preprocessor and "-MQ" not in preprocessor:
+        flags += ["-MT", output]
+    return flags
+
+###########################################
+
+def record(stat):
+    if STATS_FILENAME:
+        with open(STATS_FILENAME, "a") as f:
+            f.write(stat + "\n")
+
+###########################################
+
+def compile(argv):
+    compiler, args = argv[0], argv[1:]
+    parsed = parse_args(args)
+    if parsed is None:
+        return subprocess.call(argv)
+    source, output, codegen, preprocessor = parsed
+
+    # -P: no line markers, so that the same text included from different paths has the same key
+    pp = subprocess.run([compiler] + preprocessor + dependency_flags(preprocessor, output)
+                        + codegen + ["-E", "-P", source],
+                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if pp.returncode != 0:
+        # let the compiler report the error
+        return subprocess.call(argv)
+
+    h = hashlib.sha1()
+    h.update(compiler_id(compiler).encode("utf-8") + b"\0")
+    h.update(" ".join(codegen).encode("utf-8") + b"\0")
+    h.update(pp.stdout)
+    key = h.hexdigest()
+    cached = os.path.join(CACHE_DIR, key[:2], key + ".o")
+
+    if os.access(cached, os.R_OK):
+        # a copy, not a link: make needs the object to be newer than the sources
+        shutil.copyfile(cached, output)
+        record("hit")
+        return 0
+
+    retcode = subprocess.call(argv)
+    if retcode == 0:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmpfilename = "{}.{}.tmp".format(cached, os.getpid())
+        shutil.copyfile(output, tmpfilename)
+        # atomic, as the configurations are built concurrently
+        os.replace(tmpfilename, cached)
+        record("miss")
+    return retcode
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} <compiler> <compiler args...>".format(sys.argv[0]))
+        sys.exit(2)
+    sys.exit(compile(sys.argv[1:]))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -102,6 +102,14 @@ SLOTFRAME_SIZES_C =[
 
 SLOTFRAME_SIZES = SLOTFRAME_SIZES_C
 
+# the starting points of the adaptive sweep (see adaptive_sweep.py),
+# which adds sizes between them only where the PDR / duty cycle front needs them
+SLOTFRAME_SIZES_COARSE = [
+    7,
+    31,
+    101
+]
+
 SEND_INTERVALS = [
     6,   # 10 packets per minute  (6x5^0)
 #    30,  # 2 packets per minute   (6x5^1)
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+import multiprocessing
+from collections import namedtuple
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as pl
+
+#
+# Rendering of plot jobs in a process pool.
+#
+# A plot job is a call of a graph function that writes one PDF file to the output directory.
+# The jobs whose input data has not changed since the last rendering are skipped;
+# the hashes of the inputs are stored in the output directory.
+# Within each worker, the figures are reused instead of created for each plot.
+#
+
+HASHES_FILENAME = ".plot-hashes.json"
+
+# increase this when the graph functions change to render all plots again
+PLOT_VERSION = 1
+
+PlotJob = namedtuple("PlotJob", ["func", "args", "kwargs", "filename"])
+
+# per process: figure size -> figure
+figures = {}
+
+###########################################
+
+def new_figure(figsize):
+    # an empty figure of the given size, reused within the process
+    fig = figures.get(figsize)
+    if fig is None or not pl.fignum_exists(fig.number):
+        fig = pl.figure(figsize=figsize)
+        figures[figsize] = fig
+    else:
+        fig.clf()
+        fig.set_size_inches(figsize)
+        pl.figure(fig.number)
+    return fig
+
+###########################################
+
+def to_json(o):
+    # numpy arrays and scalars
+    if hasattr(o, "tolist"):
+        return o.tolist()
+    return str(o)
+
+###########################################
+
+def job_hash(job):
+    h = hashlib.sha1()
+    h.update(json.dumps([PLOT_VERSION, job.func.__name__, job.args, job.kwargs],
+                        default=to_json, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+###########################################
+
+def load_hashes(out_dir):
+    try:
+        with open(os.path.join(out_dir, HASHES_FILENAME), "r") as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+###########################################
+
+def save_hashes(out_dir, hashes):
+    filename = os.path.join(out_dir, HASHES_FILENAME)
+    tmpfilename = filename + ".tmp"
+    with open(tmpfilename, "w") as f:
+        json.dump(hashes, f, indent=2, sort_keys=True)
+    os.replace(tmpfilename, filename)
+
+###########################################
+
+def render(job):
+    job.func(*job.args, **job.kwargs)
+    return job.filename
+
+###########################################
+
+def render_all(jobs, out_dir, num_workers):
+    hashes = load_hashes(out_dir)
+
+    todo = []
+    for job in jobs:
+        h = job_hash(job)
+        if hashes.get(job.filename) == h and os.access(os.path.join(out_dir, job.filename), os.R_OK):
+            continue
+        todo.append((job, h))
+    print("{} plots up to date, {} to render".format(len(jobs) - len(todo), len(todo)))
+
+    if num_workers <= 1 or len(todo) <= 1:
+        for job, _ in todo:
+            render(job)
+    else:
+        with multiprocessing.Pool(min(num_workers, len(todo))) as pool:
+            pool.map(render, [job for job, _ in todo], chunksize=1)
+
+    for job, h in todo:
+        hashes[job.filename] = h
+    save_hashes(out_dir, hashes)
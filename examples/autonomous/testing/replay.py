@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import socket
+
+import logfile
+
+#
+# Replay of a recorded log with its original timing, sped up, to load-test the consumers
+# of serial output (livestream.py, or e.g. the udpReceive loop of a visualisation script).
+#
+# The lines of a COOJA.testlog (timestamps in microseconds) or of an IoT-LAB log
+# (Unix timestamps in seconds, ";"-separated) are written out at the times of their timestamps,
+# divided by the speed factor, or as fast as possible. The schedule is relative to the first line,
+# so sleeping late does not accumulate drift. The output goes to stdout (a pipe), to a TCP
+# connection, or to UDP with one datagram per line.
+#
+# The report gives the achieved lines per second and the backpressure of the consumer:
+# the share of the time that the replay was blocked writing to it, and how far the replay
+# fell behind its schedule. A consumer that keeps up has neither. UDP does not block;
+# its lost datagrams are only seen by the consumer, and failed sends are counted.
+#
+# Usage: ./replay.py [--speed=<factor>|--fast] [--to=-|tcp:<host>:<port>|tcp::<port>|udp:<host>:<port>] <logfile>
+# "tcp::<port>" waits for the consumer to connect to the port.
+#
+
+DEFAULT_SPEED = 60.0
+
+# the output to a pipe or TCP is written in blocks of this size, and before each sleep
+BLOCK_SIZE = 64 * 1024
+
+# progress is reported this often, in seconds
+REPORT_SECONDS = 10
+
+###########################################
+
+def line_seconds(line):
+    # the timestamp of a line in seconds, or None
+    try:
+        if b";" in line:
+            return float(line.split(b";", 1)[0])
+        return int(line.split(None, 1)[0]) / 1e6
+    except (ValueError, IndexError):
+        return None
+
+###########################################
+
+class StreamSink:
+    # a pipe or a TCP connection; write_data blocks while the consumer does not keep up
+    def __init__(self, write_data, close=None):
+        self.write_data = write_data
+        self.close_fn = close
+        self.buffer = []
+        self.size = 0
+        # the seconds spent blocked in write_data
+        self.blocked = 0.0
+        self.errors = 0
+
+    def write(self, line):
+        self.buffer.append(line)
+        self.size += len(line)
+        if self.size >= BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = b"".join(self.buffer)
+        self.buffer = []
+        self.size = 0
+        start = time.time()
+        self.write_data(data)
+        self.blocked += time.time() - start
+
+    def close(self):
+        self.flush()
+        if self.close_fn is not None:
+            self.close_fn()
+
+###########################################
+
+class UdpSink:
+    # one datagram per line, without the newline
+    def __init__(self, address):
+        family, socktype, proto, _, sockaddr = socket.getaddrinfo(address[0], address[1], 0, socket.SOCK_DGRAM)[0]
+        self.sock = socket.socket(family, socktype, proto)
+        self.sockaddr = sockaddr
+        self.blocked = 0.0
+        self.errors = 0
+
+    def write(self, line):
+        start = time.time()
+        try:
+            self.sock.sendto(line.rstrip(b"\r\n"), self.sockaddr)
+        except OSError:
+            # e.g. ENOBUFS, or ECONNREFUSED from an earlier datagram
+            self.errors += 1
+        self.blocked += time.time() - start
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+###########################################
+
+def split_address(address):
+    # "<host>:<port>", the host possibly an IPv6 address in brackets
+    host, port = address.rsplit(":", 1)
+    return host.strip("[]"), int(port)
+
+###########################################
+
+def open_sink(destination):
+    if destination == "-":
+        out = sys.stdout.buffer
+        def write_data(data):
+            out.write(data)
+            out.flush()
+        return StreamSink(write_data)
+    kind, _, address = destination.partition(":")
+    host, port = split_address(address)
+    if kind == "udp":
+        return UdpSink((host, port))
+    if kind != "tcp":
+        raise ValueError("unknown destination: " + destination)
+    if host:
+        sock = socket.create_connection((host, port))
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(("", port))
+        server.listen(1)
+        sock, _ = server.accept()
+        server.close()
+    return StreamSink(sock.sendall, sock.close)
+
+###########################################
+
+class ReplayStats:
+    def __init__(self, speed):
+        self.speed = speed
+        self.num_lines = 0
+        self.num_bytes = 0
+        self.start = time.time()
+        self.end = self.start
+        self.first_ts = None
+        self.last_ts = None
+        # the furthest behind the schedule, in seconds
+        self.max_lag = 0.0
+
+    def log_seconds(self):
+        if self.first_ts is None:
+            return 0.0
+        return self.last_ts - self.first_ts
+
+    def report(self, sink, final=False):
+        self.end = time.time()
+        wall = max(self.end - self.start, 1e-9)
+        text = "{}{} lines ({:.1f} MB) in {:.1f} s: {:.0f} lines/s".format(
+            "replayed " if final else "", self.num_lines, self.num_bytes / 1e6, wall, self.num_lines / wall)
+        if self.speed is not None and self.log_seconds() > 0:
+            target = self.num_lines / (self.log_seconds() / self.speed)
+            text += " (schedule: {:.0f} lines/s at speed {:g}), up to {:.2f} s behind the schedule".format(
+                target, self.speed, self.max_lag)
+        text += "; blocked on the consumer {:.1f}% of the time".format(100.0 * sink.blocked / wall)
+        if sink.errors:
+            text += ", {} failed sends".format(sink.errors)
+        print(text, file=sys.stderr)
+        sys.stderr.flush()
+
+###########################################
+
+def replay(lines, sink, stats):
+    # at stats.speed, or as fast as possible if it is None
+    speed = stats.speed
+    stats.start = time.time()
+    last_report = stats.start
+    for line in lines:
+        ts = line_seconds(line)
+        if ts is not None:
+            if stats.first_ts is None:
+                stats.first_ts = ts
+            stats.last_ts = ts
+            if speed is not None:
+                delay = stats.start + (ts - stats.first_ts) / speed - time.time()
+                if delay > 0:
+                    sink.flush()
+                    time.sleep(delay)
+                else:
+                    stats.max_lag = max(stats.max_lag, -delay)
+        sink.write(line)
+        stats.num_lines += 1
+        stats.num_bytes += len(line)
+        if stats.num_lines % 1024 == 0 and time.time() - last_report >= REPORT_SECONDS:
+            last_report = time.time()
+            stats.report(sink)
+    sink.flush()
+    return stats
+
+###########################################
+
+def main():
+    args = sys.argv[1:]
+    speed = DEFAULT_SPEED
+    destination = "-"
+    for a in list(args):
+        if a == "--fast":
+            speed = None
+            args.remove(a)
+        elif a.startswith("--speed="):
+            speed = float(a[len("--speed="):])
+            args.remove(a)
+        elif a.startswith("--to="):
+            destination = a[len("--to="):]
+            args.remove(a)
+    if len(args) != 1:
+        print("usage: {} [--speed=<factor>|--fast] [--to=-|tcp:<host>:<port>|tcp::<port>|udp:<host>:<port>] <logfile>".format(
+            sys.argv[0]))
+        sys.exit(2)
+
+    sink = open_sink(destination)
+    stats = ReplayStats(speed)
+    with logfile.open_log(args[0], "rb") as f:
+        try:
+            replay(f, sink, stats)
+            sink.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # the consumer stopped reading, e.g. it aborted the run
+            print("the consumer closed the connection", file=sys.stderr)
+            if destination == "-":
+                # no second error when stdout is flushed at exit
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            stats.report(sink, final=True)
+            sys.exit(1)
+    stats.report(sink, final=True)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
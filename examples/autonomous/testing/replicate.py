@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import math
+import multiprocessing
+
+import numpy as np
+
+from parameters import *
+import runcatalog
+import scheduler
+import bootstrap
+import generate_sims
+# the same parsing rules, per-log result cache and confidence intervals as the full analysis
+import analyze
+
+#
+# Sequential replication of the simulations.
+#
+# Instead of the same number of runs for every cell of the grid (algorithm, send interval,
+# slotframe size, experiment, neighbor count), each cell starts with INITIAL_RUNS runs and gets more
+# only while the confidence interval of its PDR or its radio duty cycle is wider than the target.
+# The runs of a cell are its topologies in turn, first with the random seeds of their .csc files,
+# then with new seeds in the <randomseed> element (see generate_replica in generate_sims.py).
+#
+# In each round the missing runs are generated and run by scheduler.py, and the intervals of all cells
+# are bootstrapped at once. A cell that is not narrow enough gets the number of runs that its current
+# width predicts (the width shrinks with the square root of the number of runs), up to MAX_STEP more.
+#
+# The number of runs of each cell is stored in a JSON file, so an interrupted sweep continues where it stopped.
+#
+# Usage: ./replicate.py [<num jobs>]  (from this directory, as generate_sims.py)
+#
+
+STATE_FILENAME = "replication.json"
+
+QUEUE_DESCRIPTION = "replication"
+
+INITIAL_RUNS = 4
+MAX_RUNS = 30
+# the most runs added to a cell in one round
+MAX_STEP = 6
+
+# the target widths of the confidence intervals, in percentage points
+TARGET_PDR_WIDTH = 2.0
+TARGET_RDC_WIDTH = 0.1
+
+MAX_ROUNDS = 10
+
+NUM_WORKERS = multiprocessing.cpu_count()
+
+###########################################
+
+def grid_cells():
+    cells = []
+    for a in ALGORITHMS:
+        for si in SEND_INTERVALS:
+            for sf in SLOTFRAME_SIZES:
+                for exp in EXPERIMENTS:
+                    for nn in NUM_NEIGHBORS:
+                        cells.append((a, si, sf, exp, nn))
+    return cells
+
+###########################################
+
+def cell_name(cell):
+    return "{}/si_{}/sf_{}/{}/{}".format(*cell)
+
+###########################################
+
+def load_state():
+    try:
+        with open(STATE_FILENAME, "r") as f:
+            state = json.load(f)
+    except (IOError, ValueError):
+        state = {}
+    for cell in grid_cells():
+        state.setdefault(cell_name(cell), {"runs" : INITIAL_RUNS, "converged" : False})
+    return state
+
+###########################################
+
+def store_state(state):
+    tmpfilename = "{}.{}.tmp".format(STATE_FILENAME, os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmpfilename, STATE_FILENAME)
+
+###########################################
+
+def run_cells(state, num_jobs):
+    # generate and run the runs of all cells; the complete ones are skipped by the scheduler.
+    # Returns cell -> the directories of its runs
+    directories = {}
+    for cell in grid_cells():
+        directories[cell] = [generate_sims.generate_replica(*cell, replica)
+                             for replica in range(state[cell_name(cell)]["runs"])]
+    queue = [d for cell in grid_cells() for d in directories[cell]]
+    generate_sims.generate_runner(QUEUE_DESCRIPTION, queue, True)
+    scheduler.run_queue("run-" + QUEUE_DESCRIPTION + ".queue", num_jobs)
+    return directories
+
+###########################################
+
+def measure(directories):
+    # cell -> (per-run mean PDR, per-run mean RDC) of the runs of the cell that have logs
+    catalog = runcatalog.RunCatalog(generate_sims.OUT_DIRECTORY)
+    jobs = []
+    cells = []
+    for cell in grid_cells():
+        # only the runs of the replication, not any others in the same cell
+        wanted = set(os.path.abspath(d) for d in directories[cell])
+        first_job = len(jobs)
+        jobs += [(catalog.log_filename(run), cell[3], cell[1])
+                 for run in catalog.find(*cell) if run.has_log and os.path.abspath(run.path) in wanted]
+        cells.append((cell, first_job, len(jobs)))
+
+    results = analyze.process_files(jobs, NUM_WORKERS)
+
+    samples = {}
+    for cell, first_job, last_job in cells:
+        pdr = [float(np.mean([x[0] for x in r])) for r in results[first_job:last_job]]
+        rdc = [float(np.mean([x[2] for x in r])) for r in results[first_job:last_job]]
+        samples[cell] = (pdr, rdc)
+    return samples
+
+###########################################
+
+def interval_widths(samples):
+    # cell -> (PDR width, RDC width); all cells are bootstrapped at once
+    cells = list(samples)
+    widths = []
+    for i in range(2):
+        _, lower, upper = bootstrap.confidence_intervals([samples[cell][i] for cell in cells], analyze.STATISTIC,
+                                                         analyze.BOOTSTRAP_METHOD, analyze.CI,
+                                                         analyze.BOOTSTRAP_RESAMPLES)
+        widths.append(upper - lower)
+    return {cell : (float(widths[0][j]), float(widths[1][j])) for j, cell in enumerate(cells)}
+
+###########################################
+
+def next_runs(num_runs, pdr_width, rdc_width):
+    # the number of runs expected to narrow both intervals to the targets
+    if math.isnan(pdr_width) or math.isnan(rdc_width):
+        # too few runs succeeded for an interval
+        return num_runs + 1
+    ratio = max(pdr_width / TARGET_PDR_WIDTH, rdc_width / TARGET_RDC_WIDTH)
+    needed = int(math.ceil(num_runs * ratio * ratio))
+    return min(MAX_RUNS, num_runs + MAX_STEP, max(num_runs + 1, needed))
+
+###########################################
+
+def main():
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else generate_sims.NUM_CORES
+    state = load_state()
+
+    for round_number in range(MAX_ROUNDS):
+        print("round {}".format(round_number + 1))
+        directories = run_cells(state, max(1, num_jobs))
+        samples = measure(directories)
+        widths = interval_widths(samples)
+
+        num_growing = 0
+        for cell in grid_cells():
+            s = state[cell_name(cell)]
+            pdr_width, rdc_width = widths[cell]
+            s["pdr_ci_width"] = None if math.isnan(pdr_width) else pdr_width
+            s["rdc_ci_width"] = None if math.isnan(rdc_width) else rdc_width
+            s["converged"] = pdr_width <= TARGET_PDR_WIDTH and rdc_width <= TARGET_RDC_WIDTH
+            if s["converged"] or s["runs"] >= MAX_RUNS:
+                continue
+            if not samples[cell][0]:
+                # none of its runs succeeded: more of the same will not help
+                print("  {}: no results, see the run status records".format(cell_name(cell)))
+                continue
+            s["runs"] = next_runs(s["runs"], pdr_width, rdc_width)
+            num_growing += 1
+            print("  {}: {} runs, CI widths PDR {:.2f} RDC {:.3f}, going to {} runs".format(
+                cell_name(cell), len(samples[cell][0]), pdr_width, rdc_width, s["runs"]))
+        store_state(state)
+
+        if num_growing == 0:
+            break
+    else:
+        print("stopped after {} rounds, some intervals may be wider than the target".format(MAX_ROUNDS))
+
+    num_cells = len(grid_cells())
+    num_converged = sum(1 for cell in grid_cells() if state[cell_name(cell)]["converged"])
+    # the fixed sweep runs all topologies of every cell
+    fixed = sum(len(generate_sims.topology_filenames(cell[4])) for cell in grid_cells())
+    print("{} of {} cells within the target; {} runs in total, {} with all topologies of every cell".format(
+        num_converged, num_cells, sum(len(d) for d in directories.values()), fixed))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
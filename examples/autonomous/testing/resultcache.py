@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+
+#
+# Per-log cache of the parsing results.
+#
+# The results of each log file are stored next to it, in a small JSON file.
+# The cache entry is valid only as long as its key matches, i.e. the log file
+# has the same path, size and modification time (or content hash),
+# and it was parsed with the same analysis parameters.
+#
+
+CACHE_SUFFIX = ".results.json"
+
+# increase this when the parsing rules change to invalidate all old entries
+CACHE_VERSION = 2
+
+###########################################
+
+def hash_file(filename):
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+###########################################
+
+def make_key(filename, params, use_hash=False):
+    st = os.stat(filename)
+    key = {
+        "version" : CACHE_VERSION,
+        "path" : os.path.abspath(filename),
+        "size" : st.st_size,
+        "params" : params,
+    }
+    if use_hash:
+        key["sha1"] = hash_file(filename)
+    else:
+        key["mtime"] = st.st_mtime_ns
+    return key
+
+###########################################
+
+def cache_filename(filename, suffix=CACHE_SUFFIX):
+    return filename + suffix
+
+###########################################
+
+def load(filename, key, suffix=CACHE_SUFFIX):
+    try:
+        with open(cache_filename(filename, suffix), "r") as f:
+            entry = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if not isinstance(entry, dict) or entry.get("key") != key or "results" not in entry:
+        # stale or foreign entry
+        return None
+    return entry["results"]
+
+###########################################
+
+def store(filename, key, results, suffix=CACHE_SUFFIX):
+    outfilename = cache_filename(filename, suffix)
+    tmpfilename = "{}.{}.tmp".format(outfilename, os.getpid())
+    try:
+        with open(tmpfilename, "w") as f:
+            json.dump({"key" : key, "results" : results}, f)
+        # atomic, so that a concurrent reader never sees a partial file
+        os.replace(tmpfilename, outfilename)
+    except IOError as e:
+        print("Failed to cache results for " + filename)
+        print(e)
@@ -1,8 +1,16 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 import sys
 import os
-from subprocess import Popen, PIPE, STDOUT
+import json
+import time
+import re
+import signal
+import hashlib
+from subprocess import Popen, PIPE, STDOUT, CalledProcessError
+
+import livestats
+import logfile
 
 # of the "autonomous" example
 SELF_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -12,19 +20,53 @@ CONTIKI_PATH = os.path.dirname(os.path.dirname(SELF_PATH))
 cooja = 'java -jar ' + os.path.normpath(os.path.join(SELF_PATH, '../../tools/cooja/dist/cooja.jar'))
 cooja_input = './sim.csc'
 cooja_output = 'COOJA.testlog'
+# the partial log of an aborted run, kept for inspection under a name that the analysis scripts do not read
+aborted_output = cooja_output + '.aborted'
+
+# the status record of the last run, in the simulation directory;
+# the records of all directories form the manifest of the sweep
+STATUS_FILENAME = 'run-status.json'
+STATUS_VERSION = 1
+
+# the files that determine the result of a simulation, relative to its directory
+INPUT_FILENAMES = ['sim.csc', 'Makefile.common', 'common-conf.h',
+                   'node/Makefile', 'node/node.c', 'node/project-conf.h']
+
+# the number of times a failed simulation is run with the same inputs, over all invocations
+MAX_ATTEMPTS = 3
+
+# compress the log of a successful run: "gzip", "zstd" (needs the zstandard module) or None;
+# the analysis scripts read the compressed logs transparently (see logfile.py)
+COMPRESS_LOGS = "gzip"
+
+# the outcomes of a run, as in the status record
+RESULT_OK = 'ok'
+RESULT_FAILED = 'failed'
+# stopped early by the live analysis; not retried, as the simulation is deterministic
+RESULT_ABORTED = 'aborted'
+
+# with --live: the rolling metrics of the run, updated while Cooja is running
+LIVE_STATUS_FILENAME = 'live-status.json'
+LIVE_POLL_SECONDS = 5
+# with --live: the output of Cooja itself
+LIVE_COOJA_OUTPUT = 'cooja.out'
 
 #######################################################
 def run_subprocess(args, input_string):
+    # returns (retcode, output, resource usage of the process and its children, or None)
     retcode = -1
     stdoutdata = ''
+    rusage = None
     try:
         proc = Popen(args, stdout = PIPE, stderr = STDOUT, stdin = PIPE, shell = True)
-        (stdoutdata, stderrdata) = proc.communicate(input_string)
-        if not stdoutdata:
-            stdoutdata = ''
-        if stderrdata:
-            stdoutdata += stderrdata
-        retcode = proc.returncode
+        if input_string:
+            proc.stdin.write(input_string.encode("utf-8"))
+        proc.stdin.close()
+        stdoutdata = proc.stdout.read()
+        proc.stdout.close()
+        # wait4 instead of wait: the rusage also covers the JVM started by the shell
+        (retcode, rusage) = wait_with_usage(proc, 0)
+        stdoutdata = stdoutdata.decode("utf-8", "replace") if stdoutdata else ''
     except OSError as e:
         sys.stderr.write("runSubprocess OSError:" + str(e))
     except CalledProcessError as e:
@@ -33,58 +75,306 @@ def run_subprocess(args, input_string):
     except Exception as e:
         sys.stderr.write("runSubprocess exception:" + str(e))
     finally:
-        return (retcode, stdoutdata)
+        return (retcode, stdoutdata, rusage)
 
 
 #######################################################
-def execute_test(directory, cooja_file):
-    os.chdir(directory)
 
-    # cleanup
+def wait_with_usage(proc, options):
+    # (exit status, rusage) of a child process; (None, None) if WNOHANG and it is still running
+    (pid, status, rusage) = os.wait4(proc.pid, options)
+    if pid == 0:
+        return (None, None)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return (proc.returncode, rusage)
+
+#######################################################
+
+def count_lines(filename):
+    num_lines = 0
+    try:
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                num_lines += block.count(b"\n")
+    except IOError:
+        pass
+    return num_lines
+
+#######################################################
+
+def resource_record(wall_seconds, rusage, log_filename):
+    # the cost of one Cooja execution, as stored in the status record
+    record = {"wall_seconds" : wall_seconds,
+              "user_seconds" : None, "sys_seconds" : None, "max_rss_kb" : None}
+    if rusage is not None:
+        # on Linux, ru_maxrss is in kilobytes and is the peak of the largest process, i.e. the JVM
+        record.update({"user_seconds" : rusage.ru_utime, "sys_seconds" : rusage.ru_stime,
+                       "max_rss_kb" : rusage.ru_maxrss})
+    record["log_bytes"] = os.path.getsize(log_filename) if os.path.exists(log_filename) else 0
+    record["log_lines"] = count_lines(log_filename)
+    return record
+
+#######################################################
+
+def inputs_hash(directory):
+    h = hashlib.sha1()
+    for filename in INPUT_FILENAMES:
+        h.update(filename.encode("utf-8") + b"\0")
+        try:
+            with open(os.path.join(directory, filename), "rb") as f:
+                h.update(f.read())
+        except IOError:
+            h.update(b"\1")
+    return h.hexdigest()
+
+#######################################################
+
+def log_ends_ok(filename):
+    # whether the last line of the log is "TEST OK"; reads only the end of the file
+    try:
+        with open(filename, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 4096))
+            lines = f.read().split(b"\n")
+    except IOError:
+        return False
+    lines = [line.strip() for line in lines if line.strip()]
+    return len(lines) > 0 and lines[-1] == b"TEST OK"
+
+#######################################################
+
+def load_status(directory):
+    try:
+        with open(os.path.join(directory, STATUS_FILENAME), "r") as f:
+            status = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if status.get("version") != STATUS_VERSION:
+        return None
+    return status
+
+#######################################################
+
+def store_status(directory, status):
+    status["version"] = STATUS_VERSION
+    filename = os.path.join(directory, STATUS_FILENAME)
+    tmpfilename = "{}.{}.tmp".format(filename, os.getpid())
+    with open(tmpfilename, "w") as f:
+        json.dump(status, f, indent=2)
+    # atomic, so that an interrupted run never leaves a partial record
+    os.replace(tmpfilename, filename)
+
+#######################################################
+
+def is_complete(directory, status=None, current_inputs=None):
+    # a successful run with the current inputs, whose log is still there
+    if status is None:
+        status = load_status(directory)
+    if status is None or status.get("status") != "ok":
+        return False
+    if status.get("inputs") != (current_inputs or inputs_hash(directory)):
+        return False
+    log_filename = os.path.join(directory, status.get("log", cooja_output))
+    try:
+        if os.path.getsize(log_filename) != status.get("log_size"):
+            return False
+    except OSError:
+        return False
+    if logfile.is_compressed(log_filename):
+        # only complete logs are compressed, and the size matches the record
+        return True
+    return log_ends_ok(log_filename)
+
+#######################################################
+
+def sim_parameters(directory):
+    # (experiment, send interval) of a simulation directory
+    experiment = os.path.basename(os.path.dirname(directory))
+    send_interval = 6
+    try:
+        with open(os.path.join(directory, "Makefile.common"), "r") as f:
+            m = re.search(r"-DSEND_INTERVAL_SEC=(\d+)", f.read())
+            if m:
+                send_interval = int(m.group(1))
+    except IOError:
+        pass
+    return experiment, send_interval
+
+#######################################################
+
+def stop_session(proc):
+    # stop the shell started with start_new_session, and the JVM with it
     try:
-        os.rm(cooja_output)
-    except:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
         pass
+    proc.wait()
+
+#######################################################
+
+def raise_on_sigterm(signum, frame):
+    # stopped by the scheduler: unwind as on Ctrl-C, so that the Cooja session is stopped too
+    raise KeyboardInterrupt
+
+#######################################################
+
+def run_live(args, directory):
+    # run Cooja while following its log; returns (retcode, output, abort reason, rusage)
+    experiment, send_interval = sim_parameters(directory)
+    stats = livestats.LiveStats(experiment, send_interval)
+    tail = livestats.LogTail(os.path.join(directory, cooja_output))
+    status_filename = os.path.join(directory, LIVE_STATUS_FILENAME)
+    output_filename = os.path.join(directory, LIVE_COOJA_OUTPUT)
+    reason = None
+
+    with open(output_filename, "wb") as out:
+        # a session of its own, to stop the JVM together with the shell
+        proc = Popen(args, stdout = out, stderr = STDOUT, stdin = open(os.devnull, "rb"),
+                     shell = True, start_new_session = True)
+        try:
+            while True:
+                (retcode, rusage) = wait_with_usage(proc, os.WNOHANG)
+                is_running = retcode is None
+                stats.feed(tail.read_lines())
+                status = stats.status()
+                if reason is None and is_running:
+                    reason = stats.abort_reason()
+                    if reason is not None:
+                        sys.stdout.write("  Aborting: {}\n".format(reason))
+                        os.killpg(proc.pid, signal.SIGTERM)
+                status["aborted"] = reason
+                status["running"] = is_running
+                livestats.write_status(status_filename, status)
+                if not is_running:
+                    break
+                time.sleep(LIVE_POLL_SECONDS)
+        finally:
+            tail.close()
+            if proc.returncode is None:
+                # interrupted, e.g. by Ctrl-C or by the scheduler: the session is not in our process group
+                stop_session(proc)
+
+    with open(output_filename, "r", errors="replace") as f:
+        output = f.read()
+    return (proc.returncode, output, reason, rusage)
+
+#######################################################
+def execute_test(directory, cooja_file, live=False):
+    # returns (result, resource record)
+    directory = os.path.abspath(directory)
+    os.chdir(directory)
+
+    # cleanup
+    compressed_outputs = [cooja_output + suffix for suffix in logfile.COMPRESSED_SUFFIXES]
+    for filename in [cooja_output, aborted_output, LIVE_STATUS_FILENAME] + compressed_outputs:
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
 
     f = os.path.join(directory, cooja_file)
     args = " ".join([cooja, "-nogui=" + f, "-contiki=" + CONTIKI_PATH])
     sys.stdout.write("  Running Cooja, args={}\n".format(args))
 
-    (retcode, output) = run_subprocess(args, '')
+    start = time.time()
+    reason = None
+    if live:
+        (retcode, output, reason, rusage) = run_live(args, directory)
+    else:
+        (retcode, output, rusage) = run_subprocess(args, '')
+    resources = resource_record(time.time() - start, rusage, cooja_output)
+
+    if reason is not None:
+        try:
+            os.replace(cooja_output, aborted_output)
+        except OSError:
+            pass
+        return (RESULT_ABORTED, resources)
     if retcode != 0:
         sys.stderr.write("Failed, retcode=" + str(retcode) + ", output:")
         sys.stderr.write(output)
-        return False
+        return (RESULT_FAILED, resources)
 
     sys.stdout.write("  Checking for output...")
 
-    is_done = False
-    with open(cooja_output, "r") as f:
-        for line in f.readlines():
-            line = line.strip()
-            if line == "TEST OK":
-                sys.stdout.write(" done.\n")
-                is_done = True
-                continue
-
-    if not is_done:
+    if not log_ends_ok(cooja_output):
         sys.stdout.write("  test failed.\n")
-        return False
+        return (RESULT_FAILED, resources)
 
     sys.stdout.write(" test done\n")
-    return True
+    return (RESULT_OK, resources)
 
 #######################################################
 
-def execute_test_run(directory):
-    execute_test(directory, "sim.csc")
+def compress_log(log_filename):
+    # returns the name of the log as stored
+    try:
+        compressed_filename = logfile.compress(log_filename, COMPRESS_LOGS)
+    except (IOError, OSError) as e:
+        sys.stdout.write("  Keeping the log uncompressed: {}\n".format(e))
+        return log_filename
+    sys.stdout.write("  Compressed the log to {} bytes\n".format(os.path.getsize(compressed_filename)))
+    return compressed_filename
+
+#######################################################
+
+def execute_test_run(directory, max_attempts=MAX_ATTEMPTS, live=False):
+    directory = os.path.abspath(directory)
+    current_inputs = inputs_hash(directory)
+    status = load_status(directory)
+    if is_complete(directory, status, current_inputs):
+        sys.stdout.write("  Already done with the same inputs, skipping\n")
+        return True
+
+    if status is not None and status.get("inputs") == current_inputs and status.get("status") == RESULT_ABORTED:
+        sys.stdout.write("  Aborted before with the same inputs, skipping\n")
+        return False
+
+    if status is None or status.get("inputs") != current_inputs or status.get("status") == RESULT_OK:
+        # a successful run whose log is gone does not count against the attempts
+        status = {"inputs" : current_inputs, "attempts" : 0}
+
+    if status.get("attempts", 0) >= max_attempts:
+        sys.stdout.write("  Failed {} times before with the same inputs, skipping\n".format(status["attempts"]))
+        if status.get("status") != RESULT_FAILED:
+            # e.g. the last attempt was interrupted
+            status["status"] = RESULT_FAILED
+            store_status(directory, status)
+        return False
+
+    while status.get("attempts", 0) < max_attempts:
+        status.update({"status" : "running", "start" : time.time(), "end" : None, "pid" : os.getpid()})
+        status["attempts"] = status.get("attempts", 0) + 1
+        store_status(directory, status)
+
+        (result, resources) = execute_test(directory, "sim.csc", live)
+
+        log_filename = os.path.join(directory, aborted_output if result == RESULT_ABORTED else cooja_output)
+        if result == RESULT_OK and COMPRESS_LOGS is not None:
+            log_filename = compress_log(log_filename)
+        status.update({"status" : result, "end" : time.time(), "log" : os.path.basename(log_filename),
+                       "resources" : resources,
+                       "log_size" : os.path.getsize(log_filename) if os.path.exists(log_filename) else 0})
+        store_status(directory, status)
+        if result == RESULT_OK:
+            return True
+        if result == RESULT_ABORTED:
+            return False
+        sys.stdout.write("  Attempt {} of {} failed\n".format(status["attempts"], max_attempts))
+    return False
 
 #######################################################
 
 def main():
-    arg = sys.argv[1] if len(sys.argv) > 1 else "./"
-    execute_test_run(arg)
+    # --live: follow the log while Cooja runs, and stop hopeless runs early
+    live = "--live" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--live"]
+    arg = args[0] if len(args) > 0 else "./"
+    signal.signal(signal.SIGTERM, raise_on_sigterm)
+    is_ok = execute_test_run(arg, live=live)
     print("all done")
+    # the exit status is recorded by the scheduler
+    sys.exit(0 if is_ok else 1)
 
 #######################################################
 
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+import os
+import re
+import sys
+import fnmatch
+from collections import namedtuple
+
+import logfile
+
+#
+# In-process catalog of the simulation run directories.
+#
+# The simulations tree is scanned once. The runs in the layout created by generate_sims.py,
+#   <algorithm>/si_<si>/sf_<sf>/<experiment>/sim-<nn>-neigh-realsim-<topology>[-seed-<seed>]
+# are indexed by (algorithm, si, sf, experiment, nn); all runs can be queried by a wildcard.
+# The log of a run may be compressed (see logfile.py).
+#
+
+LOG_FILENAME = "COOJA.testlog"
+SIM_FILENAME = "sim.csc"
+
+# the replications with other random seeds (see replicate.py) are in the same cell as the topology
+RUN_NAME_RE = re.compile(r"sim-(\d+)-neigh-realsim-(\d+)(?:-seed-\d+)?$")
+
+# the names of the log, in the order of preference
+LOG_FILENAMES = [LOG_FILENAME] + [LOG_FILENAME + suffix for suffix in logfile.COMPRESSED_SUFFIXES]
+
+# all fields except path and the log info are None if the run is not in the standard layout;
+# log_name is the name of the log file in the run directory, log_size its size on disk
+RunInfo = namedtuple("RunInfo", ["path", "relpath", "algorithm", "si", "sf", "experiment", "nn",
+                                 "topology", "has_log", "log_size", "log_name"])
+
+###########################################
+
+class RunCatalog:
+    def __init__(self, data_directory):
+        self.data_directory = data_directory
+        self.runs = []
+        self.index = {}
+        self.scan()
+
+    def scan(self):
+        self.runs = []
+        self.index = {}
+        stack = [self.data_directory]
+        while stack:
+            dirname = stack.pop()
+            try:
+                entries = list(os.scandir(dirname))
+            except OSError:
+                continue
+
+            files = {}
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    files[entry.name] = entry
+
+            log_entry = next((files[name] for name in LOG_FILENAMES if name in files), None)
+            if log_entry is not None or SIM_FILENAME in files:
+                # a run directory; do not descend into its build directories
+                self._add(dirname, log_entry)
+            else:
+                stack += subdirs
+
+        # in the same order as "ls"
+        self.runs.sort(key=lambda run: run.relpath)
+        for runs in self.index.values():
+            runs.sort(key=lambda run: run.relpath)
+
+    def _add(self, dirname, log_entry):
+        relpath = os.path.relpath(dirname, self.data_directory)
+        has_log = log_entry is not None
+        log_size = log_entry.stat().st_size if has_log else 0
+        log_name = log_entry.name if has_log else LOG_FILENAME
+
+        key = parse_relpath(relpath)
+        if key is None:
+            run = RunInfo(dirname, relpath, None, None, None, None, None, None, has_log, log_size, log_name)
+        else:
+            run = RunInfo(dirname, relpath, *key, has_log=has_log, log_size=log_size, log_name=log_name)
+            self.index.setdefault(key[:5], []).append(run)
+        self.runs.append(run)
+
+    # the runs of one cell of the grid
+    def find(self, algorithm, si, sf, experiment, nn):
+        return self.index.get((algorithm, int(si), int(sf), experiment, int(nn)), [])
+
+    # the runs with relative paths matching a shell-style wildcard; as in the shell,
+    # each path component is matched separately, so "*" does not match across "/"
+    def glob(self, pattern):
+        parts = os.path.normpath(pattern).split(os.sep)
+        return [run for run in self.runs if match_components(run.relpath.split(os.sep), parts)]
+
+    def log_filename(self, run):
+        return os.path.join(run.path, run.log_name)
+
+###########################################
+
+def match_components(parts, pattern_parts):
+    return len(parts) == len(pattern_parts) \
+        and all(fnmatch.fnmatchcase(part, pattern) for part, pattern in zip(parts, pattern_parts))
+
+###########################################
+
+def parse_relpath(relpath):
+    parts = relpath.split(os.sep)
+    if len(parts) != 5:
+        return None
+    algorithm, si, sf, experiment, name = parts
+    m = RUN_NAME_RE.match(name)
+    if m is None or not si.startswith("si_") or not sf.startswith("sf_"):
+        return None
+    try:
+        return (algorithm, int(si[3:]), int(sf[3:]), experiment, int(m.group(1)), int(m.group(2)))
+    except ValueError:
+        return None
+
+###########################################
+
+def main():
+    data_directory = sys.argv[1] if len(sys.argv) > 1 else "../simulations"
+    catalog = RunCatalog(data_directory)
+    with_log = [run for run in catalog.runs if run.has_log]
+    print("{}: {} runs, {} with logs ({} bytes), {} grid cells".format(
+        data_directory, len(catalog.runs), len(with_log),
+        sum(run.log_size for run in with_log), len(catalog.index)))
+    for run in catalog.runs:
+        if not run.has_log:
+            print("  missing log:", run.relpath)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import multiprocessing
+
+import runcatalog
+import run_cooja
+
+#
+# Work-queue scheduler of the Cooja simulation runs.
+#
+# The queue file lists the simulation directories, one per line (see generate_runner in generate_sims.py).
+# Exactly N run_cooja.py jobs are kept running: a new job is started as soon as any job finishes,
+# instead of waiting for a whole batch.
+#
+# The start, end and exit status of each job are appended to a journal next to the queue file.
+# The queue is persistent: when the scheduler is started again, the directories
+# whose run status record (see run_cooja.py) shows a complete run with unchanged inputs are skipped.
+#
+# Usage: ./scheduler.py <queue file> [<num jobs>]
+#
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_cooja.py")
+
+JOURNAL_SUFFIX = ".journal"
+
+# the output of run_cooja.py, in the simulation directory
+JOB_OUTPUT_FILENAME = "run_cooja.out"
+
+# start the jobs expected to take the longest first, to reduce the makespan of the sweep;
+# otherwise, the jobs are started in the order of the queue file
+LONGEST_FIRST = True
+
+# start again the directories that already have a complete run
+RERUN_DONE = False
+
+# follow the logs while the simulations run, and abort the hopeless ones (see livestats.py)
+LIVE_ANALYSIS = False
+
+###########################################
+
+def load_queue(queue_filename):
+    with open(queue_filename, "r") as f:
+        directories = [line.strip() for line in f]
+    # drop duplicates, but keep the order
+    return list(dict.fromkeys(d for d in directories if d and not d.startswith("#")))
+
+###########################################
+
+def load_journal(journal_filename):
+    records = []
+    try:
+        with open(journal_filename, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # a partial last line, if the scheduler was killed while writing it
+                    pass
+    except IOError:
+        pass
+    return records
+
+###########################################
+
+def append_journal(journal, record):
+    journal.write(json.dumps(record) + "\n")
+    journal.flush()
+
+###########################################
+
+# the relative cost of a simulation, when it has never been run before:
+# the time of Cooja is dominated by the radio medium, i.e. it grows
+# with the number of motes and the number of neighbors of each
+def estimate_cost(dirname):
+    try:
+        with open(os.path.join(dirname, "sim.csc"), "r") as f:
+            num_motes = f.read().count("<mote>")
+    except IOError:
+        num_motes = 1
+    m = runcatalog.RUN_NAME_RE.match(os.path.basename(os.path.normpath(dirname)))
+    num_neighbors = int(m.group(1)) if m else 1
+    return max(1, num_motes) * (num_neighbors + 1)
+
+###########################################
+
+# the expected duration of each directory, in seconds:
+# the duration of its last successful run if known, otherwise the cost estimate
+# scaled by the median seconds per unit of cost of the known runs
+def expected_durations(directories, records):
+    durations = {}
+    for r in records:
+        if r.get("event") == "end" and r.get("exit") == 0:
+            durations[r["dir"]] = r["duration"]
+
+    ratios = sorted(durations[d] / estimate_cost(d) for d in durations)
+    seconds_per_cost = ratios[len(ratios) // 2] if ratios else 1.0
+
+    return {d : durations.get(d, estimate_cost(d) * seconds_per_cost) for d in directories}
+
+###########################################
+
+def start_job(dirname):
+    out = open(os.path.join(dirname, JOB_OUTPUT_FILENAME), "w")
+    try:
+        proc = subprocess.Popen([sys.executable, RUNNER, dirname] + (["--live"] if LIVE_ANALYSIS else []),
+                                stdout=out, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    finally:
+        # the child has its own copy
+        out.close()
+    return proc
+
+###########################################
+
+def run_queue(queue_filename, num_jobs):
+    directories = load_queue(queue_filename)
+    journal_filename = queue_filename + JOURNAL_SUFFIX
+    records = load_journal(journal_filename)
+
+    done = set()
+    if not RERUN_DONE:
+        # the status records of run_cooja.py: a successful run with unchanged inputs
+        done = {d for d in directories if run_cooja.is_complete(d)}
+    pending = [d for d in directories if d not in done]
+
+    expected = expected_durations(pending, records)
+    if LONGEST_FIRST:
+        # stable, so equal estimates keep the order of the queue file
+        pending.sort(key=lambda d: -expected[d])
+
+    print("{} directories in the queue, {} already done, {} to run with {} jobs".format(
+        len(directories), len(directories) - len(pending), len(pending), num_jobs))
+    if any(r.get("event") == "end" and r.get("exit") == 0 for r in records):
+        # the estimates are in seconds only if calibrated by earlier runs
+        print("  ~{:.0f} job-seconds expected".format(sum(expected.values())))
+
+    running = {} # pid -> (directory, process, start time)
+    num_failed = 0
+    sweep_start = time.time()
+    pending.reverse() # pop() from the end
+
+    with open(journal_filename, "a") as journal:
+        try:
+            while pending or running:
+                while pending and len(running) < num_jobs:
+                    dirname = pending.pop()
+                    proc = start_job(dirname)
+                    running[proc.pid] = (dirname, proc, time.time())
+                    append_journal(journal, {"event" : "start", "dir" : dirname, "time" : time.time(),
+                                             "pid" : proc.pid, "expected" : expected[dirname]})
+                    print("  started {} (pid {})".format(dirname, proc.pid))
+
+                # block until any of the jobs finishes
+                pid, status = os.waitpid(-1, 0)
+                if pid not in running:
+                    continue
+                dirname, proc, start = running.pop(pid)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                end = time.time()
+                append_journal(journal, {"event" : "end", "dir" : dirname, "time" : end,
+                                         "duration" : end - start, "exit" : proc.returncode})
+                if proc.returncode != 0:
+                    num_failed += 1
+                print("  {} {} in {:.0f} seconds, {} running, {} left".format(
+                    "finished" if proc.returncode == 0 else "FAILED (exit {})".format(proc.returncode),
+                    dirname, end - start, len(running), len(pending)))
+
+        except KeyboardInterrupt:
+            # do not leave orphan Cooja instances behind
+            for dirname, proc, start in running.values():
+                proc.send_signal(signal.SIGTERM)
+            for dirname, proc, start in running.values():
+                proc.wait()
+                append_journal(journal, {"event" : "end", "dir" : dirname, "time" : time.time(),
+                                         "duration" : time.time() - start, "exit" : proc.returncode})
+            raise
+
+    print("makespan {:.0f} seconds, {} failed".format(time.time() - sweep_start, num_failed))
+    return num_failed == 0
+
+###########################################
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: {} <queue file> [<num jobs>]".format(sys.argv[0]))
+        sys.exit(2)
+    queue_filename = sys.argv[1]
+    num_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+    if not run_queue(queue_filename, max(1, num_jobs)):
+        sys.exit(1)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
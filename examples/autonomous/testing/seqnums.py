@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+
+import numpy as np
+
+#
+# Compact accounting of the received sequence numbers.
+#
+# Only the seqnums in the range [first, last] are accounted for,
+# so a node needs one bit per packet expected in the analysis window.
+#
+
+###########################################
+
+class SeqnumBitmap:
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+        self.bits = bytearray((max(0, last - first + 1) + 7) // 8)
+        # cached number of set bits
+        self.count = 0
+
+    @classmethod
+    def from_row(cls, first, last, row, count=None):
+        # from a row of a receipt matrix; the number of receipts if already counted
+        bitmap = cls(first, last)
+        bitmap.bits = bytearray(np.packbits(row, bitorder="little").tobytes())
+        bitmap.count = count
+        return bitmap
+
+    def add(self, sn):
+        i = sn - self.first
+        if 0 <= i <= self.last - self.first:
+            self.bits[i >> 3] |= 1 << (i & 7)
+            self.count = None
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+    def __contains__(self, sn):
+        i = sn - self.first
+        if not (0 <= i <= self.last - self.first):
+            return False
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def __len__(self):
+        if self.count is None:
+            self.count = int(np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8)).sum())
+        return self.count
+
+    def __iter__(self):
+        row = np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8), bitorder="little")
+        return iter((np.flatnonzero(row) + self.first).tolist())
+
+    def __repr__(self):
+        return "{" + ", ".join(str(sn) for sn in self) + "}"
+
+###########################################
+
+def receipt_matrix(num_nodes, first, last, from_nodes, sns):
+    # one row per node, one column per seqnum in [first, last]
+    received = np.zeros((num_nodes, max(0, last - first + 1)), dtype=bool)
+    valid = (first <= sns) & (sns <= last) & (0 <= from_nodes) & (from_nodes < num_nodes)
+    received[from_nodes[valid], sns[valid] - first] = True
+    return received
+
+###########################################
+
+def count_received(received):
+    # the number of received seqnums of all nodes in a single reduction
+    return received.sum(axis=1)
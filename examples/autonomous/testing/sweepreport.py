@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+import sys
+import multiprocessing
+
+import runcatalog
+import run_cooja
+
+#
+# Resource report of a simulation sweep.
+#
+# run_cooja.py stores the wall time, the CPU time, the peak RSS and the log size of each Cooja execution
+# in the status record of the run. This aggregates the records by algorithm, slotframe size and
+# number of neighbors, to show which parts of the grid in parameters.py cost the most,
+# and predicts the duration of the runs that are not complete yet from the measured ones.
+#
+# Usage: ./sweepreport.py [<simulations directory> [<num jobs>]]
+#
+
+###########################################
+
+class Totals:
+    def __init__(self):
+        self.num_runs = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.max_rss_kb = 0
+        self.log_bytes = 0
+        self.log_lines = 0
+
+    def add(self, r):
+        self.num_runs += 1
+        self.wall += r["wall_seconds"]
+        self.cpu += (r["user_seconds"] or 0.0) + (r["sys_seconds"] or 0.0)
+        self.max_rss_kb = max(self.max_rss_kb, r["max_rss_kb"] or 0)
+        self.log_bytes += r["log_bytes"]
+        self.log_lines += r["log_lines"]
+
+    def mean_wall(self):
+        return self.wall / self.num_runs
+
+###########################################
+
+def load_records(catalog):
+    # (run, resource record) of the runs with a measured execution
+    records = []
+    for run in catalog.runs:
+        status = run_cooja.load_status(run.path)
+        if status is not None and status.get("resources") is not None:
+            records.append((run, status["resources"]))
+    return records
+
+###########################################
+
+def aggregate(records, key):
+    groups = {}
+    for run, r in records:
+        groups.setdefault(key(run), Totals()).add(r)
+    return groups
+
+###########################################
+
+def print_groups(title, groups, total_cpu):
+    print("")
+    print("{:<30} {:>5} {:>9} {:>9} {:>6} {:>8} {:>9} {:>11} {:>6}".format(
+        title, "runs", "wall (s)", "CPU (s)", "cores", "RSS (MB)", "log (MB)", "log lines", "CPU %"))
+    # the most expensive first
+    for key, t in sorted(groups.items(), key=lambda u: -u[1].cpu):
+        print("{:<30} {:>5} {:>9.0f} {:>9.0f} {:>6.2f} {:>8.0f} {:>9.1f} {:>11.0f} {:>6.1f}".format(
+            " ".join(str(u) for u in key), t.num_runs, t.mean_wall(), t.cpu / t.num_runs,
+            t.cpu / t.wall if t.wall else 0.0, t.max_rss_kb / 1024.0,
+            t.log_bytes / t.num_runs / 1e6, t.log_lines / t.num_runs,
+            100.0 * t.cpu / total_cpu if total_cpu else 0.0))
+
+###########################################
+
+# the expected wall time of a run: the mean of the measured runs of its grid cell,
+# otherwise of the runs with the same number of neighbors (the cost of the radio medium
+# dominates), otherwise of all runs
+def estimate_wall(run, by_cell, by_nn, overall):
+    for groups, key in ((by_cell, (run.algorithm, run.sf, run.nn)), (by_nn, (run.nn,))):
+        if key in groups:
+            return groups[key].mean_wall()
+    return overall.mean_wall()
+
+###########################################
+
+def predict(catalog, records, num_jobs):
+    overall = Totals()
+    for run, r in records:
+        overall.add(r)
+    by_cell = aggregate(records, lambda run: (run.algorithm, run.sf, run.nn))
+    by_nn = aggregate(records, lambda run: (run.nn,))
+
+    pending = [run for run in catalog.runs if not run_cooja.is_complete(run.path)]
+    print("")
+    print("{} runs, {} complete, {} to run".format(
+        len(catalog.runs), len(catalog.runs) - len(pending), len(pending)))
+    if not pending:
+        return
+    estimates = [estimate_wall(run, by_cell, by_nn, overall) for run in pending]
+    job_seconds = sum(estimates)
+    # the jobs are started longest first (see scheduler.py), so this is close to the makespan
+    makespan = max(job_seconds / num_jobs, max(estimates))
+    cores = overall.cpu / overall.wall if overall.wall else 1.0
+    print("  ~{:.1f} job-hours, ~{:.1f} CPU-hours; ~{:.1f} hours with {} jobs ({:.1f} cores busy)".format(
+        job_seconds / 3600.0, job_seconds * cores / 3600.0, makespan / 3600.0, num_jobs, num_jobs * cores))
+
+###########################################
+
+def main():
+    data_directory = sys.argv[1] if len(sys.argv) > 1 else "../simulations"
+    num_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+
+    catalog = runcatalog.RunCatalog(data_directory)
+    # the grid cells; the runs outside of the standard layout are only in the totals
+    records = load_records(catalog)
+    grid_records = [(run, r) for run, r in records if run.algorithm is not None]
+    print("{}: {} runs, {} with resource records".format(data_directory, len(catalog.runs), len(records)))
+    if not records:
+        return
+
+    total_cpu = sum(t.cpu for t in aggregate(records, lambda run: ()).values())
+    print_groups("algorithm", aggregate(grid_records, lambda run: (run.algorithm,)), total_cpu)
+    print_groups("slotframe size", aggregate(grid_records, lambda run: (run.sf,)), total_cpu)
+    print_groups("neighbors", aggregate(grid_records, lambda run: (run.nn,)), total_cpu)
+    print_groups("algorithm sf neighbors",
+                 aggregate(grid_records, lambda run: (run.algorithm, run.sf, run.nn)), total_cpu)
+
+    predict(catalog, records, max(1, num_jobs))
+
+###########################################
+
+if __name__ == '__main__':
+    main()
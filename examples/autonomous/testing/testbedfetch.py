@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import gzip
+import shlex
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import subprocess
+from multiprocessing.pool import ThreadPool
+
+import logfile
+
+#
+# Retrieval of the testbed logs.
+#
+# All missing files are listed up front and grouped by remote directory. All commands go over one
+# SSH connection: an OpenSSH control master is started once and the other sessions are multiplexed
+# over it, so there is one authentication instead of five connections per file. For each directory,
+# the checksums of the wanted files are read, and then the files are streamed as a single tar.gz
+# archive and unpacked on the fly; nothing is written on the testbed host. Each local copy is checked
+# against its remote checksum before it is moved into place. Up to MAX_CONCURRENT directories
+# are fetched at the same time.
+#
+# RemoteLog streams a single log instead, to be parsed as it arrives (see logreader.py) without
+# a local copy, or with a compressed one (see logfile.CompressedTee). It is gzip-compressed
+# on the testbed host for the transfer.
+#
+# LocalTransport runs the same commands in a local directory instead of on the testbed host,
+# as a stand-in for testing.
+#
+# Usage: ./testbedfetch.py <host>|--local=<directory> <local dir> <remote dir> <file>...
+#
+
+MAX_CONCURRENT = 4
+
+SSH_OPTIONS = ["-o", "BatchMode=yes", "-o", "ServerAliveInterval=30"]
+
+BLOCK_SIZE = 1024 * 1024
+
+###########################################
+
+class SshTransport:
+    # the sessions share the connection of a control master
+    def __init__(self, host):
+        self.host = host
+        self.control_directory = tempfile.mkdtemp(prefix="testbedfetch-")
+        self.control_path = os.path.join(self.control_directory, "master")
+
+    def open(self):
+        # -f: in the background once authenticated
+        subprocess.check_call(["ssh", "-M", "-S", self.control_path, "-o", "ControlPersist=yes",
+                               "-f", "-N"] + SSH_OPTIONS + [self.host])
+
+    def run(self, command):
+        return subprocess.Popen(["ssh", "-S", self.control_path, "-o", "ControlMaster=no"]
+                                + SSH_OPTIONS + [self.host, command],
+                                stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+
+    def close(self):
+        subprocess.call(["ssh", "-S", self.control_path, "-O", "exit", self.host],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.control_directory, ignore_errors=True)
+
+###########################################
+
+class LocalTransport:
+    # runs the commands in a local directory, which stands in for the home directory on the testbed host
+    def __init__(self, root):
+        self.root = root
+
+    def open(self):
+        pass
+
+    def run(self, command):
+        return subprocess.Popen(["sh", "-c", command], cwd=self.root,
+                                stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+
+    def close(self):
+        pass
+
+###########################################
+
+def remote_checksums(transport, remote_dir, filenames):
+    # filename -> SHA-1 of the files that exist on the remote side
+    command = "cd {} && sha1sum -- {} 2>/dev/null; true".format(
+        shlex.quote(remote_dir), " ".join(shlex.quote(f) for f in filenames))
+    proc = transport.run(command)
+    output = proc.stdout.read().decode("utf-8", "replace")
+    proc.stdout.close()
+    proc.wait()
+    checksums = {}
+    for line in output.splitlines():
+        fields = line.split(None, 1)
+        if len(fields) == 2:
+            # sha1sum marks the names that it had to escape with a leading "*" in binary mode
+            checksums[fields[1].lstrip("*")] = fields[0]
+    return checksums
+
+###########################################
+
+def fetch_directory(transport, local_dir, remote_dir, filenames):
+    # returns (fetched files, bytes, failed files)
+    checksums = remote_checksums(transport, remote_dir, filenames)
+    failed = [f for f in filenames if f not in checksums]
+    if not checksums:
+        return [], 0, failed
+
+    os.makedirs(local_dir, exist_ok=True)
+    command = "cd {} && tar -czf - -- {}".format(
+        shlex.quote(remote_dir), " ".join(shlex.quote(f) for f in sorted(checksums)))
+    proc = transport.run(command)
+    fetched = []
+    num_bytes = 0
+    try:
+        # "r|gz": a stream, the archive is never stored
+        with tarfile.open(fileobj=proc.stdout, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile() or member.name not in checksums:
+                    continue
+                local_file = os.path.join(local_dir, member.name)
+                tmpfilename = "{}.{}.tmp".format(local_file, os.getpid())
+                h = hashlib.sha1()
+                src = archive.extractfile(member)
+                with open(tmpfilename, "wb") as f:
+                    for block in iter(lambda: src.read(BLOCK_SIZE), b""):
+                        h.update(block)
+                        f.write(block)
+                if h.hexdigest() != checksums[member.name]:
+                    print("  checksum mismatch: " + local_file)
+                    os.remove(tmpfilename)
+                    continue
+                # only complete and verified files get the final name
+                os.replace(tmpfilename, local_file)
+                fetched.append(member.name)
+                num_bytes += member.size
+    except (tarfile.TarError, EOFError) as e:
+        print("  failed to read the archive of {}: {}".format(remote_dir, e))
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+    failed += [f for f in checksums if f not in fetched]
+    return fetched, num_bytes, failed
+
+###########################################
+
+def connect(transport):
+    try:
+        transport.open()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("failed to connect: {}".format(e))
+        transport.close()
+        return False
+    return True
+
+###########################################
+
+def fetch_missing(transport, wanted):
+    # wanted: list of (local dir, remote dir, filename); returns the list of the files that failed
+    groups = {}
+    for local_dir, remote_dir, filename in wanted:
+        # the local copy may have been compressed
+        if not os.access(logfile.find_log(os.path.join(local_dir, filename)), os.R_OK):
+            groups.setdefault((local_dir, remote_dir), []).append(filename)
+    if not groups:
+        return []
+
+    print("fetching {} files from {} directories...".format(sum(len(v) for v in groups.values()), len(groups)))
+    start = time.time()
+    if not connect(transport):
+        return [os.path.join(local_dir, f) for (local_dir, remote_dir), filenames in groups.items() for f in filenames]
+    try:
+        with ThreadPool(min(MAX_CONCURRENT, len(groups))) as pool:
+            results = pool.starmap(fetch_directory, [(transport, local_dir, remote_dir, filenames)
+                                                     for (local_dir, remote_dir), filenames in groups.items()])
+    finally:
+        transport.close()
+
+    failed = []
+    num_files = 0
+    num_bytes = 0
+    for ((local_dir, remote_dir), filenames), (fetched, b, f) in zip(groups.items(), results):
+        num_files += len(fetched)
+        num_bytes += b
+        failed += [os.path.join(local_dir, u) for u in f]
+    print("fetched {} files ({:.1f} MB) in {:.1f} seconds, {} failed".format(
+        num_files, num_bytes / 1e6, time.time() - start, len(failed)))
+    for filename in failed:
+        print("  failed: " + filename)
+    return failed
+
+###########################################
+
+class RemoteLog:
+    # a binary stream of a remote log; the caller closes it.
+    # quiet: no error message from the remote side, e.g. when probing for a file that may not exist
+    def __init__(self, transport, remote_dir, filename, quiet=False):
+        self.name = "{}/{}".format(remote_dir, filename)
+        if filename.endswith(logfile.GZIP_SUFFIX):
+            command = "cd {} && cat -- {}"
+        else:
+            command = "cd {} && gzip -c -1 -- {}"
+        if quiet:
+            command = "({}) 2>/dev/null".format(command)
+        self.proc = transport.run(command.format(shlex.quote(remote_dir), shlex.quote(filename)))
+        # decompressed as it arrives
+        self.f = gzip.GzipFile(fileobj=self.proc.stdout, mode="rb")
+        # of the log, i.e. after the decompression
+        self.num_bytes = 0
+        self.at_eof = False
+
+    def __iter__(self):
+        for line in self.f:
+            self.num_bytes += len(line)
+            yield line
+        self.at_eof = True
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.num_bytes += len(data)
+        if size is None or size < 0 or (size > 0 and not data):
+            self.at_eof = True
+        return data
+
+    def close(self):
+        # returns False if the remote command failed, e.g. if the log does not exist
+        try:
+            self.f.close()
+        finally:
+            if self.at_eof:
+                # the remote command may still be exiting; its status tells whether the log was complete
+                self.proc.stdout.close()
+                ok = self.proc.wait() == 0
+            else:
+                # the reader stopped early and does not need the rest
+                self.proc.terminate()
+                self.proc.stdout.close()
+                self.proc.wait()
+                ok = True
+        return ok
+
+###########################################
+
+def main():
+    if len(sys.argv) < 5:
+        print("usage: {} <host>|--local=<directory> <local dir> <remote dir> <file>...".format(sys.argv[0]))
+        sys.exit(2)
+    if sys.argv[1].startswith("--local="):
+        transport = LocalTransport(sys.argv[1][len("--local="):])
+    else:
+        transport = SshTransport(sys.argv[1])
+    local_dir, remote_dir = sys.argv[2], sys.argv[3]
+    failed = fetch_missing(transport, [(local_dir, remote_dir, f) for f in sys.argv[4:]])
+    sys.exit(1 if failed else 0)
+
+###########################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import importlib.util
+
+import matplotlib
+import matplotlib.style
+import pytest
+
+import synthlogs
+
+#
+# The scripts of the parent directory import each other by their module names,
+# and analyze-testbed.py is loaded from its file name.
+#
+
+TESTING_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TESTING_DIRECTORY)
+
+matplotlib.use("Agg")
+# the style that the analyzers use was renamed in matplotlib 3.6
+if "seaborn" not in matplotlib.style.library and "seaborn-v0_8" in matplotlib.style.library:
+    matplotlib.style.library["seaborn"] = matplotlib.style.library["seaborn-v0_8"]
+
+###########################################
+
+@pytest.fixture(scope="session")
+def analyze_testbed():
+    spec = importlib.util.spec_from_file_location("analyze_testbed",
+                                                  os.path.join(TESTING_DIRECTORY, "analyze-testbed.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+###########################################
+
+@pytest.fixture
+def cooja_log(tmp_path):
+    return synthlogs.write_log(str(tmp_path / "COOJA.testlog"), synthlogs.cooja_lines())
+
+###########################################
+
+@pytest.fixture
+def testbed_log(tmp_path):
+    return synthlogs.write_log(str(tmp_path / "sparse-test.log"), synthlogs.testbed_lines())
@@ -0,0 +1,105 @@
+import random
+
+#
+# Synthetic Cooja and IoT-LAB logs for the tests.
+#
+# A small network in which every node associates (one of them twice, one of them after the start
+# of the analysis window), sends a packet every send interval and reports its link statistics and
+# Energest every minute. The root receives most of the packets, some of them twice, a few of them
+# only after the end of the window, and keeps receiving after it, also from a node that is not in the log.
+# Queue drops happen everywhere.
+#
+
+START_TS_UNIX = 1570531244.0
+
+SIM_ROOT = 1
+SIM_NODES = [1, 2, 3, 4, 5, 6]
+
+TESTBED_ROOT = 177
+TESTBED_NODES = [4, 11, 20, 41, 177, 193]
+
+# the packets are sent from this minute on, also before the analysis window
+FIRST_SEND_MINUTES = 20
+DURATION_MINUTES = 64
+
+###########################################
+
+def node_address(node_id):
+    return "fd00::2{0:02x}:{0:x}:{0:x}:{0:x}".format(node_id)
+
+###########################################
+
+def events(nodes, root, send_interval, seed, node_ids=None):
+    # (seconds, node, text), in no particular order
+    rng = random.Random(seed)
+    node_ids = node_ids or {n : n for n in nodes}
+    r = []
+    for i, n in enumerate(nodes):
+        # the first line of each node, in the order of the node numbers
+        r.append((0.001 * (i + 1), n, "[INFO: Main      ] Starting Contiki-NG"))
+        r.append((0.5 + 0.001 * i, n, "[INFO: Main      ] Node ID: {}".format(node_ids[n])))
+        if n == root:
+            r.append((1.0, n, "[INFO: TSCH      ] association done (1, 0)"))
+            continue
+        assoc_seconds = 60 * (i + 1) + rng.uniform(0, 30)
+        r.append((assoc_seconds, n, "[INFO: TSCH      ] association done (1, 4)"))
+        if i == 1:
+            # associates again, which resets its seqnums
+            r.append((assoc_seconds + 300, n, "[INFO: TSCH      ] association done (1, 4)"))
+        if i == len(nodes) - 1:
+            # associates only after the start of the window
+            r.append((31.5 * 60, n, "[INFO: TSCH      ] association done (1, 4)"))
+
+        seqnum = 1
+        t = FIRST_SEND_MINUTES * 60 + rng.uniform(0, send_interval)
+        while t < DURATION_MINUTES * 60:
+            r.append((t, n, "[INFO: App       ] seqnum={} to={}".format(seqnum, node_address(node_ids[root]))))
+            if rng.random() < 0.9:
+                # a few packets arrive after the end of the window plus the latency margin
+                delay = rng.uniform(0.05, 2.0) if rng.random() < 0.98 else rng.uniform(60, 120)
+                text = "[INFO: Node      ] seqnum={} from={}".format(seqnum, node_address(node_ids[n]))
+                r.append((t + delay, root, text))
+                if rng.random() < 0.03:
+                    r.append((t + delay + 0.5, root, text))
+            seqnum += 1
+            t += send_interval
+
+    # a few packets from a node that is not in the log, e.g. from another experiment
+    for minute in range(25, 40):
+        r.append((minute * 60 + 30.0, root, "[INFO: Node      ] seqnum={} from={}".format(minute, node_address(0xff))))
+
+    for n in nodes:
+        for minute in range(1, DURATION_MINUTES):
+            t = minute * 60 + 0.2 + 0.01 * nodes.index(n)
+            tx = rng.randint(5, 40)
+            r.append((t, n, "[INFO: Link Stats] num packets: tx={} ack={} rx={} to=0014.0014.0014.0014".format(
+                tx, rng.randint(0, tx), rng.randint(0, 40))))
+            r.append((t + 0.001, n, "[INFO: Energest  ] Radio total :    {:>7}/  60000000 (27 permil)".format(
+                rng.randint(100000, 3000000))))
+            if rng.random() < 0.3:
+                r.append((t + rng.uniform(1, 50), n, "[WARN: Queue     ] add packet failed"))
+            # not an event
+            r.append((t + 0.002, n, "[INFO: RPL       ] links: 6 routing links in total"))
+    return r
+
+###########################################
+
+def cooja_lines(send_interval=6, seed=1):
+    # "<microseconds> <node> <text>" lines, with monotonically increasing timestamps
+    r = sorted(events(SIM_NODES, SIM_ROOT, send_interval, seed), key=lambda e: e[0])
+    return ["{} {} {}\n".format(int(round(t * 1e6)), n, text) for t, n, text in r] + ["TEST OK\n"]
+
+###########################################
+
+def testbed_lines(send_interval=6, seed=1):
+    # "<Unix seconds>;m3-<node>;<text>" lines, as written by serial_aggregator
+    node_ids = {n : 0xa000 + n for n in TESTBED_NODES}
+    r = sorted(events(TESTBED_NODES, TESTBED_ROOT, send_interval, seed, node_ids), key=lambda e: e[0])
+    return ["{:.6f};m3-{};{}\n".format(START_TS_UNIX + t, n, text) for t, n, text in r]
+
+###########################################
+
+def write_log(filename, lines):
+    with open(filename, "w") as f:
+        f.writelines(lines)
+    return filename
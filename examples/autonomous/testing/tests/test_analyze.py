@@ -0,0 +1,95 @@
+import gzip
+import shutil
+
+import pytest
+
+import analyze
+import logfile
+import logparse
+import synthlogs
+import timeseries
+
+#
+# The vectorized process_events, and the mapped, compressed and streamed reads of a log,
+# must all give the results of process_file.
+#
+
+###########################################
+
+@pytest.mark.parametrize("experiment", ["exp-collection", "exp-query"])
+def test_process_events_cooja(cooja_log, experiment):
+    assert analyze.process_events(cooja_log, experiment, 6) == pytest.approx(
+        analyze.process_file(cooja_log, experiment, 6))
+
+###########################################
+
+def test_process_events_testbed(testbed_log):
+    assert analyze.process_events(testbed_log, "exp-collection", 6, True) == pytest.approx(
+        analyze.process_file(testbed_log, "exp-collection", 6, True))
+
+###########################################
+
+@pytest.mark.parametrize("is_testbed", [False, True])
+def test_compressed_and_streamed_logs(tmp_path, is_testbed):
+    lines = synthlogs.testbed_lines() if is_testbed else synthlogs.cooja_lines()
+    filename = synthlogs.write_log(str(tmp_path / "test.log"), lines)
+    expected = analyze.process_file(filename, "exp-collection", 6, is_testbed)
+
+    # a stream that the reader does not own
+    with open(filename, "rb") as f:
+        assert analyze.process_file(f, "exp-collection", 6, is_testbed) == expected
+
+    shutil.copyfile(filename, filename + ".copy")
+    compressed = logfile.compress(filename + ".copy", "gzip")
+    assert logfile.find_log(filename + ".copy") == compressed
+    assert analyze.process_file(compressed, "exp-collection", 6, is_testbed) == expected
+
+###########################################
+
+def test_testbed_compressed_and_streamed_logs(testbed_log, analyze_testbed):
+    expected = analyze_testbed.process_file(testbed_log, "exp-collection", 6, True)
+    with open(testbed_log, "rb") as f:
+        assert analyze_testbed.process_file(f, "exp-collection", 6, True) == expected
+    # the tee gets a complete copy, although the parsing stops at the end of the window
+    tee = logfile.CompressedTee(testbed_log + ".tee")
+    with open(testbed_log, "rb") as f:
+        assert analyze_testbed.process_file(f, "exp-collection", 6, True, tee) == expected
+    with gzip.open(tee.commit(), "rb") as f, open(testbed_log, "rb") as original:
+        assert f.read() == original.read()
+
+###########################################
+
+def test_series_does_not_change_the_results(cooja_log):
+    series = timeseries.TimeSeries()
+    assert analyze.process_file(cooja_log, "exp-collection", 6, False, series) == \
+        analyze.process_file(cooja_log, "exp-collection", 6)
+
+###########################################
+
+def test_tokenize():
+    lines = [
+        "314937392 1 [INFO: Node      ] seqnum=6 from=fd00::205:5:5:5\n",
+        "600142000 28 [INFO: Link Stats] num packets: tx=3 ack=2 rx=1 to=0014.0014.0014.0014\n",
+        "600073000 8 [INFO: Energest  ] Radio total :    1669748/  60000000 (27 permil)\n",
+        "600074000 8 [INFO: TSCH      ] association done (1, 4)\n",
+        "600075000 8 [WARN: Queue     ] add packet failed\n",
+        "600076000 8 [INFO: RPL       ] no event\n",
+        "not a log line\n",
+    ]
+    assert list(logparse.tokenize(lines)) == [
+        (logparse.EV_NODE, 314937, 1, ()),
+        (logparse.EV_SEQNUM, 314937, 1, (6, "from", 5)),
+        (logparse.EV_NODE, 600142, 28, ()),
+        (logparse.EV_LINK_STATS, 600142, 28, (3, 2, 1)),
+        (logparse.EV_NODE, 600073, 8, ()),
+        (logparse.EV_ENERGEST, 600073, 8, (1669748, 60000000)),
+        (logparse.EV_ASSOC, 600074, 8, ()),
+        (logparse.EV_QUEUE_DROP, 600075, 8, ()),
+    ]
+    testbed = ["1570531244.735377;m3-197;[INFO: Main      ] Node ID: 43378\n",
+               "1570531245.000000;m3-197;[INFO: App       ] seqnum=7 to=fd00::201:1:1:1\n"]
+    assert list(logparse.tokenize(testbed, True)) == [
+        (logparse.EV_NODE, 0, 197, ()),
+        (logparse.EV_NODE_ID, 0, 197, (43378,)),
+        (logparse.EV_SEQNUM, 264, 197, (7, "to", None)),
+    ]
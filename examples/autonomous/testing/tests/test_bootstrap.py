@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+import bootstrap
+
+#
+# The batched intervals of the mean must agree with those of scipy,
+# up to the variation of the resampling.
+#
+
+NUM_RESAMPLES = 20000
+
+###########################################
+
+@pytest.mark.parametrize("method", ["percentile", "bca"])
+def test_mean_agrees_with_scipy(method):
+    rng = np.random.default_rng(3)
+    groups = [rng.normal(90, 5, 10), rng.exponential(2.0, 25), rng.uniform(0, 100, 7)]
+    estimates, lower, upper = bootstrap.confidence_intervals(groups, "mean", method, 0.9, NUM_RESAMPLES, seed=1)
+    for g, e, lo, hi in zip(groups, estimates, lower, upper):
+        r = stats.bootstrap((g,), np.mean, confidence_level=0.9, method=method.replace("bca", "BCa"),
+                            n_resamples=NUM_RESAMPLES, random_state=np.random.default_rng(2))
+        width = r.confidence_interval.high - r.confidence_interval.low
+        assert e == pytest.approx(np.mean(g))
+        assert lo == pytest.approx(r.confidence_interval.low, abs=0.05 * width)
+        assert hi == pytest.approx(r.confidence_interval.high, abs=0.05 * width)
+
+###########################################
+
+def test_empty_and_constant_groups():
+    estimates, lower, upper = bootstrap.confidence_intervals([[], [5.0], [2.0, 2.0, 2.0]], "median", "bca", 0.9, 100)
+    assert np.isnan(estimates[0]) and np.isnan(lower[0]) and np.isnan(upper[0])
+    assert list(estimates[1:]) == [5.0, 2.0]
+    assert list(lower[1:]) == [5.0, 2.0]
+    assert list(upper[1:]) == [5.0, 2.0]
+
+###########################################
+
+@pytest.mark.parametrize("statistic", ["median", "upper_median"])
+def test_tied_median_is_inside_its_interval(statistic):
+    rng = np.random.default_rng(4)
+    groups = [np.minimum(100.0, rng.normal(99, 2, 10)) for _ in range(200)]
+    estimates, lower, upper = bootstrap.confidence_intervals(groups, statistic, "bca", 0.9, 2000, seed=5)
+    assert np.all((lower <= estimates) & (estimates <= upper))
+
+###########################################
+
+def test_upper_median_as_the_analyzers():
+    rng = np.random.default_rng(6)
+    groups = [rng.normal(90, 5, n) for n in (1, 2, 9, 10)] + [[]]
+    estimates, lower, upper = bootstrap.confidence_intervals(groups, "upper_median", "bca", 0.9, 2000, seed=7)
+    assert list(estimates[:-1]) == [sorted(g)[len(g) // 2] for g in groups[:-1]]
+    assert np.isnan(estimates[-1])
+    assert np.all((lower[:-1] <= estimates[:-1]) & (estimates[:-1] <= upper[:-1]))
@@ -0,0 +1,59 @@
+import pytest
+
+import analyze
+import livestats
+import synthlogs
+
+#
+# LiveStats is fed the log a few lines at a time, as while it is being written.
+# Once the whole log has been seen, it must give the results of process_file.
+#
+
+BATCH_LINES = 37
+
+###########################################
+
+def live_status(lines, experiment, send_interval, is_testbed):
+    stats = livestats.LiveStats(experiment, send_interval, is_testbed)
+    for i in range(0, len(lines), BATCH_LINES):
+        stats.feed(lines[i:i + BATCH_LINES])
+    return stats.status()
+
+###########################################
+
+def live_results(status):
+    # as the results of process_file: one tuple per non-root node, in the order of the node numbers
+    return [(m["pdr"], m["prr"], m["rdc"], m["queue_losses"])
+            for _, m in sorted(status["nodes"].items(), key=lambda u: int(u[0]))]
+
+###########################################
+
+@pytest.mark.parametrize("experiment", ["exp-collection", "exp-query"])
+@pytest.mark.parametrize("send_interval", [6, 30])
+def test_cooja_same_as_process_file(tmp_path, experiment, send_interval):
+    lines = synthlogs.cooja_lines(send_interval)
+    filename = synthlogs.write_log(str(tmp_path / "COOJA.testlog"), lines)
+    expected = analyze.process_file(filename, experiment, send_interval)
+    status = live_status(lines, experiment, send_interval, False)
+    assert len(expected) == len(synthlogs.SIM_NODES) - 1
+    assert live_results(status) == pytest.approx(expected)
+
+###########################################
+
+@pytest.mark.parametrize("send_interval", [6, 30])
+def test_testbed_same_as_process_file(tmp_path, analyze_testbed, send_interval):
+    lines = synthlogs.testbed_lines(send_interval)
+    filename = synthlogs.write_log(str(tmp_path / "sparse-test.log"), lines)
+    expected, root_queue_losses = analyze_testbed.process_file(filename, "exp-collection", send_interval, True)
+    status = live_status(lines, "exp-collection", send_interval, True)
+    assert len(expected) == len(synthlogs.TESTBED_NODES) - 1
+    assert live_results(status) == pytest.approx(expected)
+    assert status["root_queue_losses"] == root_queue_losses
+
+###########################################
+
+def test_same_window_as_the_analyzers(analyze_testbed):
+    assert (livestats.START_TIME_MINUTES, livestats.END_TIME_MINUTES, livestats.LATENCY_MARGIN_SECONDS) \
+        == (analyze.START_TIME_MINUTES, analyze.END_TIME_MINUTES, analyze.LATENCY_MARGIN_SECONDS)
+    assert livestats.TESTBED_END_TIME_MINUTES == analyze_testbed.END_TIME_MINUTES
+    assert (livestats.ROOT_ID_SIM, livestats.ROOT_ID_TESTBED) == (analyze.ROOT_ID_SIM, analyze_testbed.ROOT_ID_TESTBED)
@@ -0,0 +1,30 @@
+import os
+
+import runcatalog
+
+###########################################
+
+def make_run(root, relpath, log=True):
+    os.makedirs(os.path.join(root, relpath))
+    with open(os.path.join(root, relpath, runcatalog.LOG_FILENAME if log else runcatalog.SIM_FILENAME), "w") as f:
+        f.write("TEST OK\n")
+
+###########################################
+
+def test_glob_matches_each_component(tmp_path):
+    root = str(tmp_path)
+    make_run(root, "orchestra_sb/si_6/sf_7/exp-collection/sim-4-neigh-realsim-1")
+    make_run(root, "orchestra_sb/si_6/sf_7/exp-query/sim-4-neigh-realsim-1", log=False)
+    # deeper than the standard layout
+    make_run(root, "orchestra_sb/si_6/sf_7/old/exp-collection/sim-4-neigh-realsim-1")
+    catalog = runcatalog.RunCatalog(root)
+
+    assert [run.relpath for run in catalog.glob("orchestra_sb/*/sf_7/*/*")] == [
+        "orchestra_sb/si_6/sf_7/exp-collection/sim-4-neigh-realsim-1",
+        "orchestra_sb/si_6/sf_7/exp-query/sim-4-neigh-realsim-1",
+    ]
+    assert [run.relpath for run in catalog.glob("orchestra_sb/*/sf_7/*/*/*")] == [
+        "orchestra_sb/si_6/sf_7/old/exp-collection/sim-4-neigh-realsim-1",
+    ]
+    assert catalog.glob("orchestra_sb/*") == []
+    assert [run.has_log for run in catalog.find("orchestra_sb", 6, 7, "exp-query", 4)] == [False]
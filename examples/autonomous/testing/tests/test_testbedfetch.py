@@ -0,0 +1,101 @@
+import os
+import gzip
+
+import pytest
+
+import campaignmanifest
+import synthlogs
+import testbedfetch
+
+#
+# The fetching and streaming of the testbed logs, with LocalTransport standing in for the testbed host.
+#
+
+REMOTE_DIR = "iot-lab-firmwares-test"
+
+###########################################
+
+@pytest.fixture
+def remote(tmp_path):
+    # the home directory on the "testbed host", with one log
+    home = tmp_path / "home"
+    (home / REMOTE_DIR).mkdir(parents=True)
+    synthlogs.write_log(str(home / REMOTE_DIR / "sparse-test.log"), synthlogs.testbed_lines())
+    return testbedfetch.LocalTransport(str(home))
+
+###########################################
+
+def test_fetch_missing(tmp_path, remote):
+    local = str(tmp_path / "local")
+    failed = testbedfetch.fetch_missing(remote, [(local, REMOTE_DIR, "sparse-test.log"),
+                                                 (local, REMOTE_DIR, "missing.log")])
+    assert failed == [os.path.join(local, "missing.log")]
+    assert os.listdir(local) == ["sparse-test.log"]
+    with open(os.path.join(local, "sparse-test.log")) as f:
+        assert f.readlines() == synthlogs.testbed_lines()
+    # nothing left to fetch
+    assert testbedfetch.fetch_missing(remote, [(local, REMOTE_DIR, "sparse-test.log")]) == []
+
+###########################################
+
+def test_remote_log(remote):
+    stream = testbedfetch.RemoteLog(remote, REMOTE_DIR, "sparse-test.log")
+    assert [line.decode() for line in stream] == synthlogs.testbed_lines()
+    assert stream.close()
+
+###########################################
+
+def test_remote_log_stopped_early(remote):
+    stream = testbedfetch.RemoteLog(remote, REMOTE_DIR, "sparse-test.log")
+    next(iter(stream))
+    assert stream.close()
+
+###########################################
+
+@pytest.mark.parametrize("attempt", range(10))
+def test_missing_remote_log(remote, attempt):
+    # the remote command may still be exiting when the reader sees the end of its output
+    stream = testbedfetch.RemoteLog(remote, REMOTE_DIR, "missing.log", quiet=True)
+    assert stream.read() == b""
+    assert not stream.close()
+
+###########################################
+
+def test_process_remote(tmp_path, remote, analyze_testbed):
+    local = str(tmp_path / "local")
+    os.makedirs(local)
+    expected = analyze_testbed.process_file(os.path.join(remote.root, REMOTE_DIR, "sparse-test.log"),
+                                            "exp-collection", 6, True)
+    result = analyze_testbed.process_remote(remote, local, REMOTE_DIR, "sparse-test.log", "sparse-test.log",
+                                            "exp-collection", 6)
+    assert result == expected
+    # the complete log is cached, compressed
+    assert os.listdir(local) == ["sparse-test.log.gz"]
+    with gzip.open(os.path.join(local, "sparse-test.log.gz"), "rt") as f:
+        assert f.readlines() == synthlogs.testbed_lines()
+
+###########################################
+
+@pytest.mark.parametrize("attempt", range(5))
+def test_process_missing_remote(tmp_path, remote, analyze_testbed, attempt):
+    local = str(tmp_path / "local")
+    os.makedirs(local)
+    assert analyze_testbed.process_remote(remote, local, REMOTE_DIR, "missing.log", "missing.log",
+                                          "exp-collection", 6) is None
+    # nothing is cached
+    assert os.listdir(local) == []
+
+###########################################
+
+def test_campaign_manifest(tmp_path, remote, analyze_testbed, capfd):
+    local = str(tmp_path / "local")
+    # no manifest: nothing is printed for the missing remote file
+    analyze_testbed.campaign_manifests.clear()
+    assert analyze_testbed.campaign_job(remote, local, REMOTE_DIR, "sparse-test.log") is None
+    assert capfd.readouterr().err == ""
+
+    analyze_testbed.campaign_manifests.clear()
+    campaignmanifest.store_manifest(os.path.join(remote.root, REMOTE_DIR), {},
+                                    [{"log" : "sparse-test.log", "state" : campaignmanifest.JOB_ABORTED}])
+    assert analyze_testbed.campaign_job(remote, local, REMOTE_DIR, "sparse-test.log")["state"] == \
+        campaignmanifest.JOB_ABORTED
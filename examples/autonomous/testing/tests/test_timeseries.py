@@ -0,0 +1,47 @@
+import json
+
+import analyze
+import resultcache
+import synthlogs
+import timeseries
+
+###########################################
+
+def test_json_round_trip_keeps_seen_seqnums():
+    series = timeseries.TimeSeries()
+    series.add_seqnum(2, 1000, 7)
+    reloaded = timeseries.TimeSeries.from_json(json.loads(json.dumps(series.to_json())))
+    # a duplicate after the reload is not counted again
+    reloaded.add_seqnum(2, 2000, 7)
+    reloaded.add_seqnum(2, 2000, 8)
+    assert reloaded.total(2, "delivered", 0, 1) == 2
+
+###########################################
+
+def test_testbed_seqnums_are_binned_per_mote(testbed_log):
+    series = timeseries.TimeSeries()
+    analyze.process_file(testbed_log, "exp-collection", 6, True, series)
+    # the node IDs in the addresses are mapped to the motes, as for the scalar metrics
+    assert set(node for node in series.seen_seqnums) == set(synthlogs.TESTBED_NODES) - {synthlogs.TESTBED_ROOT}
+
+###########################################
+
+def test_load_timeseries_is_cached(cooja_log):
+    r, series = analyze.load_timeseries(cooja_log, "exp-collection", 6)
+    assert r == analyze.process_file(cooja_log, "exp-collection", 6)
+    cached_r, cached_series = analyze.load_timeseries(cooja_log, "exp-collection", 6)
+    assert cached_r == r
+    assert cached_series.to_json() == series.to_json()
+
+###########################################
+
+def test_load_timeseries_reparses_an_old_entry(cooja_log):
+    r, series = analyze.load_timeseries(cooja_log, "exp-collection", 6)
+    # the bins as cached before seen_seqnums was stored, under the same key
+    old = series.to_json()
+    del old["seen_seqnums"]
+    key = analyze.cache_key(cooja_log, "exp-collection", 6, False)
+    resultcache.store(cooja_log, key, old, analyze.TIMESERIES_SUFFIX)
+    reloaded_r, reloaded_series = analyze.load_timeseries(cooja_log, "exp-collection", 6)
+    assert reloaded_r == r
+    assert reloaded_series.to_json() == series.to_json()
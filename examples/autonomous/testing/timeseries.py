@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+#
+# Per-node, per-minute bins of the raw counters in a log.
+#
+# The bins are filled in the same pass that computes the scalar metrics,
+# and are enough to compute the metrics of any window of whole minutes
+# without parsing the log again.
+#
+# Unlike the scalar metrics, the bins are not reset on re-association:
+# each seqnum is counted once, in the minute of its first reception.
+#
+
+COUNTERS = [
+    "delivered",
+    "tx",
+    "ack",
+    "radio_on",
+    "radio_total",
+    "queue_losses",
+]
+
+###########################################
+
+class TimeSeries:
+    def __init__(self):
+        # node -> counter -> list of per-minute values
+        self.bins = {}
+        # node -> the minutes of its associations
+        self.associations = {}
+        # node -> the seqnums received so far
+        self.seen_seqnums = {}
+
+    def _node_bins(self, node):
+        if node not in self.bins:
+            self.bins[node] = {counter : [] for counter in COUNTERS}
+        return self.bins[node]
+
+    def add(self, node, ts, counter, value=1):
+        values = self._node_bins(node)[counter]
+        minute = max(0, ts) // (60 * 1000)
+        if minute >= len(values):
+            values.extend([0] * (minute + 1 - len(values)))
+        values[minute] += value
+
+    def add_assoc(self, node, ts):
+        self._node_bins(node)
+        self.associations.setdefault(node, []).append(ts // (60 * 1000))
+
+    def add_seqnum(self, node, ts, sn):
+        seen = self.seen_seqnums.setdefault(node, set())
+        if sn not in seen:
+            seen.add(sn)
+            self.add(node, ts, "delivered")
+
+    def num_minutes(self):
+        return max([len(values) for counters in self.bins.values() for values in counters.values()] + [0])
+
+    def total(self, node, counter, start_minute, end_minute):
+        values = self.bins.get(node, {}).get(counter, [])
+        return sum(values[start_minute:end_minute])
+
+    # (pdr, prr, rdc, queue_losses) of a node in the window [start_minute, end_minute)
+    def window(self, node, start_minute, end_minute, send_interval):
+        expected = (end_minute - start_minute) * 60 // send_interval
+        delivered = self.total(node, "delivered", start_minute, end_minute)
+        tx = self.total(node, "tx", start_minute, end_minute)
+        ack = self.total(node, "ack", start_minute, end_minute)
+        radio_on = self.total(node, "radio_on", start_minute, end_minute)
+        radio_total = self.total(node, "radio_total", start_minute, end_minute)
+        pdr = 100.0 * delivered / expected if expected > 0 else 0.0
+        prr = 100.0 * ack / tx if tx else 0.0
+        rdc = 100.0 * radio_on / radio_total if radio_total else 0.0
+        return (pdr, prr, rdc, self.total(node, "queue_losses", start_minute, end_minute))
+
+    # per-minute (pdr, prr, rdc) averaged over all nodes except the root, e.g. for convergence plots
+    def network_series(self, send_interval, root_id, minutes_per_point=1):
+        nodes = [node for node in sorted(self.bins) if node != root_id]
+        r = []
+        for start in range(0, self.num_minutes(), minutes_per_point):
+            metrics = [self.window(node, start, start + minutes_per_point, send_interval) for node in nodes]
+            if metrics:
+                r.append(tuple(sum(m[i] for m in metrics) / len(metrics) for i in range(3)))
+            else:
+                r.append((0.0, 0.0, 0.0))
+        return r
+
+    def to_json(self):
+        return {
+            "bins" : {str(node) : counters for node, counters in self.bins.items()},
+            "associations" : {str(node) : minutes for node, minutes in self.associations.items()},
+            # so that a reloaded series still counts each seqnum once if it is extended
+            "seen_seqnums" : {str(node) : sorted(seen) for node, seen in self.seen_seqnums.items()},
+        }
+
+    @classmethod
+    def from_json(cls, d):
+        ts = cls()
+        ts.bins = {int(node) : counters for node, counters in d["bins"].items()}
+        ts.associations = {int(node) : minutes for node, minutes in d["associations"].items()}
+        ts.seen_seqnums = {int(node) : set(seen) for node, seen in d["seen_seqnums"].items()}
+        return ts
@@ -2,6 +2,8 @@
 
 import re
 import os
+import io
+import gzip
 import fileinput
 import math
 import yaml
@@ -103,6 +105,16 @@ def parseApp(log):
         return {'event': 'recv', 'type': type, 'id': id, 'src': src }
     return None
 
+# Logs may be stored compressed (.gz, or .zst with the zstandard module)
+def openLog(file):
+    if file.endswith('.gz'):
+        return gzip.open(file, 'rt', errors='replace')
+    if file.endswith('.zst'):
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'), closefd=True)
+        return io.TextIOWrapper(io.BufferedReader(reader), errors='replace')
+    return open(file, 'r')
+
 def parseLine(line):
     res = re.compile('\s*([.\d]+)\\tID:(\d+)\\t\[(.*?):(.*?)\](.*)$').match(line)
     if res:
@@ -131,9 +143,14 @@ def doParse(file):
     }
 
 #    print("\nProcessing %s" %(file))
+    compressed = file.endswith(('.gz', '.zst'))
     # Filter out non-printable chars from log file
-    os.system("cat %s | tr -dc '[:print:]\n\t' | sponge %s" %(file, file))
-    for line in open(file, 'r').readlines():
+    if not compressed:
+        os.system("cat %s | tr -dc '[:print:]\n\t' | sponge %s" %(file, file))
+    for line in openLog(file):
+        if compressed:
+            # A compressed log is not rewritten: filter while streaming
+            line = re.sub('[^\x20-\x7e\n\t]', '', line)
         # match time, id, module, log; The common format for all log lines
         time, nodeid, level, module, log = parseLine(line)
 
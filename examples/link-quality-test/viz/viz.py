@@ -1,6 +1,8 @@
 #!/usr/bin/python3
 
 import os
+import io
+import gzip
 
 INDEX = 3
 
@@ -176,6 +178,20 @@ NORMAL_PER_ROUND = None
 # XXX: at the moment, the channel info from the trace file is not fully used
 DEFAULT_CHANNELS = [15, 20, 25, 26]
 
+# the log may be stored compressed: file.log.gz, or file.log.zst (needs the zstandard module)
+def open_log(filename):
+    for name in [filename, filename + ".gz", filename + ".zst"]:
+        if os.path.exists(name):
+            filename = name
+            break
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt", errors="replace")
+    if filename.endswith(".zst"):
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+        return io.TextIOWrapper(io.BufferedReader(reader), errors="replace")
+    return open(filename, "rt")
+
 def process_packet_stats():
     links = {}
     prev_from = -1
@@ -274,7 +290,7 @@ def main():
 
     with open(os.path.join(OUTDIR, outfile), "w") as outf:
       start_trace_file(outf)
-      with open(INFILE, "rt") as f:
+      with open_log(INFILE) as f:
         for line in f:
             fields = line.strip().split(";")
             if len(fields) < 3: